@@ -8,20 +8,45 @@ Learn Python while growing your companion!
 Version 2.1 - Enhanced Edition with MCQ, Drills, and Bug Fixes
 """
 
+import ast
+import atexit
+import bisect
+import copy
+import gzip
+import hashlib
+import heapq
 import io
 import json
+import marshal
+import mmap
 import os
+import re
+import sqlite3
+import struct
 import sys
 import random
+import threading
+import time
+import unicodedata
 import urllib.request
 import webbrowser
-from collections import defaultdict
+import zipfile
+import zlib
+from collections import OrderedDict, defaultdict, deque
 from dataclasses import dataclass, field, asdict
 from datetime import datetime, timedelta
 from enum import Enum
 from PIL import Image, ImageTk
 from tkinter import messagebox, filedialog
-from typing import Dict, List, Tuple, Optional, Any, Set
+from typing import Dict, List, Tuple, Optional, Any, Set, Iterable, Deque
+try:
+    import fcntl  # Profile locks on POSIX
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt  # ...and on Windows
+except ImportError:
+    msvcrt = None
 import customtkinter as ctk
 from customtkinter import (CTk, CTkFrame, CTkLabel, CTkButton, CTkEntry,
                            CTkScrollableFrame, CTkTextbox, CTkProgressBar,
@@ -149,6 +174,15 @@ def get_colors():
 DEFAULT_FONT = "Segoe UI"  # Clean, modern font
 CODE_FONT = "Consolas"  # Monospace for code
 
+# Lesson packs on disk (falls back to the built-in lessons when none are found)
+LESSON_PACKS_DIR = "lesson_packs"
+# Derived content caches (compiled snapshot, indexes) - safe to delete
+CONTENT_CACHE_DIR = os.path.join("codecompanion_data", "cache")
+# How often --dev mode checks the lesson packs for edits
+CONTENT_POLL_INTERVAL_MS = 1000
+# Items drawn for one cross-lesson practice session
+PRACTICE_SESSION_SIZE = 10
+
 # Available fonts for user selection
 UI_FONTS = [
     "Segoe UI",
@@ -203,10 +237,10 @@ class User:
     companion_vitality: int = 100
     achievements: List[str] = field(default_factory=list)
     review_queue: List[Tuple[str, str]] = field(default_factory=list)
-    mistake_tracker: Dict[str, int] = field(default_factory=dict)
+    mistake_tracker: Dict[str, int] = field(default_factory=dict)  # concept -> outstanding first-try misses
     theme: str = "dark"
     font_size: int = 12
-    activity_log: List[Dict] = field(default_factory=list)
+    activity_log: Deque[Dict] = field(default_factory=lambda: deque(maxlen=User.RECENT_ACTIVITY))
     total_exercises_completed: int = 0
     total_hints_used: int = 0
     fastest_completion_time: int = 999999
@@ -227,46 +261,92 @@ class User:
     code_font: str = "Consolas"
     reduce_animations: bool = False
     high_contrast: bool = False
+    recent_accuracy: float = 0.75  # Moving average of first-try results, drives recommended difficulty
+    last_lesson_id: str = ""
+    activity_count: int = 0  # Activities ever logged; activity_log only keeps the most recent ones
 
-    def to_dict(self) -> Dict:
-        data = asdict(self)
-        data['completed_lessons'] = list(self.completed_lessons)
+    RECENT_ACTIVITY = 50
+    # Fields that grow with the learner's history; saved after the header and parsed on first use
+    HISTORY_FIELDS = ('activity_log', 'completed_exercises', 'completed_drills', 'review_queue', 'mistake_tracker')
+
+    # Saved profiles carry this version; from_dict() upgrades older ones with the _migrate_from_N steps
+    SCHEMA_VERSION = 2
+
+    def to_dict(self, names: Optional[Iterable[str]] = None) -> Dict:
+        """
+        The profile (or just the fields in names) as JSON-ready data, read straight from the attributes
+        through FIELD_CODECS; containers are copied one level deep, which is all their contents need
+        """
+        codecs = User.FIELD_CODECS if names is None else {name: User.FIELD_CODECS[name] for name in names}
+        data = {'schema_version': User.SCHEMA_VERSION}
+        for name, (encode, _) in codecs.items():
+            value = getattr(self, name)
+            data[name] = encode(value) if encode else value
         return data
 
+    @staticmethod
+    def field_from_json(name: str, value):
+        """The in-memory form of a field read back from JSON"""
+        decode = User.FIELD_CODECS[name][1]
+        return decode(value) if decode else value
+
     @classmethod
     def from_dict(cls, data: Dict) -> 'User':
-        if 'completed_lessons' in data:
-            data['completed_lessons'] = set(data['completed_lessons'])
-        # Set defaults for new fields
-        defaults = {
-            'theme': 'dark',
-            'font_size': 12,
-            'activity_log': [],
-            'total_exercises_completed': 0,
-            'total_hints_used': 0,
-            'fastest_completion_time': 999999,
-            'coding_time_minutes': 0,
-            'favorite_topics': [],
-            'daily_challenge_completed': '',
-            'completed_drills': {},
-            'total_drills_completed': 0,
-            'last_update_check': '',
-            'auto_check_updates': True,
-            'weekly_xp': 0,
-            'weekly_goal_xp': 200,
-            'total_study_sessions': 0,
-            'average_session_time': 0,
-            'perfect_scores': 0,
-            'current_session_start': '',
-            'ui_font': 'Segoe UI',
-            'code_font': 'Consolas',
-            'reduce_animations': False,
-            'high_contrast': False
-        }
-        for key, default_value in defaults.items():
-            if key not in data:
-                data[key] = default_value
-        return cls(**data)
+        """
+        Build a profile from to_dict() data of any schema version. Fields missing from the data take
+        their dataclass defaults, and fields this version does not know are ignored.
+        """
+        version = data.pop('schema_version', 1)
+        while version < cls.SCHEMA_VERSION:
+            getattr(cls, f'_migrate_from_{version}')(data)
+            version += 1
+        fields = {}
+        for name, (_, decode) in cls.FIELD_CODECS.items():
+            if name in data:
+                fields[name] = decode(data[name]) if decode else data[name]
+        return cls(**fields)
+
+    @staticmethod
+    def _migrate_from_1(data: Dict):
+        # Version 2 counts every activity ever logged; before it, the log was all there was
+        data.setdefault('activity_count', len(data.get('activity_log', [])))
+
+    @classmethod
+    def from_header(cls, header: Dict, unparsed: Dict[str, str]) -> 'User':
+        """A profile whose history sections are still JSON text, parsed when first read"""
+        if header.get('schema_version', 1) < cls.SCHEMA_VERSION:
+            # Migrations may need any field, so an older profile is read in full, once
+            header.update((name, json.loads(text)) for name, text in unparsed.items())
+            return cls.from_dict(header)
+        user = cls.from_dict(header)
+        for name in unparsed:
+            del user.__dict__[name]
+        object.__setattr__(user, '_unparsed', dict(unparsed))
+        return user
+
+    def __getattr__(self, name):
+        # Only reached for attributes that are not set: a history section not parsed yet
+        unparsed = self.__dict__.get('_unparsed')
+        if not unparsed or name not in unparsed:
+            raise AttributeError(f"'User' object has no attribute '{name}'")
+        text = unparsed.pop(name)
+        try:
+            value = self.field_from_json(name, json.loads(text))
+        except ValueError as e:
+            print(f"Error loading {name}: {e}")
+            value = self.__dataclass_fields__[name].default_factory()
+        object.__setattr__(self, name, value)
+        return value
+
+    def __setattr__(self, name, value):
+        # With journaled storage, assignments are recorded as events (see ProgressJournal)
+        journal = self.__dict__.get('_journal')
+        if journal is not None and name in journal.FIELDS:
+            value = journal.assigned(name, value)
+        unparsed = self.__dict__.get('_unparsed')
+        if unparsed:
+            unparsed.pop(name, None)  # Replaced before it was ever read
+        object.__setattr__(self, name, value)
 
     def add_activity(self, activity_type: str, description: str, xp_gained: int = 0):
         """Add an activity to the log"""
@@ -276,10 +356,21 @@ class User:
             'description': description,
             'xp_gained': xp_gained
         }
-        self.activity_log.append(activity)
-        # Keep only last 50 activities
-        if len(self.activity_log) > 50:
-            self.activity_log = self.activity_log[-50:]
+        self.activity_log.append(activity)  # A ring buffer: the oldest entry drops out
+        self.activity_count += 1
+
+
+# How each User field goes to and from JSON: (encode, decode), None where the value passes through.
+# Sets, the activity ring buffer and review_queue's tuples change type; other containers are copied
+# one level deep on save.
+User.FIELD_CODECS = {
+    name: ((sorted, set) if name == 'completed_lessons' else
+           (list, lambda value: deque(value, maxlen=User.RECENT_ACTIVITY)) if name == 'activity_log' else
+           (list, lambda value: [tuple(entry) for entry in value]) if name == 'review_queue' else
+           (spec.default_factory, None) if spec.default_factory in (dict, list) else
+           (None, None))
+    for name, spec in User.__dataclass_fields__.items()
+}
 
 
 class CompanionType(Enum):
@@ -386,6 +477,225 @@ class Companion:
         return self.stage < 10 and self.vitality >= 70
 
 
+class ActivityHistory:
+    """
+    The complete activity history behind the profile's short activity_log, kept next to user.json.
+    Records are appended to current.jsonl; every CHUNK_RECORDS records it is sealed into a gzip chunk
+    that never changes again. Per-day and per-week rollups of XP, exercises, drills and hints live in
+    rollups.json, so statistics over months read one entry per day. rollups.json always covers
+    exactly the sealed chunks, and the open chunk is replayed on top of it when the history is opened.
+    """
+
+    CHUNK_RECORDS = 1000
+    COUNTERS = {'exercises': 'total_exercises_completed', 'drills': 'total_drills_completed',
+                'hints': 'total_hints_used'}
+
+    def __init__(self, path: str):
+        self.path = path
+        self.current_file = os.path.join(path, "current.jsonl")
+        self.rollups_file = os.path.join(path, "rollups.json")
+        self._lock = threading.Lock()
+        self._state: Optional[Dict] = None  # Rollups including the open chunk; None until opened
+        self._current: List[str] = []  # Lines of the open chunk
+        self._torn = False
+        # What capture() has already taken from the profile (Tk thread only)
+        self.captured_activities = 0
+        self.captured_counts: Optional[Dict[str, int]] = None
+
+    @staticmethod
+    def _empty_state() -> Dict:
+        # records: records in sealed chunks; counts: the counters as of the last 'counts' record
+        return {'days': {}, 'weeks': {}, 'sealed': [], 'records': 0, 'activities': 0, 'counts': None}
+
+    def open(self):
+        with self._lock:
+            if self._state is None:
+                self._open()
+
+    def _open(self):
+        state = self._empty_state()
+        if os.path.exists(self.rollups_file):
+            try:
+                with open(self.rollups_file, 'r') as f:
+                    state = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error loading activity rollups: {e}")
+        # A chunk sealed just before a crash, before rollups.json caught up with it
+        for name in sorted(os.listdir(self.path)) if os.path.isdir(self.path) else []:
+            if not name.startswith("chunk-"):
+                continue
+            chunk_file = os.path.join(self.path, name)
+            if not name.endswith(".jsonl.gz"):
+                # Left by a crash mid-seal; its records are still in current.jsonl
+                try:
+                    os.remove(chunk_file)
+                except OSError:
+                    pass
+                continue
+            if name in state['sealed'] or int(name[6:15]) != state['records']:
+                continue
+            try:
+                with gzip.open(chunk_file, 'rt') as f:
+                    records = [json.loads(line) for line in f.read().splitlines()]
+            except (OSError, EOFError, ValueError) as e:
+                # current.jsonl still holds these records, and sealing them again replaces the file
+                print(f"Error reading activity chunk {name}: {e}")
+                continue
+            for record in records:
+                self._apply(state, record)
+            state['sealed'].append(name)
+            state['records'] += len(records)
+        self._current = []
+        if os.path.exists(self.current_file):
+            with open(self.current_file, 'r') as f:
+                text = f.read()
+            self._torn = bool(text) and not text.endswith("\n")
+            lines = text.splitlines()
+            try:
+                start = json.loads(lines[0])['start'] if lines else state['records']
+                header_torn = False
+            except (ValueError, KeyError, TypeError):
+                # Torn by a crash while the file was new; sealing rewrites it whole, so whatever follows
+                # the header comes after the sealed records
+                start = state['records']
+                header_torn = True
+            for index, line in enumerate(lines[1:], start):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn by a crash mid-write
+                if index >= state['records']:  # Lower ones were sealed before a crash left the file behind
+                    self._apply(state, record)
+                    self._current.append(line)
+            if header_torn:
+                try:
+                    self._write_atomic(self.current_file, "".join(
+                        line + "\n" for line in [json.dumps({'start': start})] + self._current))
+                    self._torn = False
+                except OSError as e:
+                    print(f"Error repairing activity history: {e}")
+        self._state = state
+        self.captured_activities = state['activities']
+        self.captured_counts = state['counts']
+
+    @staticmethod
+    def _apply(state: Dict, record: Dict):
+        if record['activity_type'] == 'gap':
+            # Activities no longer in the profile's log: counted, but there is nothing to roll up
+            state['activities'] += record['activities']
+            return
+        day = record['timestamp'][:10]
+        year, week, _ = datetime.fromisoformat(day).isocalendar()
+        totals = {'xp': 0, 'exercises': 0, 'drills': 0, 'hints': 0, 'activities': 0}
+        if record['activity_type'] == 'counts':
+            counts = {key: record[key] for key in ActivityHistory.COUNTERS}
+            if state['counts'] is not None:  # The first one is only a baseline
+                for key, value in counts.items():
+                    totals[key] = max(0, value - state['counts'].get(key, 0))
+            state['counts'] = counts
+        else:
+            state['activities'] += 1
+            totals['xp'] = record.get('xp_gained', 0)
+            totals['activities'] = 1
+        for period, key in (('days', day), ('weeks', f"{year}-W{week:02d}")):
+            bucket = state[period].setdefault(key, dict.fromkeys(totals, 0))
+            for name, value in totals.items():
+                bucket[name] += value
+
+    def capture(self, user: User) -> List[Dict]:
+        """The records that are new since the last capture, taken from the profile on the Tk thread"""
+        self.open()
+        records = []
+        new = user.activity_count - self.captured_activities
+        if new > 0:
+            logged = list(user.activity_log)[-new:]
+            if new > len(logged):
+                # The oldest new activities already dropped out of the ring buffer (an imported profile, or
+                # one older than its history); a gap record advances the count past them without replaying
+                records.append({'timestamp': datetime.now().isoformat(), 'activity_type': 'gap',
+                                'activities': new - len(logged)})
+            records.extend(logged)
+        self.captured_activities = user.activity_count  # A reset or imported profile may also count down
+        counts = {key: getattr(user, name, 0) for key, name in self.COUNTERS.items()}
+        if counts != self.captured_counts:
+            records.append(dict(counts, timestamp=datetime.now().isoformat(), activity_type='counts'))
+            self.captured_counts = counts
+        return records
+
+    def append(self, records: List[Dict]) -> bool:
+        """Add records to the open chunk, sealing it once full. False if it failed."""
+        with self._lock:
+            if self._state is None:
+                self._open()
+            lines = [json.dumps(record) for record in records]
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                with open(self.current_file, 'a') as f:
+                    # A new file's header goes out in the same write as its first records
+                    header = json.dumps({'start': self._state['records']}) + "\n" if f.tell() == 0 else ""
+                    f.write(header + ("\n" if self._torn and not header else "") +
+                            "".join(line + "\n" for line in lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._torn = False
+            except OSError as e:
+                print(f"Error saving activity history: {e}")
+                self._torn = True
+                return False
+            for record, line in zip(records, lines):
+                self._apply(self._state, record)
+                self._current.append(line)
+            if len(self._current) >= self.CHUNK_RECORDS:
+                return self._seal()
+            return True
+
+    def _seal(self) -> bool:
+        state = self._state
+        name = f"chunk-{state['records']:09d}.jsonl.gz"
+        try:
+            temp_file = os.path.join(self.path, name + ".tmp")
+            with open(temp_file, 'wb') as raw, gzip.open(raw, 'wt') as f:
+                f.write("".join(line + "\n" for line in self._current))
+                f.close()  # Writes the gzip trailer, which has to be on disk before the rename
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(temp_file, os.path.join(self.path, name))
+            state['sealed'].append(name)
+            state['records'] += len(self._current)
+            self._write_atomic(self.rollups_file, json.dumps(state))
+            self._write_atomic(self.current_file, json.dumps({'start': state['records']}) + "\n")
+        except OSError as e:
+            print(f"Error sealing activity history: {e}")
+            return False
+        self._current = []
+        return True
+
+    @staticmethod
+    def _write_atomic(path: str, text: str):
+        with open(path + ".tmp", 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def rollups(self, period: str, since: str) -> Dict[str, Dict[str, int]]:
+        """Per-'days' or per-'weeks' totals from the day (or week, as YYYY-Www) since onwards"""
+        with self._lock:
+            if self._state is None:
+                self._open()
+            return {key: dict(bucket) for key, bucket in self._state[period].items() if key >= since}
+
+    def delete(self):
+        with self._lock:
+            if os.path.isdir(self.path):
+                for name in os.listdir(self.path):
+                    os.remove(os.path.join(self.path, name))
+            self._state = None
+            self._current = []
+            self.captured_activities = 0
+            self.captured_counts = None
+
+
 class StorageManager:
     """Handles persistence of user data to JSON files"""
 
@@ -393,85 +703,1369 @@ class StorageManager:
         self.data_dir = data_dir
         os.makedirs(data_dir, exist_ok=True)
         self.user_file = os.path.join(data_dir, "user.json")
+        self.backup_file = self.user_file + ".bak"  # The previous good save
+        self._saved_text: Optional[str] = None  # What user_file holds, to skip saves that change nothing
+        self.history = ActivityHistory(os.path.join(data_dir, "history"))
 
     def save_user(self, user: User) -> None:
-        with open(self.user_file, 'w') as f:
-            json.dump(user.to_dict(), f, indent=2)
+        self.store(self.capture(user))
+
+    # ProfileWriter saves in two steps: capture() runs on the Tk thread while the profile is consistent,
+    # store() writes the result later on the writer thread. Payloads still waiting are combined with
+    # merge_pending(); a full profile simply replaces an older one.
+    def capture(self, user: User, final: bool = False) -> Any:
+        """The profile's user.json lines, and the activity history records new since the last capture"""
+        return {'lines': StorageManager.profile_lines(user), 'history': self.history.capture(user)}
+
+    @staticmethod
+    def profile_lines(user: User) -> List[str]:
+        """
+        The lines of user.json: a header holding every field but the history sections, then one line
+        per section. Sections that were never parsed are passed through as the text they were read as.
+        """
+        header = user.to_dict(name for name in User.FIELD_CODECS if name not in User.HISTORY_FIELDS)
+        unparsed = user.__dict__.get('_unparsed', {})
+        history = user.to_dict(name for name in User.HISTORY_FIELDS if name not in unparsed)
+        sections = [unparsed[name] if name in unparsed else json.dumps(history[name], separators=(',', ':'))
+                    for name in User.HISTORY_FIELDS]
+        return [json.dumps({'profile': header, 'sections': list(User.HISTORY_FIELDS)}, separators=(',', ':'))] + sections
+
+    def merge_pending(self, older: Any, newer: Any) -> Any:
+        return {'lines': newer['lines'], 'history': older['history'] + newer['history']}
+
+    def store(self, payload: Any) -> bool:
+        if not self._write_text("\n".join(payload['lines']) + "\n"):
+            return False
+        if payload['history'] and not self.history.append(payload['history']):
+            return False
+        return True
+
+    def save_user_data(self, data: Dict) -> bool:
+        return self._write_text(json.dumps(data, separators=(',', ':')))
+
+    def _write_text(self, text: str) -> bool:
+        """
+        Save a serialized profile unless it is unchanged since the last save. The new file is written and
+        fsynced beside the old one and then renamed over it, so a crash leaves either the old or the new
+        profile, never a truncated one; the replaced profile is kept as the backup. False if it failed.
+        """
+        if text == self._saved_text:
+            return True
+        temp_file = self.user_file + ".tmp"
+        try:
+            with open(temp_file, 'w') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            # Only a profile known to be good replaces the backup; a damaged one is just overwritten
+            if self._saved_text is not None and os.path.exists(self.user_file):
+                os.replace(self.user_file, self.backup_file)
+            os.replace(temp_file, self.user_file)
+            StorageManager._fsync_dir(self.data_dir)
+            self._saved_text = text
+            return True
+        except OSError as e:
+            print(f"Error saving user: {e}")
+            return False
+
+    def delete_user(self) -> None:
+        """Remove the profile, its backup and its activity history"""
+        for path in (self.user_file, self.backup_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self._saved_text = None
+        self.history.delete()
+
+    @staticmethod
+    def _fsync_dir(path: str) -> None:
+        """Make renames in a directory durable; not possible (or needed) on every platform"""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
 
     def load_user(self) -> Optional[User]:
-        if not os.path.exists(self.user_file):
-            return None
+        """Load the profile, falling back to the previous good save if the current one is missing or damaged"""
+        return self._load_file(self.user_file, StorageManager._parse_profile)
+
+    @staticmethod
+    def _parse_profile(text: str) -> User:
+        """
+        Build a profile from user.json, parsing only its header line; the history sections are kept as
+        text until first used. Whole-profile JSON (older saves and exports) is parsed as before.
+        """
+        first, _, rest = text.partition("\n")
         try:
-            with open(self.user_file, 'r') as f:
-                data = json.load(f)
-                return User.from_dict(data)
-        except Exception as e:
-            print(f"Error loading user: {e}")
-            return None
+            head = json.loads(first)
+        except ValueError:
+            head = None
+        if not isinstance(head, dict) or 'sections' not in head:
+            return User.from_dict(json.loads(text))
+        lines = rest.split("\n")
+        names = head['sections']
+        if len(lines) <= len(names):
+            raise ValueError("profile is truncated")
+        return User.from_header(head['profile'], dict(zip(names, lines)))
+
+    def _load_file(self, path: str, parse) -> Any:
+        """parse() the text of path, or of its backup if path is missing or damaged"""
+        for candidate in (path, path + ".bak"):
+            if not os.path.exists(candidate):
+                continue
+            try:
+                with open(candidate, 'r') as f:
+                    text = f.read()
+                result = parse(text)
+            except Exception as e:
+                print(f"Error loading user from {candidate}: {e}")
+                continue
+            if candidate == self.user_file:
+                self._saved_text = text
+            elif candidate == self.backup_file:
+                print(f"Recovered user profile from {candidate}")
+            return result
+        return None
 
     def user_exists(self) -> bool:
-        return os.path.exists(self.user_file)
+        return os.path.exists(self.user_file) or os.path.exists(self.backup_file)
+
+    def monthly_summary(self, since: str) -> Optional[Dict]:
+        """Progress since an ISO date, from the activity history's daily and weekly rollups"""
+        days = self.history.rollups('days', since)
+        year, week, _ = datetime.fromisoformat(since).isocalendar()
+        weeks = self.history.rollups('weeks', f"{year}-W{week:02d}")
+        summary = {key: sum(day[key] for day in days.values()) for key in ('xp', 'exercises', 'drills', 'hints')}
+        summary['active_days'] = sum(1 for day in days.values() if day['activities'])
+        summary['best_week_xp'] = max((week['xp'] for week in weeks.values()), default=0)
+        summary['by_concept'] = {}  # The history records counts, not which items were completed
+        return summary
+
+    BACKUP_FORMAT = "codecompanion-backup"
+    BACKUP_CHUNK = 5000  # History entries per backup line
 
-    def export_user_data(self, export_path: str, user: User) -> bool:
-        """Export user data to a file for backup"""
+    @staticmethod
+    def _backup_lines(data: Dict) -> Iterable[str]:
+        """The lines of a backup: the profile without its history, then each history field in chunks"""
+        header = {key: value for key, value in data.items() if key not in User.HISTORY_FIELDS}
+        yield json.dumps({'format': StorageManager.BACKUP_FORMAT, 'version': 1, 'profile': header},
+                         separators=(',', ':'))
+        size = StorageManager.BACKUP_CHUNK
+        for name in User.HISTORY_FIELDS:
+            value = data.get(name)
+            if value is None:
+                continue
+            items = list(value.items()) if isinstance(value, dict) else list(value)
+            for start in range(0, max(len(items), 1), size):
+                chunk = items[start:start + size]
+                yield json.dumps({'field': name, 'items': dict(chunk) if isinstance(value, dict) else chunk},
+                                 separators=(',', ':'))
+
+    @staticmethod
+    def backup_bytes(data: Dict) -> Iterable[bytes]:
+        """A backup of data, line by line, ending with the line count and sha256 of everything before it"""
+        digest = hashlib.sha256()
+        lines = 0
+        for line in StorageManager._backup_lines(data):
+            encoded = (line + "\n").encode('utf-8')
+            digest.update(encoded)
+            lines += 1
+            yield encoded
+        yield (json.dumps({'sha256': digest.hexdigest(), 'lines': lines}) + "\n").encode('utf-8')
+
+    def export_user_data(self, export_path: str, data: Dict, progress=None) -> bool:
+        """
+        Export a profile (a to_dict() snapshot) as a backup, gzip-compressed when the path ends in .gz.
+        Lines are streamed to a .part file that only replaces export_path once complete. Safe to call
+        off the Tk thread.
+        """
+        size = StorageManager.BACKUP_CHUNK
+        total = 2 + sum(max(1, -(-len(data[name]) // size)) for name in User.HISTORY_FIELDS if name in data)
+        temp_path = export_path + ".part"
         try:
-            with open(export_path, 'w') as f:
-                json.dump(user.to_dict(), f, indent=2)
+            opener = gzip.open if export_path.lower().endswith('.gz') else open
+            with opener(temp_path, 'wb') as f:
+                for written, encoded in enumerate(StorageManager.backup_bytes(data), 1):
+                    f.write(encoded)
+                    if progress:
+                        progress(written / total)
+            os.replace(temp_path, export_path)
             return True
         except Exception as e:
             print(f"Export error: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
             return False
 
-    def import_user_data(self, import_path: str) -> Optional[User]:
-        """Import user data from a backup file"""
+    def import_user_data(self, import_path: str, progress=None) -> Optional[User]:
+        """
+        Import a profile from a backup file, plain or gzip-compressed. Older whole-file exports (and
+        user.json itself) are also accepted. Safe to call off the Tk thread.
+        """
         try:
-            with open(import_path, 'r') as f:
-                data = json.load(f)
-                return User.from_dict(data)
+            with open(import_path, 'rb') as raw:
+                return StorageManager.read_backup(raw, os.path.getsize(import_path), progress)
         except Exception as e:
             print(f"Import error: {e}")
             return None
 
+    @staticmethod
+    def read_backup(raw, size: int, progress=None) -> Optional[User]:
+        """
+        Read a backup from a binary file line by line. Nothing is returned unless the whole backup is
+        present and matches its checksum. Raises OSError or ValueError if it cannot be read at all.
+        """
+        compressed = raw.read(2) == b'\x1f\x8b'
+        raw.seek(0)
+        stream = gzip.GzipFile(fileobj=raw) if compressed else raw
+        first = stream.readline()
+        try:
+            head = json.loads(first)
+        except ValueError:
+            head = None
+        if not (isinstance(head, dict) and head.get('format') == StorageManager.BACKUP_FORMAT):
+            # Exported before backups were streamed: one JSON document, no checksum
+            return StorageManager._parse_profile((first + stream.read()).decode('utf-8'))
+        digest = hashlib.sha256(first)
+        data = dict(head['profile'])
+        lines, trailer = 1, None
+        for line in stream:
+            record = json.loads(line)
+            if 'sha256' in record:
+                trailer = record
+                break
+            digest.update(line)
+            lines += 1
+            items = record['items']
+            if isinstance(items, dict):
+                data.setdefault(record['field'], {}).update(items)
+            else:
+                data.setdefault(record['field'], []).extend(items)
+            if progress:
+                progress(raw.tell() / max(size, 1))
+        if trailer is None or trailer.get('sha256') != digest.hexdigest() or trailer.get('lines') != lines:
+            print("Import error: the backup is incomplete or damaged")
+            return None
+        return User.from_dict(data)
+
+
+class SQLiteStorageManager(StorageManager):
+    """
+    Optional profile storage in an SQLite database (progress.db) with normalized, indexed tables,
+    so dated statistics are queries rather than a scan of the whole profile. Scalar profile fields
+    and settings are key/value rows; lesson and exercise completions, drill results and the full
+    activity history are tables of their own. Each save writes only what changed since the last one,
+    in one transaction. The database runs in WAL mode and each thread gets its own connection,
+    so the UI reads while the background writer commits. On first use an existing user.json is
+    imported once; the JSON file itself is left in place.
+    """
+
+    DB_NAME = "progress.db"
+    SCHEMA_VERSION = 1
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS profile (field TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS completions (
+            kind TEXT NOT NULL,              -- 'lesson' or 'exercise'
+            item_id TEXT NOT NULL,
+            concept TEXT,
+            times INTEGER NOT NULL,
+            first_completed_at TEXT,         -- NULL when imported from JSON, which kept no dates
+            last_completed_at TEXT,
+            PRIMARY KEY (kind, item_id)
+        );
+        CREATE TABLE IF NOT EXISTS drill_results (
+            item_id TEXT PRIMARY KEY,
+            concept TEXT,
+            times INTEGER NOT NULL,
+            first_completed_at TEXT,
+            last_completed_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS activity (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            activity_type TEXT NOT NULL,
+            description TEXT NOT NULL,
+            xp_gained INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS counter_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,         -- A row per save that changed the profile's running totals
+            exercises INTEGER NOT NULL,
+            drills INTEGER NOT NULL,
+            hints INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS completions_by_date ON completions (kind, first_completed_at, concept);
+        CREATE INDEX IF NOT EXISTS drill_results_by_date ON drill_results (first_completed_at, concept);
+        CREATE INDEX IF NOT EXISTS activity_by_date ON activity (timestamp, xp_gained);
+        CREATE INDEX IF NOT EXISTS counter_history_by_date ON counter_history (timestamp);
+    """
+    SETTINGS_FIELDS = ('theme', 'font_size', 'ui_font', 'code_font', 'reduce_animations', 'high_contrast',
+                       'auto_check_updates', 'daily_goal_xp', 'weekly_goal_xp')
+    TABLE_FIELDS = ('completed_lessons', 'completed_exercises', 'completed_drills', 'activity_log')
+    RECENT_ACTIVITY = User.RECENT_ACTIVITY  # Entries loaded into user.activity_log; the table keeps them all
+
+    # Fixed statement texts, so sqlite3's per-connection statement cache prepares each one once
+    UPSERT_PROFILE = "INSERT OR REPLACE INTO profile (field, value) VALUES (?, ?)"
+    UPSERT_SETTING = "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)"
+    INSERT_COMPLETION = ("INSERT OR IGNORE INTO completions (kind, item_id, concept, times, first_completed_at, "
+                         "last_completed_at) VALUES (?, ?, ?, 0, ?, ?)")
+    UPDATE_COMPLETION = "UPDATE completions SET times = ?, last_completed_at = ? WHERE kind = ? AND item_id = ?"
+    DELETE_COMPLETION = "DELETE FROM completions WHERE kind = ? AND item_id = ?"
+    INSERT_DRILL = ("INSERT OR IGNORE INTO drill_results (item_id, concept, times, first_completed_at, "
+                    "last_completed_at) VALUES (?, ?, 0, ?, ?)")
+    UPDATE_DRILL = "UPDATE drill_results SET times = ?, last_completed_at = ? WHERE item_id = ?"
+    DELETE_DRILL = "DELETE FROM drill_results WHERE item_id = ?"
+    INSERT_ACTIVITY = "INSERT INTO activity (timestamp, activity_type, description, xp_gained) VALUES (?, ?, ?, ?)"
+    INSERT_COUNTERS = "INSERT INTO counter_history (timestamp, exercises, drills, hints) VALUES (?, ?, ?, ?)"
+
+    def __init__(self, data_dir: str = "codecompanion_data", item_concept=None):
+        super().__init__(data_dir)
+        self.db_file = os.path.join(data_dir, self.DB_NAME)
+        self.item_concept = item_concept or (lambda item_id: None)  # callable(item id) -> concept tag or None
+        self._local = threading.local()
+        self._save_lock = threading.Lock()
+        self._saved: Optional[Dict] = None  # State last written or loaded, diffed against by the next save
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)",
+                         (str(self.SCHEMA_VERSION),))
+        self._import_json_profile()
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection; sqlite3 connections can't be shared between threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")  # Same durability as the JSON backend's fsync
+            self._local.conn = conn
+        return conn
+
+    def _import_json_profile(self):
+        """One-time migration of an existing user.json (or its backup) into the database"""
+        conn = self._connection()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            return
+        user = None
+        if not conn.execute("SELECT 1 FROM profile LIMIT 1").fetchone():
+            user = StorageManager.load_user(self)
+        with conn:
+            if user is not None:
+                self._write(conn, user.to_dict(), None, dated=False)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)",
+                         (datetime.now().isoformat(timespec='seconds'),))
+        self._saved = None
+        if user is not None:
+            print(f"Imported user profile from {self.user_file} into {self.db_file}")
+
+    def capture(self, user: User, final: bool = False) -> Any:
+        return user.to_dict()
+
+    def store(self, payload: Any) -> bool:
+        return self.save_user_data(payload)
+
+    def save_user_data(self, data: Dict) -> bool:
+        with self._save_lock:
+            try:
+                conn = self._connection()
+                with conn:
+                    self._write(conn, data, self._saved, dated=True)
+            except sqlite3.Error as e:
+                print(f"Error saving user: {e}")
+                return False
+            self._saved = self._state(data)
+            return True
+
+    @staticmethod
+    def _state(data: Dict) -> Dict:
+        """What a save compares against: every field as JSON text, and the tables as sets and dicts"""
+        return {
+            'fields': {name: json.dumps(value) for name, value in data.items()
+                       if name not in SQLiteStorageManager.TABLE_FIELDS},
+            'completed_lessons': set(data.get('completed_lessons', [])),
+            'completed_exercises': dict(data.get('completed_exercises', {})),
+            'completed_drills': dict(data.get('completed_drills', {})),
+            'activity': {(a['timestamp'], a['activity_type'], a['description']) for a in data.get('activity_log', [])},
+        }
+
+    def _write(self, conn: sqlite3.Connection, data: Dict, saved: Optional[Dict], dated: bool):
+        """Write the differences between data and the saved state (everything, if there is none)"""
+        new = self._state(data)
+        old = saved or {'fields': {}, 'completed_lessons': set(), 'completed_exercises': {},
+                        'completed_drills': {}, 'activity': set()}
+        now = datetime.now().isoformat(timespec='seconds') if dated else None
+
+        changed = [(name, text) for name, text in new['fields'].items() if old['fields'].get(name) != text]
+        conn.executemany(self.UPSERT_PROFILE, [row for row in changed if row[0] not in self.SETTINGS_FIELDS])
+        conn.executemany(self.UPSERT_SETTING, [row for row in changed if row[0] in self.SETTINGS_FIELDS])
+        # Dated totals, like the JSON history's 'counts' records; monthly_summary adds up their increases
+        if any(name in ActivityHistory.COUNTERS.values() for name, _ in changed):
+            conn.execute(self.INSERT_COUNTERS, (datetime.now().isoformat(timespec='seconds'),
+                                                *(data.get(name, 0) for name in ActivityHistory.COUNTERS.values())))
+
+        lessons = {lesson_id: 1 for lesson_id in new['completed_lessons']}
+        old_lessons = {lesson_id: 1 for lesson_id in old['completed_lessons']}
+        for kind, counts, old_counts in (('lesson', lessons, old_lessons),
+                                         ('exercise', new['completed_exercises'], old['completed_exercises'])):
+            updates = [(item_id, times) for item_id, times in counts.items() if old_counts.get(item_id) != times]
+            conn.executemany(self.INSERT_COMPLETION,
+                             [(kind, item_id, self.item_concept(item_id) if kind == 'exercise' else None, now, now)
+                              for item_id, _ in updates])
+            conn.executemany(self.UPDATE_COMPLETION, [(times, now, kind, item_id) for item_id, times in updates])
+            conn.executemany(self.DELETE_COMPLETION, [(kind, item_id) for item_id in old_counts if item_id not in counts])
+
+        drills, old_drills = new['completed_drills'], old['completed_drills']
+        updates = [(item_id, times) for item_id, times in drills.items() if old_drills.get(item_id) != times]
+        conn.executemany(self.INSERT_DRILL, [(item_id, self.item_concept(item_id), now, now) for item_id, _ in updates])
+        conn.executemany(self.UPDATE_DRILL, [(times, now, item_id) for item_id, times in updates])
+        conn.executemany(self.DELETE_DRILL, [(item_id,) for item_id in old_drills if item_id not in drills])
+
+        conn.executemany(self.INSERT_ACTIVITY,
+                         [(a['timestamp'], a['activity_type'], a['description'], a.get('xp_gained', 0))
+                          for a in data.get('activity_log', [])
+                          if (a['timestamp'], a['activity_type'], a['description']) not in old['activity']])
+
+    def load_user(self) -> Optional[User]:
+        try:
+            conn = self._connection()
+            rows = conn.execute("SELECT field, value FROM profile").fetchall()
+            if not rows:
+                return None
+            data = {name: json.loads(value) for name, value in rows}
+            data.update((name, json.loads(value)) for name, value in conn.execute("SELECT key, value FROM settings"))
+            data['completed_lessons'] = [item_id for (item_id,) in
+                                         conn.execute("SELECT item_id FROM completions WHERE kind = 'lesson'")]
+            data['completed_exercises'] = dict(
+                conn.execute("SELECT item_id, times FROM completions WHERE kind = 'exercise'"))
+            data['completed_drills'] = dict(conn.execute("SELECT item_id, times FROM drill_results"))
+            recent = conn.execute("SELECT timestamp, activity_type, description, xp_gained FROM activity "
+                                  "ORDER BY id DESC LIMIT ?", (self.RECENT_ACTIVITY,)).fetchall()
+            data['activity_log'] = [{'timestamp': timestamp, 'activity_type': activity_type,
+                                     'description': description, 'xp_gained': xp_gained}
+                                    for timestamp, activity_type, description, xp_gained in reversed(recent)]
+            saved = self._state(data)
+            user = User.from_dict(data)
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            print(f"Error loading user: {e}")
+            return None
+        self._saved = saved
+        return user
+
+    def user_exists(self) -> bool:
+        return self._connection().execute("SELECT 1 FROM profile LIMIT 1").fetchone() is not None
+
+    def delete_user(self) -> None:
+        conn = self._connection()
+        with conn:
+            for table in ('profile', 'settings', 'completions', 'drill_results', 'activity', 'counter_history'):
+                conn.execute(f"DELETE FROM {table}")
+        self._saved = None
+        super().delete_user()
+
+    def monthly_summary(self, since: str) -> Optional[Dict]:
+        """
+        The same summary as the JSON history's, from the activity and counter_history tables, plus the
+        exercises and drills completed per concept since an ISO date
+        """
+        conn = self._connection()
+        start = datetime.fromisoformat(since).date()
+        week_start = (start - timedelta(days=start.weekday())).isoformat()  # best_week_xp counts whole weeks
+        days = conn.execute("SELECT substr(timestamp, 1, 10), COALESCE(SUM(xp_gained), 0) FROM activity "
+                            "WHERE timestamp >= ? GROUP BY 1", (week_start,)).fetchall()
+        summary = {'xp': sum(xp for day, xp in days if day >= since),
+                   'active_days': sum(1 for day, _ in days if day >= since)}
+
+        # Increases of each running total since the last row before the month, as StorageManager's rollups count
+        previous = conn.execute("SELECT exercises, drills, hints FROM counter_history WHERE timestamp < ? "
+                                "ORDER BY id DESC LIMIT 1", (since,)).fetchone()
+        totals = [0, 0, 0]
+        for row in conn.execute("SELECT exercises, drills, hints FROM counter_history WHERE timestamp >= ? "
+                                "ORDER BY id", (since,)):
+            if previous is not None:
+                totals = [total + max(0, value - before) for total, value, before in zip(totals, row, previous)]
+            previous = row
+        summary.update(zip(ActivityHistory.COUNTERS, totals))
+
+        weeks = defaultdict(int)
+        for day, xp in days:
+            year, week, _ = datetime.fromisoformat(day).isocalendar()
+            weeks[year, week] += xp
+        summary['best_week_xp'] = max(weeks.values(), default=0)
+        summary['by_concept'] = dict(conn.execute(
+            "SELECT concept, COUNT(*) FROM ("
+            "  SELECT concept FROM completions WHERE kind = 'exercise' AND first_completed_at >= ?"
+            "  UNION ALL SELECT concept FROM drill_results WHERE first_completed_at >= ?"
+            ") WHERE concept IS NOT NULL GROUP BY concept ORDER BY COUNT(*) DESC", (since, since)))
+        return summary
+
+
+class _TrackedDict(dict):
+    """A profile dict that reports in-place changes to its ProgressJournal"""
+
+    __slots__ = ('journal', 'name')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.journal: Optional['ProgressJournal'] = None
+        self.name = ""
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if self.journal is not None:
+            self.journal.record(self.name, ('k', key), ['k', self.name, key, value])
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        if self.journal is not None:
+            self.journal.record(self.name, ('k', key), ['d', self.name, key])
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        value = super().pop(key)
+        if self.journal is not None:
+            self.journal.record(self.name, ('k', key), ['d', self.name, key])
+        return value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return super().__getitem__(key)
+
+    # Bulk changes are journaled as a replacement of the whole field
+    def _replaced(self):
+        if self.journal is not None:
+            self.journal.replaced(self.name, self)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._replaced()
+
+    def __ior__(self, other):
+        super().update(other)
+        self._replaced()
+        return self
+
+    def clear(self):
+        super().clear()
+        self._replaced()
+
+    def popitem(self):
+        item = super().popitem()
+        self._replaced()
+        return item
+
+    def __deepcopy__(self, memo):
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+
+class _TrackedSet(set):
+    """A profile set that reports in-place changes to its ProgressJournal"""
+
+    __slots__ = ('journal', 'name')
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.journal: Optional['ProgressJournal'] = None
+        self.name = ""
+
+    def add(self, member):
+        if member not in self:
+            super().add(member)
+            if self.journal is not None:
+                self.journal.record(self.name, ('m', member), ['+', self.name, member])
+
+    def discard(self, member):
+        if member in self:
+            super().discard(member)
+            if self.journal is not None:
+                self.journal.record(self.name, ('m', member), ['-', self.name, member])
+
+    def remove(self, member):
+        if member not in self:
+            raise KeyError(member)
+        self.discard(member)
+
+    def _replaced(self):
+        if self.journal is not None:
+            self.journal.replaced(self.name, self)
+
+    def __deepcopy__(self, memo):
+        return set(self)
+
+
+class _TrackedSequence:
+    """Appends to a profile list or ring buffer, reported to its ProgressJournal"""
+
+    __slots__ = ()
+
+    def append(self, value):
+        super().append(value)
+        if self.journal is not None:
+            self.journal.appended(self.name, [value])
+
+    def extend(self, values):
+        values = list(values)
+        super().extend(values)
+        if self.journal is not None:
+            self.journal.appended(self.name, values)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def _replaced(self):
+        if self.journal is not None:
+            self.journal.replaced(self.name, self)
+
+
+class _TrackedList(_TrackedSequence, list):
+    """A profile list that reports in-place changes to its ProgressJournal"""
+
+    __slots__ = ('journal', 'name')
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.journal: Optional['ProgressJournal'] = None
+        self.name = ""
+
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(value, memo) for value in self]
+
+
+class _TrackedDeque(_TrackedSequence, deque):
+    """A profile ring buffer that reports in-place changes to its ProgressJournal"""
+
+    __slots__ = ('journal', 'name')
+
+    def __init__(self, iterable=(), maxlen=None):
+        super().__init__(iterable, maxlen)
+        self.journal: Optional['ProgressJournal'] = None
+        self.name = ""
+
+    def __deepcopy__(self, memo):
+        return deque((copy.deepcopy(value, memo) for value in self), self.maxlen)
+
+
+def _journal_bulk_changes(cls, names: Tuple[str, ...]):
+    """Make cls journal each of these (bulk) mutators as a replacement of the whole field"""
+    base = cls.__bases__[-1]
+    for name in names:
+        def change(self, *args, method=getattr(base, name), in_place=name.startswith('__i'), **kwargs):
+            result = method(self, *args, **kwargs)
+            self._replaced()
+            return self if in_place else result
+        change.__name__ = name
+        setattr(cls, name, change)
+
+
+_journal_bulk_changes(_TrackedSet, ('update', 'difference_update', 'intersection_update',
+                                    'symmetric_difference_update', 'clear', 'pop',
+                                    '__ior__', '__iand__', '__isub__', '__ixor__'))
+_journal_bulk_changes(_TrackedList, ('insert', 'pop', 'remove', 'clear', 'sort', 'reverse',
+                                     '__setitem__', '__delitem__', '__imul__'))
+_journal_bulk_changes(_TrackedDeque, ('appendleft', 'extendleft', 'insert', 'pop', 'popleft', 'remove', 'clear',
+                                      'rotate', 'reverse', '__setitem__', '__delitem__', '__imul__'))
+
+
+class ProgressJournal:
+    """
+    The profile changes made since the last save, as events for JournalStorageManager. Once a User
+    is attached it reports its field assignments, and its sets, dicts and lists (swapped for tracking
+    subclasses) report in-place changes. Changes to the same field, key or member coalesce, so a save
+    carries one event per thing that changed, however often it changed.
+    Events: ['=', field, value], ['k', field, key, value], ['d', field, key], ['+', field, member],
+    ['-', field, member] and ['a', field, values].
+    """
+
+    FIELDS = frozenset(User.__dataclass_fields__)
+    TRACKED_TYPES = ((set, _TrackedSet), (dict, _TrackedDict), (list, _TrackedList), (deque, _TrackedDeque))
+
+    def __init__(self):
+        self.seq = 0  # Number of the last batch of events handed out
+        self.events_since_snapshot = 0
+        self.user: Optional[User] = None
+        self._pending: Dict[Tuple, list] = {}
+
+    def attach(self, user: User):
+        """Start journaling user's changes (and stop journaling the previous user's)"""
+        if self.user is not None:
+            object.__setattr__(self.user, '_journal', None)
+            for name in self.FIELDS:
+                value = getattr(self.user, name)
+                if isinstance(value, (_TrackedDict, _TrackedSet, _TrackedSequence)):
+                    value.journal = None
+        self._pending.clear()
+        self.user = user
+        if user is not None:
+            for name in self.FIELDS:
+                object.__setattr__(user, name, self._track(name, getattr(user, name)))
+            object.__setattr__(user, '_journal', self)
+
+    def _track(self, name: str, value):
+        for plain, tracked in self.TRACKED_TYPES:
+            if isinstance(value, plain):
+                if type(value) is not tracked:
+                    value = tracked(value, value.maxlen) if plain is deque else tracked(value)
+                value.journal, value.name = self, name
+                break
+        return value
+
+    def assigned(self, name: str, value):
+        """A field was assigned; returns the value to store, wrapped for tracking if it is a container"""
+        value = self._track(name, value)
+        self.replaced(name, value)
+        return value
+
+    def replaced(self, name: str, value):
+        for key in [key for key in self._pending if key[0] == name]:
+            del self._pending[key]
+        self._pending[(name, '=')] = ['=', name, value]
+
+    def record(self, name: str, key: Tuple, event: list):
+        # A pending replacement already holds the live container, and with it this change
+        if (name, '=') not in self._pending:
+            self._pending[(name,) + key] = event
+
+    def appended(self, name: str, values: list):
+        if (name, '=') in self._pending:
+            return
+        event = self._pending.get((name, 'a'))
+        if event is None:
+            self._pending[(name, 'a')] = ['a', name, values]
+        else:
+            event[2].extend(values)
+
+    @staticmethod
+    def to_json(value):
+        """json.dumps() fallback for the containers events can hold"""
+        return sorted(value) if isinstance(value, set) else list(value)
+
+    def drain(self) -> List[list]:
+        events = list(self._pending.values())
+        self._pending.clear()
+        return events
+
+    @staticmethod
+    def apply(user: User, events: List[list]):
+        """Replay journaled events onto a profile"""
+        for event in events:
+            op, name = event[0], event[1]
+            if name not in ProgressJournal.FIELDS:
+                continue
+            if op == '=':
+                setattr(user, name, User.field_from_json(name, event[2]))
+            elif op == 'k':
+                getattr(user, name)[event[2]] = event[3]
+            elif op == 'd':
+                getattr(user, name).pop(event[2], None)
+            elif op == '+':
+                getattr(user, name).add(event[2])
+            elif op == '-':
+                getattr(user, name).discard(event[2])
+            elif op == 'a':
+                getattr(user, name).extend(User.field_from_json(name, event[2]))
+
+
+class JournalStorageManager(StorageManager):
+    """
+    Journaled profile storage. A save appends only what changed since the last one, as one line of
+    events, to profile.journal. Every COMPACT_EVERY events, and when the app closes, a full snapshot
+    (written atomically, like user.json) replaces the journal. Loading reads the snapshot and replays
+    the journal lines written after it. An existing user.json is imported on first use. The
+    activity history is kept in the same ActivityHistory as with user.json.
+    """
+
+    SNAPSHOT_NAME = "profile.snapshot.json"
+    JOURNAL_NAME = "profile.journal"
+    COMPACT_EVERY = 500
+
+    def __init__(self, data_dir: str = "codecompanion_data"):
+        super().__init__(data_dir)
+        self.json_file = self.user_file
+        self.user_file = os.path.join(data_dir, self.SNAPSHOT_NAME)
+        self.backup_file = self.user_file + ".bak"
+        self.journal_file = os.path.join(data_dir, self.JOURNAL_NAME)
+        self.journal = ProgressJournal()
+        self._needs_snapshot = True  # No snapshot of the attached profile on disk yet
+        self._torn = False  # The journal ends in a partly written line
+
+    def capture(self, user: User, final: bool = False) -> Any:
+        records = self.history.capture(user)
+        return self._capture_profile(user, final) + ([('history', records)] if records else [])
+
+    def _capture_profile(self, user: User, final: bool) -> list:
+        journal = self.journal
+        if journal.user is not user:
+            journal.attach(user)
+            self._needs_snapshot = True
+        if final or self._needs_snapshot or journal.events_since_snapshot >= self.COMPACT_EVERY:
+            journal.drain()
+            journal.events_since_snapshot = 0
+            self._needs_snapshot = False
+            return [('snapshot', {'journal_seq': journal.seq, 'user': user.to_dict()})]
+        events = journal.drain()
+        if not events:
+            return []
+        journal.seq += 1
+        journal.events_since_snapshot += len(events)
+        return [('events', json.dumps({'seq': journal.seq, 'events': events}, default=ProgressJournal.to_json))]
+
+    def merge_pending(self, older: Any, newer: Any) -> Any:
+        combined = older + newer
+        for index in range(len(combined) - 1, -1, -1):
+            if combined[index][0] == 'snapshot':  # Journal lines before a snapshot are already in it
+                return [item for item in combined[:index] if item[0] == 'history'] + combined[index:]
+        return combined
+
+    def store(self, payload: Any) -> bool:
+        while payload:
+            kind, data = payload[0]
+            if kind == 'snapshot':
+                if not self.save_user_data(data):
+                    return False
+                # Lines left behind by a crash right here are older than the snapshot and get skipped
+                if os.path.exists(self.journal_file) and os.path.getsize(self.journal_file) > 0:
+                    if not self._write_journal('w', ""):
+                        return False
+            elif kind == 'history':
+                if not self.history.append(data):
+                    return False
+            elif not self._write_journal('a', ("\n" if self._torn else "") + data + "\n"):
+                return False
+            del payload[0]  # Stored; a retry after a later failure starts from the next item
+        return True
+
+    def _write_journal(self, mode: str, text: str) -> bool:
+        try:
+            with open(self.journal_file, mode) as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"Error writing progress journal: {e}")
+            self._torn = mode == 'a'
+            return False
+        self._torn = False
+        return True
+
+    def load_user(self) -> Optional[User]:
+        user = self._load_file(self.user_file, self._restore)
+        if user is None and os.path.exists(self.json_file):
+            user = self._load_file(self.json_file, StorageManager._parse_profile)
+            if user is not None:
+                print(f"Imported user profile from {self.json_file}")
+        return user
+
+    def _restore(self, text: str) -> User:
+        """The snapshot's profile with the journal replayed on top of it"""
+        data = json.loads(text)
+        user = User.from_dict(data['user'])
+        seq = data.get('journal_seq', 0)
+        replayed = 0
+        if os.path.exists(self.journal_file):
+            line = ""
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        continue  # Torn by a crash mid-write
+                    if batch['seq'] <= seq:
+                        continue  # Already in the snapshot, or written twice by a retried save
+                    ProgressJournal.apply(user, batch['events'])
+                    seq = batch['seq']
+                    replayed += len(batch['events'])
+            self._torn = bool(line) and not line.endswith("\n")
+        self.journal.attach(user)
+        self.journal.seq = seq
+        self.journal.events_since_snapshot = replayed
+        self._needs_snapshot = False
+        return user
+
+    def user_exists(self) -> bool:
+        return super().user_exists() or os.path.exists(self.json_file)
+
+    def delete_user(self) -> None:
+        super().delete_user()
+        for path in (self.journal_file, self.json_file, self.json_file + ".bak"):
+            if os.path.exists(path):
+                os.remove(path)
+        self.journal.attach(None)
+        self._needs_snapshot = True
+
+
+class ProfileWriter:
+    """
+    Write-behind saving of the user profile. Handlers call mark_dirty(), which only captures the
+    profile (see StorageManager.capture); a background thread stores what was captured once no change
+    has come in for QUIET_SECONDS, so a burst of changes costs one write and the Tk thread never waits
+    on the disk. flush() writes whatever is pending straight away.
+    """
+
+    QUIET_SECONDS = 0.5
+
+    def __init__(self, storage: StorageManager, quiet_seconds: float = QUIET_SECONDS):
+        self.storage = storage
+        self.quiet_seconds = quiet_seconds
+        self._pending: Any = None
+        self._last_change = 0.0
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()  # Keeps writes in order between the thread and flush()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="profile-writer", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self, user: User):
+        """Schedule a save; the profile is captured now, on the caller's thread, while it is consistent"""
+        self._queue(self.storage.capture(user))
+
+    def _queue(self, payload: Any):
+        with self._condition:
+            self._pending = payload if self._pending is None else self.storage.merge_pending(self._pending, payload)
+            self._last_change = time.monotonic()
+            self._condition.notify()
+
+    def flush(self):
+        with self._write_lock:
+            with self._condition:
+                data, self._pending = self._pending, None
+            if data is not None and not self.storage.store(data):
+                with self._condition:  # Retry after another quiet period, together with anything newer
+                    self._pending = data if self._pending is None else self.storage.merge_pending(data, self._pending)
+                    self._last_change = time.monotonic()
+                    self._condition.notify()
+
+    def discard(self):
+        """Drop any pending save (the profile is being deleted); waits out a write already under way"""
+        with self._write_lock:
+            with self._condition:
+                self._pending = None
+
+    def close(self, user: Optional[User] = None):
+        """Stop the thread and write anything still pending, with a final capture of user if given"""
+        if user is not None:
+            self._queue(self.storage.capture(user, final=True))
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                remaining = self._last_change + self.quiet_seconds - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+            self.flush()
+
+
+class ProfileLock:
+    """
+    An advisory lock on one file, held while an app instance has a profile open, so a second
+    instance cannot write the same learner's progress. Uses flock() on POSIX and msvcrt's byte
+    locks on Windows; where neither exists, locking always succeeds.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = False) -> bool:
+        f = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        finally:
+            self._file.close()
+            self._file = None
+
+
+class ProfileRegistry:
+    """
+    The learners on this machine. profiles.json indexes them by id with the summary the profile
+    picker shows (name, level, companion, last active), so the picker never opens a profile. Each
+    profile keeps its data in a directory of its own under profiles/. A profile saved before the
+    registry existed stays where it is, in the data directory itself, as the 'default' profile.
+    """
+
+    INDEX_NAME = "profiles.json"
+    LEGACY_FILES = ("user.json", "user.json.bak", "profile.snapshot.json", SQLiteStorageManager.DB_NAME)
+
+    def __init__(self, data_dir: str = "codecompanion_data"):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.index_file = os.path.join(data_dir, self.INDEX_NAME)
+        self.profiles_dir = os.path.join(data_dir, "profiles")
+
+    def list(self) -> List[Dict]:
+        """Profile summaries, most recently active first"""
+        profiles = self._read_index()
+        if profiles is None:
+            profiles = self._scan()
+            self._update(lambda index: index.update(profiles))
+        return sorted((dict(summary, id=profile_id) for profile_id, summary in profiles.items()),
+                      key=lambda summary: summary.get('last_active') or "", reverse=True)
+
+    def create(self, name: str) -> str:
+        """Register a new, empty profile; returns its id"""
+        ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+        slug = re.sub(r'[^a-z0-9]+', '-', ascii_name.lower()).strip('-') or "learner"
+        profile_id, number = slug, 1
+        existing = self._read_index() or {}
+        while profile_id in existing or os.path.exists(os.path.join(self.profiles_dir, profile_id)):
+            number += 1
+            profile_id = f"{slug}-{number}"
+        os.makedirs(os.path.join(self.profiles_dir, profile_id))
+        summary = {'name': name, 'dir': os.path.join("profiles", profile_id)}
+        self._update(lambda index: index.__setitem__(profile_id, summary))
+        return profile_id
+
+    def data_dir_for(self, profile_id: str) -> str:
+        summary = (self._read_index() or {}).get(profile_id, {})
+        return os.path.join(self.data_dir, summary.get('dir', os.path.join("profiles", profile_id)))
+
+    def lock(self, profile_id: str) -> Optional[ProfileLock]:
+        """Take the profile's lock, or None if another instance has it open"""
+        lock = ProfileLock(os.path.join(self.data_dir_for(profile_id), ".lock"))
+        return lock if lock.acquire() else None
+
+    def update(self, profile_id: str, user: User):
+        """Refresh the profile's summary in the index, writing it only if something shown changed"""
+        summary = {'name': user.username, 'level': user.level, 'xp': user.xp,
+                   'companion_type': user.companion_type, 'last_active': user.last_active}
+        current = (self._read_index() or {}).get(profile_id)
+        if current is not None and all(current.get(key) == value for key, value in summary.items()):
+            return
+        self._update(lambda index: index.setdefault(profile_id, {'dir': os.path.join("profiles", profile_id)})
+                     .update(summary))
+
+    def remove(self, profile_id: str):
+        """Drop a profile from the index, and its directory if it has one of its own"""
+        data_dir = self.data_dir_for(profile_id)
+        self._update(lambda index: index.pop(profile_id, None))
+        if os.path.abspath(data_dir) != os.path.abspath(self.data_dir) and os.path.isdir(data_dir):
+            for root, dirs, files in os.walk(data_dir, topdown=False):
+                for name in files:
+                    os.remove(os.path.join(root, name))
+                for name in dirs:
+                    os.rmdir(os.path.join(root, name))
+            os.rmdir(data_dir)
+
+    def _read_index(self) -> Optional[Dict[str, Dict]]:
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)['profiles']
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Rebuilt rather than empty, so no learner is hidden and the next write doesn't orphan them
+            print(f"Error reading profile index, rebuilding it from the profile directories: {e}")
+            return self._scan()
+
+    def _scan(self) -> Dict[str, Dict]:
+        """An index of the profiles on disk; each is named, and its summary filled in, when it is next opened"""
+        profiles = {}
+        if any(os.path.exists(os.path.join(self.data_dir, name)) for name in self.LEGACY_FILES):
+            profiles['default'] = {'name': None, 'dir': ""}
+        if os.path.isdir(self.profiles_dir):
+            for profile_id in sorted(os.listdir(self.profiles_dir)):
+                if os.path.isdir(os.path.join(self.profiles_dir, profile_id)):
+                    profiles[profile_id] = {'name': None, 'dir': os.path.join("profiles", profile_id)}
+        return profiles
+
+    def _update(self, change):
+        """Read, change and rewrite the index while holding its lock, so instances never lose each other's edits"""
+        lock = ProfileLock(self.index_file + ".lock")
+        lock.acquire(blocking=True)
+        try:
+            index = self._read_index() or {}
+            change(index)
+            temp_file = self.index_file + ".tmp"
+            with open(temp_file, 'w') as f:
+                json.dump({'version': 1, 'profiles': index}, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.index_file)
+        except OSError as e:
+            print(f"Error saving profile index: {e}")
+        finally:
+            lock.release()
+
+
+class BackupStore:
+    """
+    Automatic rolling backups of one profile, deduplicated by content. A snapshot is the profile in
+    backup format (StorageManager.backup_bytes) cut into content-defined chunks: a chunk ends after a
+    ',' or newline whose preceding token hashes to a boundary value, so an edit only changes the
+    chunks around it and the rest are identical to the previous snapshot's. Each distinct chunk is
+    stored once, gzip-compressed and named by its sha256, under chunks/; a snapshot is a small
+    manifest in snapshots/ listing its chunks. Old snapshots are pruned to the newest of each of the
+    last KEEP_HOURLY hours, KEEP_DAILY days and KEEP_WEEKLY weeks, and chunks no snapshot uses are
+    deleted.
+    """
+
+    MIN_CHUNK = 2 * 1024
+    MAX_CHUNK = 64 * 1024
+    BOUNDARY_MASK = 0x1FF  # About one token in 512 ends a chunk: around 10 KB chunks for profile JSON
+    KEEP_HOURLY = 24
+    KEEP_DAILY = 7
+    KEEP_WEEKLY = 8
+    INTERVAL_SECONDS = 3600  # How often the app takes one while a profile is open
+
+    def __init__(self, path: str):
+        self.path = path
+        self.chunks_dir = os.path.join(path, "chunks")
+        self.snapshots_dir = os.path.join(path, "snapshots")
+        self._lock = threading.Lock()  # Snapshots from the timer thread and on close take turns
+
+    @classmethod
+    def split(cls, data: bytes) -> List[bytes]:
+        """Content-defined chunks of data, MIN_CHUNK to about MAX_CHUNK bytes each"""
+        chunks, start, size = [], 0, 0
+        for token in re.split(rb'(?<=[,\n])', data):
+            size += len(token)
+            if size >= cls.MAX_CHUNK or (size >= cls.MIN_CHUNK and zlib.crc32(token) & cls.BOUNDARY_MASK == 0):
+                chunks.append(data[start:start + size])
+                start, size = start + size, 0
+        if size:
+            chunks.append(data[start:])
+        return chunks
+
+    def snapshot(self, data: Dict, now: Optional[datetime] = None) -> Optional[str]:
+        """Back up a profile (a to_dict() snapshot) and prune; the new snapshot's id, or None if unchanged"""
+        payload = b"".join(StorageManager.backup_bytes(data))
+        digest = hashlib.sha256(payload).hexdigest()
+        now = now or datetime.now()
+        with self._lock:
+            try:
+                snapshots = self.snapshots()
+                if snapshots and snapshots[-1]['sha256'] == digest:
+                    return None
+                hashes = []
+                written_dirs = set()
+                for chunk in self.split(payload):
+                    chunk_hash = hashlib.sha256(chunk).hexdigest()
+                    hashes.append(chunk_hash)
+                    chunk_file = self._chunk_file(chunk_hash)
+                    if not os.path.exists(chunk_file):
+                        os.makedirs(os.path.dirname(chunk_file), exist_ok=True)
+                        self._write_file(chunk_file, gzip.compress(chunk))
+                        written_dirs.add(os.path.dirname(chunk_file))
+                for directory in written_dirs:
+                    StorageManager._fsync_dir(directory)
+                snapshot_id = now.strftime("%Y%m%d-%H%M%S")
+                while any(snapshot['id'] == snapshot_id for snapshot in snapshots):
+                    snapshot_id += "a"
+                manifest = {'id': snapshot_id, 'created': now.isoformat(), 'size': len(payload),
+                            'sha256': digest, 'chunks': hashes}
+                os.makedirs(self.snapshots_dir, exist_ok=True)
+                # Chunks first, on disk before the manifest is written: a crash or power loss leaves unused
+                # chunks for the next prune, never a manifest whose chunks are missing or empty
+                self._write_file(os.path.join(self.snapshots_dir, snapshot_id + ".json"),
+                                 json.dumps(manifest, separators=(',', ':')).encode('utf-8'))
+                StorageManager._fsync_dir(self.snapshots_dir)
+                self._prune(snapshots + [manifest], now)
+                return snapshot_id
+            except OSError as e:
+                print(f"Error backing up profile: {e}")
+                return None
+
+    def snapshots(self) -> List[Dict]:
+        """Snapshot manifests, oldest first"""
+        manifests = []
+        if os.path.isdir(self.snapshots_dir):
+            for name in os.listdir(self.snapshots_dir):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.snapshots_dir, name), 'r') as f:
+                        manifests.append(json.load(f))
+                except (OSError, ValueError) as e:
+                    print(f"Error reading backup {name}: {e}")
+        return sorted(manifests, key=lambda manifest: manifest['created'])
+
+    def restore(self, snapshot_id: str) -> Optional[User]:
+        """The profile as it was in a snapshot ('latest' for the newest), checked against its sha256"""
+        snapshots = self.snapshots()
+        if snapshot_id == "latest" and snapshots:
+            snapshot_id = snapshots[-1]['id']
+        manifest = next((snapshot for snapshot in snapshots if snapshot['id'] == snapshot_id), None)
+        if manifest is None:
+            print(f"No backup {snapshot_id}")
+            return None
+        try:
+            parts = []
+            for chunk_hash in manifest['chunks']:
+                with open(self._chunk_file(chunk_hash), 'rb') as f:
+                    parts.append(gzip.decompress(f.read()))
+            payload = b"".join(parts)
+            if hashlib.sha256(payload).hexdigest() != manifest['sha256']:
+                print(f"Backup {snapshot_id} is damaged")
+                return None
+            return StorageManager.read_backup(io.BytesIO(payload), len(payload))
+        except (OSError, ValueError, EOFError) as e:
+            print(f"Error restoring backup {snapshot_id}: {e}")
+            return None
+
+    def stored_bytes(self) -> int:
+        """Disk used by the chunks"""
+        total = 0
+        for root, _, files in os.walk(self.chunks_dir):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total
+
+    def _prune(self, snapshots: List[Dict], now: datetime):
+        """
+        Keep the newest snapshot in each of the KEEP_HOURLY hours, KEEP_DAILY days and KEEP_WEEKLY weeks
+        up to now, and the newest snapshot of all; delete the rest and the chunks no kept snapshot uses
+        """
+        windows = (
+            ({(now - timedelta(hours=back)).isoformat()[:13] for back in range(self.KEEP_HOURLY)},
+             lambda created: created[:13]),
+            ({(now - timedelta(days=back)).isoformat()[:10] for back in range(self.KEEP_DAILY)},
+             lambda created: created[:10]),
+            ({tuple((now - timedelta(weeks=back)).isocalendar()[:2]) for back in range(self.KEEP_WEEKLY)},
+             lambda created: tuple(datetime.fromisoformat(created).isocalendar()[:2])),
+        )
+        keep = {snapshots[-1]['id']} if snapshots else set()  # However long ago, the latest backup stays
+        for periods, bucket in windows:
+            seen = set()
+            for snapshot in reversed(snapshots):
+                key = bucket(snapshot['created'])
+                if key in periods and key not in seen:
+                    seen.add(key)
+                    keep.add(snapshot['id'])
+        for snapshot in snapshots:
+            if snapshot['id'] not in keep:
+                os.remove(os.path.join(self.snapshots_dir, snapshot['id'] + ".json"))
+        used = {chunk_hash for snapshot in snapshots if snapshot['id'] in keep for chunk_hash in snapshot['chunks']}
+        for root, _, files in os.walk(self.chunks_dir):
+            for name in files:
+                if name not in used:
+                    os.remove(os.path.join(root, name))
+
+    def _chunk_file(self, chunk_hash: str) -> str:
+        return os.path.join(self.chunks_dir, chunk_hash[:2], chunk_hash)
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        temp_file = path + ".tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+
+
+def open_storage(backend: str, data_dir: str) -> StorageManager:
+    """The storage for a profile directory: 'json' (user.json), 'sqlite' or 'journal'"""
+    if backend == "sqlite":
+        return SQLiteStorageManager(
+            data_dir, item_concept=lambda item_id: getattr(ContentEngine.get_item_ref(item_id), 'concept', None))
+    if backend == "journal":
+        return JournalStorageManager(data_dir)
+    return StorageManager(data_dir)
+
 
 # ============================================================================
 # SECTION 2: LEARNING CONTENT ENGINE
 # ============================================================================
 
-@dataclass
+# Content records are immutable and, from Python 3.10 (which added slots=), slotted:
+# no per-instance __dict__ matters once a catalog holds tens of thousands of items
+CONTENT_RECORD = {'frozen': True, 'slots': True} if sys.version_info >= (3, 10) else {'frozen': True}
+
+
+def _compact(record, tuples=(), interned=()):
+    """Normalise a content record after construction: list fields become tuples, repeated strings are interned"""
+    for name in tuples:
+        value = getattr(record, name)
+        if not isinstance(value, tuple):
+            object.__setattr__(record, name, tuple(value))
+    for name in interned:
+        value = getattr(record, name)
+        if type(value) is str:
+            object.__setattr__(record, name, sys.intern(value))
+
+
+@dataclass(**CONTENT_RECORD)
 class CodeExample:
     code: str
     explanation: str
 
 
-@dataclass
+@dataclass(**CONTENT_RECORD)
 class MultipleChoiceQuestion:
     id: str
     question: str
-    choices: List[str]  # List of choices (A, B, C, D)
+    choices: Tuple[str, ...]  # Choices (A, B, C, D)
     correct_answer: int  # Index of correct answer (0-3)
     explanation: str
     difficulty: int
     concept: str
 
+    def __post_init__(self):
+        _compact(self, tuples=('choices',), interned=('concept',))
+
     def check_answer(self, selected_index: int) -> bool:
         return selected_index == self.correct_answer
 
 
-@dataclass
+@dataclass(**CONTENT_RECORD)
 class MultiAnswerQuestion:
     id: str
     question: str
-    choices: List[str]
-    correct_answers: List[int]  # List of correct indices
+    choices: Tuple[str, ...]
+    correct_answers: Tuple[int, ...]  # Correct indices
     explanation: str
     difficulty: int
     concept: str
 
+    def __post_init__(self):
+        _compact(self, tuples=('choices', 'correct_answers'), interned=('concept',))
+
     def check_answer(self, selected_indices: List[int]) -> bool:
         return set(selected_indices) == set(self.correct_answers)
 
 
-@dataclass
+@dataclass(**CONTENT_RECORD)
 class OutputDrill:
     id: str
     code: str
@@ -480,12 +2074,15 @@ class OutputDrill:
     difficulty: int
     concept: str
 
+    def __post_init__(self):
+        _compact(self, interned=('concept',))
+
     def check_answer(self, user_answer: str) -> bool:
         # Normalize whitespace for comparison
         return user_answer.strip() == self.correct_output.strip()
 
 
-@dataclass
+@dataclass(**CONTENT_RECORD)
 class BugFixDrill:
     """Find and fix the bug in the code"""
     id: str
@@ -496,7 +2093,10 @@ class BugFixDrill:
     explanation: str
     difficulty: int
     concept: str
-    hints: List[str] = field(default_factory=list)
+    hints: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        _compact(self, tuples=('hints',), interned=('bug_type', 'concept'))
 
     def check_answer(self, user_code: str) -> Tuple[bool, str]:
         """Check if the bug is fixed - run both codes and compare"""
@@ -511,7 +2111,7 @@ class BugFixDrill:
         # Try executing both to see if they produce same result
         executor = CodeExecutor()
         user_success, user_output, user_error = executor.execute_code(user_code)
-        correct_success, correct_output, correct_error = executor.execute_code(self.correct_code)
+        correct_success, correct_output, correct_error = CodeExecutor.reference_output(self.correct_code)
         
         if user_success and correct_success:
             if user_output.strip() == correct_output.strip():
@@ -520,21 +2120,26 @@ class BugFixDrill:
         return False, "Bug still present or code doesn't work correctly"
 
 
-@dataclass
+@dataclass(**CONTENT_RECORD)
 class Exercise:
     id: str
     prompt: str
-    test_cases: List[Tuple[str, Any]]
-    hints: List[str]
+    test_cases: Tuple[Tuple[str, Any], ...]
+    hints: Tuple[str, ...]
     difficulty: int
     concept: str
     starter_code: str = ""
+    solution: str = ""  # Reference solution, checked against test_cases by `validate`
+
+    def __post_init__(self):
+        object.__setattr__(self, 'test_cases', tuple(tuple(case) for case in self.test_cases))
+        _compact(self, tuples=('hints',), interned=('concept',))
 
     def validate_solution(self, user_code: str) -> Tuple[bool, str, List[str]]:
-        executor = CodeExecutor()
+        # Compile once, then feed every test case's stdin fixture to the same program
+        case_results = CodeExecutor.run_cases(user_code, (test_input for test_input, _ in self.test_cases))
         results = []
-        for test_input, expected in self.test_cases:
-            success, output, error = executor.execute_code(user_code, test_input)
+        for (test_input, expected), (success, output, error) in zip(self.test_cases, case_results):
             if not success:
                 return False, f"Runtime Error: {error}", [error]
             # More flexible output comparison
@@ -548,21 +2153,40 @@ class Exercise:
         return True, "Perfect! All tests passed! 🎉", []
 
 
-@dataclass
+@dataclass(**CONTENT_RECORD)
 class Lesson:
     id: str
     title: str
     concept: str
-    examples: List[CodeExample]
-    exercises: List[Exercise]
-    prerequisites: List[str]
+    examples: Tuple[CodeExample, ...]
+    exercises: Tuple[Exercise, ...]
+    prerequisites: Tuple[str, ...]
     xp_reward: int
     skill_path: str
     difficulty: int = 1  # 1=Easy, 2=Medium, 3=Hard
-    mcq_questions: List[MultipleChoiceQuestion] = field(default_factory=list)
-    multi_answer_questions: List[MultiAnswerQuestion] = field(default_factory=list)
-    output_drills: List[OutputDrill] = field(default_factory=list)
-    bug_fix_drills: List[BugFixDrill] = field(default_factory=list)
+    mcq_questions: Tuple[MultipleChoiceQuestion, ...] = ()
+    multi_answer_questions: Tuple[MultiAnswerQuestion, ...] = ()
+    output_drills: Tuple[OutputDrill, ...] = ()
+    bug_fix_drills: Tuple[BugFixDrill, ...] = ()
+
+    def __post_init__(self):
+        object.__setattr__(self, 'prerequisites', tuple(sys.intern(p) for p in self.prerequisites))
+        _compact(self, tuples=('examples', 'exercises', 'mcq_questions', 'multi_answer_questions',
+                               'output_drills', 'bug_fix_drills'), interned=('skill_path',))
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Lesson':
+        data = dict(data)
+        data['examples'] = [CodeExample(**e) for e in data.get('examples', [])]
+        data['exercises'] = [Exercise(**e) for e in data.get('exercises', [])]
+        data['mcq_questions'] = [MultipleChoiceQuestion(**q) for q in data.get('mcq_questions', [])]
+        data['multi_answer_questions'] = [MultiAnswerQuestion(**q) for q in data.get('multi_answer_questions', [])]
+        data['output_drills'] = [OutputDrill(**d) for d in data.get('output_drills', [])]
+        data['bug_fix_drills'] = [BugFixDrill(**d) for d in data.get('bug_fix_drills', [])]
+        return cls(**data)
 
 
 @dataclass
@@ -578,43 +2202,1490 @@ class DailyChallenge:
         # Use date as seed for consistent daily challenges
         random.seed(date_str)
 
-        challenges = [
+        exercise = random.choice(DailyChallenge.exercises_for_date(date_str))
+        return DailyChallenge(date=date_str, exercise=exercise, bonus_xp=50)
+
+    @staticmethod
+    def exercises_for_date(date_str: str) -> List[Exercise]:
+        """Every exercise a daily challenge can draw from"""
+        return [
             Exercise(
                 id=f"daily_{date_str}_1",
                 prompt="Create a function that returns the sum of all even numbers from 1 to n.",
                 test_cases=[("10", "30"), ("5", "6"), ("1", "0")],
+                solution="def sum_evens(n):\n    total = 0\n    for i in range(2, n + 1, 2):\n        total += i\n    return total\n\nprint(sum_evens(int(input())))",
                 hints=["Use a loop from 1 to n", "Check if number % 2 == 0", "Add even numbers to a sum"],
                 difficulty=2,
                 concept="loops",
-                starter_code="def sum_evens(n):\n    # Your code here\n    pass\n\nprint(sum_evens(10))"
+                starter_code="def sum_evens(n):\n    # Your code here\n    pass\n\nprint(sum_evens(int(input())))"
             ),
             Exercise(
                 id=f"daily_{date_str}_2",
                 prompt="Write a function that reverses a string.",
-                test_cases=[("'hello'", "olleh"), ("'Python'", "nohtyP")],
+                test_cases=[("hello", "olleh"), ("Python", "nohtyP")],
+                solution="def reverse_string(s):\n    return s[::-1]\n\nprint(reverse_string(input()))",
                 hints=["Use string slicing [::-1]", "Or use a loop to build reversed string"],
                 difficulty=2,
                 concept="strings",
-                starter_code="def reverse_string(s):\n    # Your code here\n    pass\n\nprint(reverse_string('hello'))"
+                starter_code="def reverse_string(s):\n    # Your code here\n    pass\n\nprint(reverse_string(input()))"
             ),
             Exercise(
                 id=f"daily_{date_str}_3",
                 prompt="Create a function that counts vowels in a string.",
-                test_cases=[("'hello'", "2"), ("'Python'", "1")],
+                test_cases=[("hello", "2"), ("Python", "1")],
+                solution="def count_vowels(s):\n    return sum(1 for c in s if c in 'aeiouAEIOU')\n\nprint(count_vowels(input()))",
                 hints=["Define vowels = 'aeiouAEIOU'", "Loop through string", "Check if char in vowels"],
                 difficulty=2,
                 concept="strings",
-                starter_code="def count_vowels(s):\n    # Your code here\n    pass\n\nprint(count_vowels('hello'))"
+                starter_code="def count_vowels(s):\n    # Your code here\n    pass\n\nprint(count_vowels(input()))"
             ),
         ]
 
-        exercise = random.choice(challenges)
-        return DailyChallenge(date=date_str, exercise=exercise, bonus_xp=50)
 
+LESSON_ITEM_KINDS = [
+    # (item type used by LessonView, Lesson attribute holding those items)
+    ('exercise', 'exercises'),
+    ('mcq', 'mcq_questions'),
+    ('multi_answer', 'multi_answer_questions'),
+    ('drill', 'output_drills'),
+    ('bug_fix', 'bug_fix_drills'),
+]
+
+
+def iter_lesson_items(lesson: Lesson):
+    """Yield (item_type, item) for every practice item of a lesson, in lesson order"""
+    for item_type, attr in LESSON_ITEM_KINDS:
+        for item in getattr(lesson, attr):
+            yield item_type, item
+
+
+def content_hash(value) -> str:
+    """Stable fingerprint of a content object (dataclass or plain data), independent of dict key order"""
+    if hasattr(value, '__dataclass_fields__'):
+        value = asdict(value)
+    data = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=12).hexdigest()
+
+
+@dataclass(**CONTENT_RECORD)
+class ItemRef:
+    """Lightweight descriptor of a practice item, available without loading its lesson"""
+    id: str
+    item_type: str
+    concept: str
+    difficulty: int
+    lesson_id: str
+    content_hash: str = ""  # Changes whenever the item's content does; keys derived caches
+
+    def __post_init__(self):
+        _compact(self, interned=('item_type', 'concept', 'lesson_id'))
+
+
+@dataclass(**CONTENT_RECORD)
+class LessonSummary:
+    """Manifest entry for a lesson: enough to render the lessons grid without the lesson body"""
+    id: str
+    title: str
+    skill_path: str
+    prerequisites: Tuple[str, ...]
+    xp_reward: int
+    difficulty: int = 1
+    items: Tuple[ItemRef, ...] = ()
+    file: str = ""
+    content_hash: str = ""  # Hash of the whole lesson body, items included
+
+    def __post_init__(self):
+        object.__setattr__(self, 'prerequisites', tuple(sys.intern(p) for p in self.prerequisites))
+        _compact(self, tuples=('items',), interned=('id', 'skill_path'))
+
+    @property
+    def item_count(self) -> int:
+        return len(self.items)
+
+    @classmethod
+    def from_lesson(cls, lesson: Lesson, file: str = "") -> 'LessonSummary':
+        items = [ItemRef(item.id, item_type, item.concept, item.difficulty, lesson.id, content_hash(item))
+                 for item_type, item in iter_lesson_items(lesson)]
+        return cls(id=lesson.id, title=lesson.title, skill_path=lesson.skill_path,
+                   prerequisites=list(lesson.prerequisites), xp_reward=lesson.xp_reward,
+                   difficulty=lesson.difficulty, items=items, file=file, content_hash=content_hash(lesson))
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'title': self.title,
+            'skill_path': self.skill_path,
+            'prerequisites': self.prerequisites,
+            'xp_reward': self.xp_reward,
+            'difficulty': self.difficulty,
+            'items': [[ref.id, ref.item_type, ref.concept, ref.difficulty, ref.content_hash] for ref in self.items],
+            'file': self.file,
+            'hash': self.content_hash,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LessonSummary':
+        # Item entries are [id, type, concept, difficulty] plus a content hash in newer manifests
+        items = [ItemRef(entry[0], entry[1], entry[2], entry[3], data['id'], entry[4] if len(entry) > 4 else "")
+                 for entry in data.get('items', [])]
+        return cls(id=data['id'], title=data['title'], skill_path=data['skill_path'],
+                   prerequisites=list(data.get('prerequisites', [])), xp_reward=data.get('xp_reward', 0),
+                   difficulty=data.get('difficulty', 1), items=items,
+                   file=data.get('file', f"lessons/{data['id']}.json"), content_hash=data.get('hash', ""))
+
+
+class LessonPack:
+    """A lesson pack on disk: manifest.json plus one JSON file per lesson body"""
+
+    MANIFEST_NAME = "manifest.json"
+    FORMAT_VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(os.path.normpath(path))
+
+    @staticmethod
+    def discover(packs_dir: str) -> List['LessonPack']:
+        """Find every pack under packs_dir: directories containing a manifest, and zip packs"""
+        if not os.path.isdir(packs_dir):
+            return []
+        packs = []
+        for entry in sorted(os.listdir(packs_dir)):
+            pack_path = os.path.join(packs_dir, entry)
+            if os.path.isfile(os.path.join(pack_path, LessonPack.MANIFEST_NAME)):
+                packs.append(LessonPack(pack_path))
+            elif entry.lower().endswith(ZipLessonPack.EXTENSION) and os.path.isfile(pack_path):
+                packs.append(ZipLessonPack(pack_path))
+        return packs
+
+    def _read_json(self, name: str):
+        with open(os.path.join(self.path, name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def read_manifest(self) -> List[LessonSummary]:
+        manifest = self._read_json(self.MANIFEST_NAME)
+        if manifest.get('format', 1) > self.FORMAT_VERSION:
+            raise ValueError(f"Pack format {manifest.get('format')} is newer than this app supports")
+        return [LessonSummary.from_dict(entry) for entry in manifest.get('lessons', [])]
+
+    def load_lesson(self, summary: LessonSummary) -> Lesson:
+        return Lesson.from_dict(self._read_json(summary.file))
+
+    def close(self) -> None:
+        """Release any open handles (directory packs hold none)"""
+
+    def file_stats(self) -> List[Tuple[str, int, int]]:
+        """(relative path, size, mtime_ns) for every file in the pack - cheap change detection"""
+        stats = []
+        for folder, _, files in os.walk(self.path):
+            for name in files:
+                full_path = os.path.join(folder, name)
+                st = os.stat(full_path)
+                stats.append((os.path.relpath(full_path, self.path), st.st_size, st.st_mtime_ns))
+        return sorted(stats)
+
+    @staticmethod
+    def write(path: str, lessons: Iterable[Lesson], title: str = "") -> 'LessonPack':
+        """Write lessons out as a pack: a manifest plus lessons/<id>.json bodies"""
+        os.makedirs(os.path.join(path, "lessons"), exist_ok=True)
+        summaries = []
+        for lesson in lessons:
+            summary = LessonSummary.from_lesson(lesson, file=f"lessons/{lesson.id}.json")
+            with open(os.path.join(path, summary.file), 'w', encoding='utf-8') as f:
+                json.dump(lesson.to_dict(), f, indent=2, ensure_ascii=False)
+            summaries.append(summary)
+
+        manifest = {
+            'format': LessonPack.FORMAT_VERSION,
+            'title': title or os.path.basename(os.path.normpath(path)),
+            'lessons': [summary.to_dict() for summary in summaries],
+        }
+        with open(os.path.join(path, LessonPack.MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        return LessonPack(path)
+
+
+class ZipLessonPack(LessonPack):
+    """
+    A lesson pack shipped as one zip file and read in place, never extracted.
+    Opening the archive reads only its central directory (the member index at the end of the file),
+    so loading a lesson seeks straight to that member and decompresses nothing else.
+    """
+
+    EXTENSION = ".zip"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.name = os.path.splitext(self.name)[0]
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._prefix = ""
+        self._lock = threading.Lock()  # Members share one file handle
+
+    def _archive(self) -> zipfile.ZipFile:
+        if self._zip is None:
+            archive = zipfile.ZipFile(self.path)
+            names = set(archive.namelist())
+            if self.MANIFEST_NAME not in names:
+                # Zipped from the parent folder: everything sits under one top-level directory
+                nested = [name for name in names if name.count('/') == 1 and name.endswith('/' + self.MANIFEST_NAME)]
+                if len(nested) != 1:
+                    archive.close()
+                    raise ValueError(f"No {self.MANIFEST_NAME} in {self.path}")
+                self._prefix = nested[0][:-len(self.MANIFEST_NAME)]
+            self._zip = archive
+        return self._zip
+
+    def _read_json(self, name: str):
+        with self._lock:
+            data = self._archive().read(self._prefix + name.replace(os.sep, '/'))
+        return json.loads(data.decode('utf-8'))
+
+    def file_stats(self) -> List[Tuple[str, int, int]]:
+        st = os.stat(self.path)
+        return [("", st.st_size, st.st_mtime_ns)]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+                self._zip = None
+
+    @staticmethod
+    def write(path: str, lessons: Iterable[Lesson], title: str = "") -> 'ZipLessonPack':
+        """Write lessons out as a single compressed pack file"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        summaries = []
+        with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for lesson in lessons:
+                summary = LessonSummary.from_lesson(lesson, file=f"lessons/{lesson.id}.json")
+                archive.writestr(summary.file, json.dumps(lesson.to_dict(), indent=2, ensure_ascii=False))
+                summaries.append(summary)
+            manifest = {
+                'format': LessonPack.FORMAT_VERSION,
+                'title': title or os.path.splitext(os.path.basename(path))[0],
+                'lessons': [summary.to_dict() for summary in summaries],
+            }
+            archive.writestr(LessonPack.MANIFEST_NAME, json.dumps(manifest, indent=2, ensure_ascii=False))
+        os.replace(temp_path, path)
+        return ZipLessonPack(path)
+
+
+class PrerequisiteGraph:
+    """Prerequisite DAG over the catalog, validated and topologically ordered once at load time"""
+
+    def __init__(self, summaries: List[LessonSummary]):
+        self.prerequisites: Dict[str, List[str]] = {}
+        self.dependents: Dict[str, List[str]] = defaultdict(list)
+        declared = {summary.id: index for index, summary in enumerate(summaries)}
+
+        for summary in summaries:
+            for prereq in summary.prerequisites:
+                if prereq not in declared:
+                    raise ValueError(f"Lesson {summary.id} requires unknown lesson {prereq}")
+                self.dependents[prereq].append(summary.id)
+            self.prerequisites[summary.id] = list(summary.prerequisites)
+
+        # Kahn's algorithm; ties go to declaration order so authored ordering is kept where possible
+        in_degree = {lesson_id: len(prereqs) for lesson_id, prereqs in self.prerequisites.items()}
+        ready = [(declared[lesson_id], lesson_id) for lesson_id, degree in in_degree.items() if degree == 0]
+        heapq.heapify(ready)
+        self.order: List[str] = []
+        while ready:
+            _, lesson_id = heapq.heappop(ready)
+            self.order.append(lesson_id)
+            for dependent in self.dependents[lesson_id]:
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    heapq.heappush(ready, (declared[dependent], dependent))
+
+        if len(self.order) < len(self.prerequisites):
+            cycle = sorted(lesson_id for lesson_id, degree in in_degree.items() if degree > 0)
+            raise ValueError(f"Prerequisite cycle between lessons: {', '.join(cycle)}")
+
+        self.position = {lesson_id: index for index, lesson_id in enumerate(self.order)}
+
+
+class UnlockTracker:
+    """A learner's unlocked lessons, updated incrementally as lessons are completed"""
+
+    def __init__(self, graph: PrerequisiteGraph, completed: Set[str]):
+        self.graph = graph
+        self.completed = set(completed)
+        # Number of unmet prerequisites per lesson; 0 means unlocked
+        self.remaining = {
+            lesson_id: sum(1 for prereq in prereqs if prereq not in self.completed)
+            for lesson_id, prereqs in graph.prerequisites.items()
+        }
+        # Unlocked, not yet completed lessons keyed by topological position
+        self._available = [(graph.position[lesson_id], lesson_id)
+                           for lesson_id, count in self.remaining.items()
+                           if count == 0 and lesson_id not in self.completed]
+        heapq.heapify(self._available)
+
+    def is_unlocked(self, lesson_id: str) -> bool:
+        return self.remaining.get(lesson_id, 0) == 0
+
+    def complete(self, lesson_id: str) -> List[str]:
+        """Mark a lesson complete and return the lessons it newly unlocks"""
+        if lesson_id in self.completed:
+            return []
+        self.completed.add(lesson_id)
+        unlocked = []
+        for dependent in self.graph.dependents.get(lesson_id, []):
+            self.remaining[dependent] -= 1
+            if self.remaining[dependent] == 0 and dependent not in self.completed:
+                heapq.heappush(self._available, (self.graph.position[dependent], dependent))
+                unlocked.append(dependent)
+        return unlocked
+
+    def next_available(self) -> Optional[str]:
+        """First unlocked, uncompleted lesson in topological order"""
+        while self._available and self._available[0][1] in self.completed:
+            heapq.heappop(self._available)
+        return self._available[0][1] if self._available else None
+
+    def available(self) -> List[str]:
+        return [lesson_id for _, lesson_id in sorted(self._available) if lesson_id not in self.completed]
+
+
+class LessonRecommender:
+    """
+    Ranks a learner's unlocked lessons for "what next". A lesson scores for path continuity (same skill
+    path as the last lesson finished, more if it builds directly on it), for outstanding mistakes on the
+    concepts its items cover, and for how well its difficulty fits recent first-try accuracy.
+
+    Scores are maintained incrementally: a completion rescores only the lessons on the old and new paths
+    and those following either lesson, and an item result only the lessons sharing its concept. Lessons
+    are kept sorted per difficulty level, so the difficulty fit - the one part that moves with every
+    result - is applied to just the head of each of those few lists when the top picks are read.
+    """
+
+    PATH_WEIGHT = 1.0
+    FOLLOW_WEIGHT = 0.5
+    MISTAKE_WEIGHT = 1.0
+    MISTAKE_CAP = 5  # Mistakes on a concept beyond this don't add weight
+    FIT_WEIGHT = 1.5
+    ACCURACY_RATE = 0.2  # Weight of the newest result in user.recent_accuracy
+
+    def __init__(self, user: User, unlocks: UnlockTracker, summaries: Dict[str, LessonSummary]):
+        self.user = user
+        self.graph = unlocks.graph
+        self.summaries = summaries
+        self.last_lesson = summaries.get(user.last_lesson_id)
+        self.scores: Dict[str, float] = {}  # Everything but the difficulty fit
+        self.ranked: Dict[int, List[Tuple[float, int, str]]] = defaultdict(list)  # difficulty -> (-score, position, id)
+        self.lessons_by_path: Dict[str, Set[str]] = defaultdict(set)
+        self.lessons_by_concept: Dict[str, Set[str]] = defaultdict(set)
+        for lesson_id in unlocks.available():
+            self._add(lesson_id)
+
+    def complete(self, lesson_id: str, unlocked: List[str]):
+        """Update after a lesson is finished; unlocked is what UnlockTracker.complete returned"""
+        previous, self.last_lesson = self.last_lesson, self.summaries.get(lesson_id)
+        self.user.last_lesson_id = lesson_id
+        self._remove(lesson_id)
+
+        affected = set()
+        for summary in (previous, self.last_lesson):
+            if summary is not None:
+                affected.update(self.lessons_by_path.get(summary.skill_path, ()))
+                affected.update(self.graph.dependents.get(summary.id, ()))
+        for other_id in affected:
+            self._rescore(other_id)
+        for new_id in unlocked:
+            self._add(new_id)
+
+    def record_result(self, concept: str, first_try: bool):
+        """Update after a practice item is resolved, correct on the first try or not"""
+        self.user.recent_accuracy += self.ACCURACY_RATE * (float(first_try) - self.user.recent_accuracy)
+
+        tracker = self.user.mistake_tracker
+        before = tracker.get(concept, 0)
+        after = max(0, before - 1) if first_try else before + 1
+        if after:
+            tracker[concept] = after
+        else:
+            tracker.pop(concept, None)
+        if min(before, self.MISTAKE_CAP) != min(after, self.MISTAKE_CAP):
+            for lesson_id in list(self.lessons_by_concept.get(concept, ())):
+                self._rescore(lesson_id)
+
+    def target_difficulty(self) -> float:
+        """1 (easy) to 3 (hard), rising as recent first-try accuracy climbs from 50% to 90%"""
+        return 1 + 2 * min(1.0, max(0.0, (self.user.recent_accuracy - 0.5) / 0.4))
+
+    def top(self, count: int = 3) -> List[LessonSummary]:
+        """Best unlocked lessons to take next, best first"""
+        target = self.target_difficulty()
+        candidates = []
+        for difficulty, ranked in self.ranked.items():
+            fit = self.FIT_WEIGHT * (1 - abs(difficulty - target) / 2)
+            candidates += [(negated - fit, position, lesson_id) for negated, position, lesson_id in ranked[:count]]
+        return [self.summaries[lesson_id] for _, _, lesson_id in sorted(candidates)[:count]]
+
+    def reason(self, summary: LessonSummary) -> str:
+        """Short explanation of why a lesson is recommended"""
+        if self.last_lesson is not None and self.last_lesson.id in summary.prerequisites:
+            return f"Builds on {self.last_lesson.title}"
+        mistakes = {ref.concept: self.user.mistake_tracker.get(ref.concept, 0) for ref in summary.items}
+        weakest = max(mistakes, key=mistakes.get, default=None)
+        if weakest and mistakes[weakest]:
+            return f"Practice {weakest.replace('_', ' ')}"
+        if self.last_lesson is not None and summary.skill_path == self.last_lesson.skill_path:
+            return f"Next in {summary.skill_path.replace('_', ' ').title()}"
+        return "Matches your current level"
+
+    def _score(self, summary: LessonSummary) -> float:
+        score = 0.0
+        if self.last_lesson is not None:
+            if summary.skill_path == self.last_lesson.skill_path:
+                score += self.PATH_WEIGHT
+            if self.last_lesson.id in summary.prerequisites:
+                score += self.FOLLOW_WEIGHT
+        for concept in {ref.concept for ref in summary.items}:
+            mistakes = min(self.user.mistake_tracker.get(concept, 0), self.MISTAKE_CAP)
+            score += self.MISTAKE_WEIGHT * mistakes / self.MISTAKE_CAP
+        return score
+
+    def _add(self, lesson_id: str):
+        summary = self.summaries.get(lesson_id)
+        if summary is None or lesson_id in self.scores:
+            return
+        self.lessons_by_path[summary.skill_path].add(lesson_id)
+        for ref in summary.items:
+            self.lessons_by_concept[ref.concept].add(lesson_id)
+        self._set_score(summary, self._score(summary))
+
+    def _remove(self, lesson_id: str):
+        summary = self.summaries.get(lesson_id)
+        score = self.scores.pop(lesson_id, None)
+        if summary is None or score is None:
+            return
+        ranked = self.ranked[summary.difficulty]
+        del ranked[bisect.bisect_left(ranked, (-score, self.graph.position[lesson_id], lesson_id))]
+        self.lessons_by_path[summary.skill_path].discard(lesson_id)
+        for ref in summary.items:
+            self.lessons_by_concept[ref.concept].discard(lesson_id)
+
+    def _rescore(self, lesson_id: str):
+        if lesson_id in self.scores:
+            summary = self.summaries[lesson_id]
+            self._set_score(summary, self._score(summary))
+
+    def _set_score(self, summary: LessonSummary, score: float):
+        ranked = self.ranked[summary.difficulty]
+        position = self.graph.position[summary.id]
+        old = self.scores.get(summary.id)
+        if old is not None:
+            del ranked[bisect.bisect_left(ranked, (-old, position, summary.id))]
+        self.scores[summary.id] = score
+        bisect.insort(ranked, (-score, position, summary.id))
+
+
+@dataclass
+class PracticeSession:
+    """A cross-lesson mix of practice items drawn from the item bank, played through LessonView"""
+    concept: Optional[str]  # None mixes every concept
+    max_difficulty: int
+    items: List[Tuple[str, Any]]  # (item_type, item) in play order
+
+    XP_PER_ITEM = 2
+
+    @property
+    def title(self) -> str:
+        topic = self.concept.replace('_', ' ').title() if self.concept else "Mixed"
+        return f"Practice: {topic}"
+
+    def as_lesson(self) -> Lesson:
+        """Wrap the session as a lesson so LessonView can play it"""
+        attrs = dict(LESSON_ITEM_KINDS)
+        groups = {attr: [] for attr in attrs.values()}
+        for item_type, item in self.items:
+            groups[attrs[item_type]].append(item)
+        return Lesson(id="practice_session", title=self.title,
+                      concept=f"A practice mix of {len(self.items)} items from across your lessons "
+                              f"(difficulty up to {self.max_difficulty}).",
+                      examples=[], prerequisites=[],
+                      xp_reward=self.XP_PER_ITEM * len(self.items), skill_path="practice",
+                      difficulty=self.max_difficulty, **groups)
+
+
+def lesson_code_sources(lesson: Lesson) -> List[str]:
+    """Runnable code carried by a lesson: examples, starter code and reference solutions"""
+    sources = [example.code for example in lesson.examples]
+    sources += [exercise.starter_code for exercise in lesson.exercises]
+    sources += [exercise.solution for exercise in lesson.exercises]
+    sources += [drill.code for drill in lesson.output_drills]
+    sources += [drill.correct_code for drill in lesson.bug_fix_drills]
+    return [source for source in sources if source]
+
+
+@dataclass
+class PreparedLesson:
+    """A lesson made ready to open: body parsed, code compiled, bug-fix reference outputs computed"""
+    lesson: Lesson
+    content_hash: str
+    compiled: Dict[str, Any]
+    reference_outputs: Dict[str, Tuple[bool, str, str]]
+    size: int  # Estimated bytes held
+
+
+class LessonPrefetcher:
+    """
+    Prepares the lessons a learner is likely to open next on a background thread, so opening one
+    doesn't wait on reading, parsing or compiling. Prepared lessons are held up to an estimated byte
+    budget - over it, lessons outside the latest request go first (least recently used), then the least
+    likely ones - and are handed over, code and outputs registered with CodeExecutor, when opened.
+    An entry whose lesson has since changed is dropped, not served.
+    """
+
+    BUDGET_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, get_catalog, budget_bytes: int = BUDGET_BYTES):
+        self.get_catalog = get_catalog  # callable() -> current ContentCatalog
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self._prepared: 'OrderedDict[str, PreparedLesson]' = OrderedDict()
+        self._wanted: List[str] = []
+        self._ranks: Dict[str, int] = {}  # Lessons of the latest request -> likelihood rank, 0 = most likely
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def request(self, lesson_ids: List[str]):
+        """Replace the lessons to prepare, most likely first"""
+        with self._lock:
+            for lesson_id in reversed(lesson_ids):
+                if lesson_id in self._prepared:
+                    self._prepared.move_to_end(lesson_id)
+            self._wanted = [lesson_id for lesson_id in lesson_ids if lesson_id not in self._prepared]
+            self._ranks = {lesson_id: rank for rank, lesson_id in reversed(list(enumerate(lesson_ids)))}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lesson-prefetch", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def take(self, summary: LessonSummary) -> Optional[Lesson]:
+        """Hand over a prepared lesson, or None if it isn't prepared (or is out of date)"""
+        with self._lock:
+            prepared = self._prepared.pop(summary.id, None)
+            if prepared is not None:
+                self.used_bytes -= prepared.size
+        if prepared is None or prepared.content_hash != summary.content_hash:
+            return None
+        CodeExecutor.COMPILED_CACHE.update(prepared.compiled)
+        CodeExecutor.REFERENCE_OUTPUTS.update(prepared.reference_outputs)
+        return prepared.lesson
+
+    def discard(self, lesson_ids: Iterable[str]):
+        with self._lock:
+            for lesson_id in lesson_ids:
+                prepared = self._prepared.pop(lesson_id, None)
+                if prepared is not None:
+                    self.used_bytes -= prepared.size
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            with self._lock:
+                lesson_id = self._wanted.pop(0) if self._wanted else None
+            if lesson_id is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                prepared = self._prepare(lesson_id)
+            except Exception as e:
+                print(f"Error prefetching lesson {lesson_id}: {e}")
+                continue
+            if prepared is not None:
+                self._store(lesson_id, prepared)
+
+    def _prepare(self, lesson_id: str) -> Optional[PreparedLesson]:
+        catalog = self.get_catalog()
+        summary = catalog.summaries_by_id.get(lesson_id)
+        if summary is None or catalog.is_loaded(lesson_id):
+            return None
+        # Everything is built locally and only registered with CodeExecutor by take(), so what a
+        # prepared lesson holds is within the budget until it's opened
+        lesson, snapshot_code = catalog.read_lesson(summary)
+        if lesson is None:
+            return None
+
+        compiled = {}
+        for source in lesson_code_sources(lesson):
+            code = (snapshot_code.get(source) or CodeExecutor.COMPILED_CACHE.get(source)
+                    or CodeExecutor.precompile(source))
+            if code is not None:
+                compiled[source] = code
+        reference_outputs = {}
+        for drill in lesson.bug_fix_drills:
+            reference_outputs[drill.correct_code] = (CodeExecutor.REFERENCE_OUTPUTS.get(drill.correct_code)
+                                                     or CodeExecutor.execute_code(drill.correct_code))
+
+        size = len(json.dumps(lesson.to_dict(), ensure_ascii=False))
+        size += sum(len(marshal.dumps(code)) for code in compiled.values())
+        size += sum(len(output) + len(error) for _, output, error in reference_outputs.values())
+        return PreparedLesson(lesson, summary.content_hash, compiled, reference_outputs, size)
+
+    def _store(self, lesson_id: str, prepared: PreparedLesson):
+        if prepared.size > self.budget_bytes:
+            return
+        with self._lock:
+            old = self._prepared.pop(lesson_id, None)
+            if old is not None:
+                self.used_bytes -= old.size
+            self._prepared[lesson_id] = prepared
+            self.used_bytes += prepared.size
+            while self.used_bytes > self.budget_bytes:
+                victim = next((other for other in self._prepared if other not in self._ranks), None)
+                if victim is None:
+                    victim = max(self._prepared, key=self._ranks.__getitem__)
+                    if victim == lesson_id:
+                        self._wanted = []  # Everything still queued is even less likely
+                self.used_bytes -= self._prepared.pop(victim).size
+
+
+class ContentSnapshot:
+    """
+    Versioned single-file snapshot of the whole catalog, read through mmap.
+    Layout: header | one marshal record per lesson (body + precompiled code) | marshal index
+    """
+
+    MAGIC = b"CCSNAP"
+    FORMAT_VERSION = 2
+    HEADER = struct.Struct('<6sH4s32sQQ')  # magic, format, bytecode magic, source hash, index offset, length
+    FILE_NAME = "content.snapshot"
+
+    def __init__(self, path: str, file, buffer, summaries: List[LessonSummary], offsets: Dict[str, Tuple[int, int]],
+                 source_hash: bytes = b""):
+        self.path = path
+        self._file = file
+        self._buffer = buffer
+        self.summaries = summaries
+        self.offsets = offsets
+        self.source_hash = source_hash
+
+    @staticmethod
+    def source_hash(packs: List['LessonPack']) -> bytes:
+        """Fingerprint of the content sources: pack file stats, or this app's source for built-in lessons"""
+        digest = hashlib.sha256(f"{CURRENT_VERSION}:{ContentSnapshot.FORMAT_VERSION}".encode())
+        if packs:
+            for pack in packs:
+                for name, size, mtime in pack.file_stats():
+                    digest.update(f"{pack.path}|{name}|{size}|{mtime}\n".encode())
+        else:
+            try:
+                with open(os.path.abspath(__file__), 'rb') as f:
+                    digest.update(f.read())
+            except OSError:
+                pass
+        return digest.digest()
+
+    @staticmethod
+    def build(path: str, lessons: Iterable[Lesson], source_hash: bytes,
+              previous: Optional['ContentSnapshot'] = None) -> int:
+        """
+        Compile lessons into a snapshot file, replacing any previous one atomically; returns the lesson count.
+        Records of lessons whose content hash matches one in `previous` are copied over without recompiling.
+        """
+        import importlib.util
+
+        reusable = {}
+        if previous is not None:
+            reusable = {summary.id: summary.content_hash for summary in previous.summaries if summary.content_hash}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        offsets = {}
+        summaries = []
+        with open(temp_path, 'wb') as f:
+            f.write(b"\0" * ContentSnapshot.HEADER.size)
+            for lesson in lessons:
+                summary = LessonSummary.from_lesson(lesson)
+                if reusable.get(lesson.id) == summary.content_hash:
+                    record = previous.record(lesson.id)
+                else:
+                    code = {}
+                    for source in lesson_code_sources(lesson):
+                        compiled = CodeExecutor.precompile(source)
+                        if compiled is not None:
+                            code[source] = compiled
+                    record = marshal.dumps({'lesson': lesson.to_dict(), 'code': code})
+                offsets[lesson.id] = (f.tell(), len(record))
+                f.write(record)
+                summaries.append(summary.to_dict())
+
+            index = marshal.dumps({'summaries': summaries, 'offsets': offsets})
+            index_offset = f.tell()
+            f.write(index)
+            f.seek(0)
+            f.write(ContentSnapshot.HEADER.pack(ContentSnapshot.MAGIC, ContentSnapshot.FORMAT_VERSION,
+                                                importlib.util.MAGIC_NUMBER, source_hash,
+                                                index_offset, len(index)))
+        if previous is not None:
+            previous.close()  # Windows can't replace a file that is still mapped
+        os.replace(temp_path, path)
+        return len(summaries)
+
+    @staticmethod
+    def open(path: str, source_hash: Optional[bytes] = None) -> Optional['ContentSnapshot']:
+        """
+        Map a snapshot; returns None if it is missing or from another app version, or when
+        source_hash is given and the snapshot was built from other sources
+        """
+        import importlib.util
+
+        if not os.path.exists(path):
+            return None
+        f = open(path, 'rb')
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(buffer) < ContentSnapshot.HEADER.size:
+                raise ValueError("truncated snapshot")
+            magic, version, bytecode_magic, stored_hash, index_offset, index_length = \
+                ContentSnapshot.HEADER.unpack_from(buffer, 0)
+            if (magic != ContentSnapshot.MAGIC or version != ContentSnapshot.FORMAT_VERSION
+                    or bytecode_magic != importlib.util.MAGIC_NUMBER
+                    or (source_hash is not None and stored_hash != source_hash)):
+                buffer.close()
+                f.close()
+                return None
+            index = marshal.loads(buffer[index_offset:index_offset + index_length])
+        except Exception as e:
+            print(f"Ignoring unreadable content snapshot: {e}")
+            f.close()
+            return None
+        summaries = [LessonSummary.from_dict(entry) for entry in index['summaries']]
+        return ContentSnapshot(path, f, buffer, summaries, index['offsets'], stored_hash)
+
+    def record(self, lesson_id: str) -> bytes:
+        """Raw marshalled record of one lesson"""
+        offset, length = self.offsets[lesson_id]
+        return self._buffer[offset:offset + length]
+
+    def read_lesson(self, summary: LessonSummary) -> Tuple[Lesson, Dict[str, Any]]:
+        """Deserialize one lesson and its precompiled code (source -> code object); registers nothing"""
+        record = marshal.loads(self.record(summary.id))
+        return Lesson.from_dict(record['lesson']), record['code']
+
+    def close(self) -> None:
+        self._buffer.close()
+        self._file.close()
+
+
+class ContentCatalog:
+    """Lesson catalog indexed by lesson, item, skill path and concept; lesson bodies load on demand"""
+
+    def __init__(self, summaries: List[LessonSummary], loader):
+        self.summaries = summaries
+        self.loader = loader  # callable(LessonSummary) -> (Lesson, precompiled code by source)
+        self.summaries_by_id: Dict[str, LessonSummary] = {}
+        self.summaries_by_path: Dict[str, List[LessonSummary]] = defaultdict(list)
+        self.summaries_by_concept: Dict[str, List[LessonSummary]] = defaultdict(list)
+        self.items_by_id: Dict[str, ItemRef] = {}
+        self.items_by_concept: Dict[str, List[ItemRef]] = defaultdict(list)
+        # Item bank for practice sessions: (concept, difficulty) -> items
+        self.items_by_concept_difficulty: Dict[Tuple[str, int], List[ItemRef]] = defaultdict(list)
+        self._lessons: Dict[str, Lesson] = {}
+
+        for summary in summaries:
+            self.summaries_by_id[summary.id] = summary
+            self.summaries_by_path[summary.skill_path].append(summary)
+            concepts = []
+            for ref in summary.items:
+                self.items_by_id[ref.id] = ref
+                self.items_by_concept[ref.concept].append(ref)
+                self.items_by_concept_difficulty[(ref.concept, ref.difficulty)].append(ref)
+                if ref.concept not in concepts:
+                    concepts.append(ref.concept)
+            for concept in concepts:
+                self.summaries_by_concept[concept].append(summary)
+
+        self.graph = PrerequisiteGraph(summaries)
+        self.snapshot: Optional[ContentSnapshot] = None
+        self.packs: List[LessonPack] = []
+        self.lesson_packs: Dict[str, LessonPack] = {}  # lesson id -> pack holding its body
+        self.manifests: Dict[str, Dict[str, LessonSummary]] = {}  # pack path -> last manifest read
+        # Content version (hex source hash) for keying derived caches; None when not from disk sources
+        self.version: Optional[str] = None
+        self.revision = 0  # Bumped by every in-place edit (dev mode hot reload)
+
+    @classmethod
+    def from_lessons(cls, lessons: List[Lesson]) -> 'ContentCatalog':
+        """Catalog over lessons that are already built in memory"""
+        by_id = {lesson.id: lesson for lesson in lessons}
+        catalog = cls([LessonSummary.from_lesson(lesson) for lesson in lessons],
+                      lambda summary: (by_id[summary.id], {}))
+        catalog._lessons.update(by_id)
+        return catalog
+
+    @classmethod
+    def from_snapshot(cls, snapshot: ContentSnapshot) -> 'ContentCatalog':
+        """Catalog over a mapped snapshot; lessons are deserialized on demand"""
+        catalog = cls(snapshot.summaries, snapshot.read_lesson)
+        catalog.snapshot = snapshot
+        return catalog
+
+    @classmethod
+    def from_packs(cls, packs: List[LessonPack]) -> 'ContentCatalog':
+        """Catalog over lesson packs; only the manifests are read here"""
+        summaries = []
+        owners: Dict[str, LessonPack] = {}
+        manifests = {}
+        for pack in packs:
+            try:
+                pack_summaries = pack.read_manifest()
+            except Exception as e:
+                print(f"Error loading lesson pack {pack.path}: {e}")
+                continue
+            manifests[pack.path] = {summary.id: summary for summary in pack_summaries}
+            for summary in pack_summaries:
+                if summary.id in owners:
+                    print(f"Duplicate lesson id {summary.id} in {pack.path} ignored")
+                    continue
+                owners[summary.id] = pack
+                summaries.append(summary)
+        catalog = cls(summaries, lambda summary: (owners[summary.id].load_lesson(summary), {}))
+        catalog.packs = list(packs)
+        catalog.lesson_packs = owners
+        catalog.manifests = manifests
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self.summaries)
+
+    def get_lesson(self, lesson_id: str) -> Optional[Lesson]:
+        """
+        Return the full lesson, loading and caching its body on first access. Precompiled code that
+        comes with it is registered with the executor then, and only for lessons kept here.
+        """
+        lesson = self._lessons.get(lesson_id)
+        if lesson is None:
+            summary = self.summaries_by_id.get(lesson_id)
+            if summary is None:
+                return None
+            try:
+                lesson, code = self.loader(summary)
+            except Exception as e:
+                print(f"Error loading lesson {lesson_id}: {e}")
+                return None
+            self._lessons[lesson_id] = lesson
+            CodeExecutor.COMPILED_CACHE.update(code)
+        return lesson
+
+    def is_loaded(self, lesson_id: str) -> bool:
+        return lesson_id in self._lessons
+
+    def add_loaded(self, lesson: Lesson):
+        """Cache a lesson body loaded elsewhere (e.g. by the prefetcher)"""
+        self._lessons[lesson.id] = lesson
+
+    def get_all_lessons(self) -> List[Lesson]:
+        lessons = (self.get_lesson(summary.id) for summary in self.summaries)
+        return [lesson for lesson in lessons if lesson is not None]
+
+    def iter_lessons(self):
+        """Yield every full lesson without keeping the bodies cached - for whole-catalog passes"""
+        for summary in self.summaries:
+            lesson = self.peek_lesson(summary)
+            if lesson is not None:
+                yield lesson
+
+    def peek_lesson(self, summary: LessonSummary) -> Optional[Lesson]:
+        """Load a lesson body without adding it to the cache"""
+        return self.read_lesson(summary)[0]
+
+    def read_lesson(self, summary: LessonSummary) -> Tuple[Optional[Lesson], Dict[str, Any]]:
+        """A lesson body and any precompiled code for it, without caching or registering either"""
+        lesson = self._lessons.get(summary.id)
+        if lesson is not None:
+            return lesson, {}
+        try:
+            return self.loader(summary)
+        except Exception as e:
+            print(f"Error loading lesson {summary.id}: {e}")
+            return None, {}
+
+    def sample_items(self, count: int, concept: Optional[str] = None, max_difficulty: int = 3,
+                     exclude: Iterable[str] = (), rng: Optional[random.Random] = None) -> List[ItemRef]:
+        """
+        Draw up to count distinct items from the item bank, optionally limited to one concept.
+        Each draw picks a (concept, difficulty) bucket weighted by remaining items x difficulty,
+        so sessions lean towards the harder end of the allowed range, then takes a random item
+        from it with a sparse Fisher-Yates shuffle. Cost is O(count) plus any excluded items skipped,
+        never a scan of the catalog.
+        """
+        rng = rng or random.Random()
+        exclude = exclude if isinstance(exclude, (set, dict)) else set(exclude)
+        if concept is None:
+            keys = [key for key in self.items_by_concept_difficulty if key[1] <= max_difficulty]
+        else:
+            keys = [(concept, difficulty) for difficulty in range(1, max_difficulty + 1)
+                    if (concept, difficulty) in self.items_by_concept_difficulty]
+        buckets = [self.items_by_concept_difficulty[key] for key in keys]
+        remaining = [len(bucket) for bucket in buckets]
+        swaps: List[Dict[int, int]] = [{} for _ in buckets]
+
+        picked = []
+        while len(picked) < count:
+            weights = [left * max(difficulty, 1) for left, (_, difficulty) in zip(remaining, keys)]
+            if not any(weights):
+                break
+            b = rng.choices(range(len(buckets)), weights)[0]
+            last = remaining[b] - 1
+            slot = rng.randint(0, last)
+            index = swaps[b].get(slot, slot)
+            swaps[b][slot] = swaps[b].get(last, last)
+            remaining[b] = last
+            ref = buckets[b][index]
+            if ref.id not in exclude:
+                picked.append(ref)
+        return picked
+
+    def apply_changes(self, changed: List[LessonSummary], removed: Iterable[str] = (),
+                      lessons: Optional[Dict[str, Lesson]] = None) -> Set[str]:
+        """
+        Update the catalog in place for edited, added and removed lessons; returns the affected ids.
+        Raises ValueError, leaving the catalog untouched, if the edit breaks the prerequisite graph.
+        """
+        removed = set(removed)
+        new_by_id = {summary.id: summary for summary in changed}
+        summaries = [new_by_id.get(summary.id, summary) for summary in self.summaries
+                     if summary.id not in removed]
+        known = {summary.id for summary in self.summaries}
+        summaries.extend(summary for summary in changed if summary.id not in known)
+        graph = PrerequisiteGraph(summaries)
+
+        affected = set(new_by_id) | removed
+        for lesson_id in affected:
+            old = self.summaries_by_id.get(lesson_id)
+            new = new_by_id.get(lesson_id)
+            indexes = (self.summaries_by_path, self.summaries_by_concept, self.items_by_concept,
+                       self.items_by_concept_difficulty)
+            for index, old_entries, new_entries in zip(indexes, self._index_entries(old), self._index_entries(new)):
+                self._swap_entries(index, old_entries, new_entries)
+            for ref in (old.items if old else []):
+                self.items_by_id.pop(ref.id, None)
+            self._lessons.pop(lesson_id, None)
+        for lesson_id in affected:
+            new = new_by_id.get(lesson_id)
+            if new is None:
+                self.summaries_by_id.pop(lesson_id, None)
+                self.lesson_packs.pop(lesson_id, None)
+                continue
+            self.summaries_by_id[lesson_id] = new
+            for ref in new.items:
+                self.items_by_id[ref.id] = ref
+
+        self._lessons.update(lessons or {})
+        self.summaries = summaries
+        self.graph = graph
+        self.revision += 1
+        return affected
+
+    @staticmethod
+    def _index_entries(summary: Optional[LessonSummary]):
+        """(key, value) pairs a lesson contributes to the path, concept and item bank indexes"""
+        if summary is None:
+            return [], [], [], []
+        concepts = list(dict.fromkeys(ref.concept for ref in summary.items))
+        return ([(summary.skill_path, summary)],
+                [(concept, summary) for concept in concepts],
+                [(ref.concept, ref) for ref in summary.items],
+                [((ref.concept, ref.difficulty), ref) for ref in summary.items])
+
+    @staticmethod
+    def _swap_entries(index: Dict[str, list], old_entries: List[Tuple[str, Any]],
+                      new_entries: List[Tuple[str, Any]]) -> None:
+        """Replace old values with new ones, keeping list positions where the key is unchanged"""
+        old_by_key = defaultdict(list)
+        new_by_key = defaultdict(list)
+        for key, value in old_entries:
+            old_by_key[key].append(value)
+        for key, value in new_entries:
+            new_by_key[key].append(value)
+
+        for key in set(old_by_key) | set(new_by_key):
+            bucket = index[key]
+            olds, news = old_by_key[key], new_by_key[key]
+            # An old value that's already gone from the bucket has nothing to replace or remove
+            slots = [next((i for i, value in enumerate(bucket) if value is old), None) for old in olds]
+            slots = [slot for slot in slots if slot is not None]
+            for slot, value in zip(slots, news):
+                bucket[slot] = value
+            for slot in sorted(slots[len(news):], reverse=True):
+                del bucket[slot]
+            bucket.extend(news[len(slots):])
+            if not bucket:
+                del index[key]
+
+    def reload_pack_files(self, paths: List[str]) -> Set[str]:
+        """
+        Re-read edited pack files (manifests or lesson bodies) and apply them incrementally.
+        Only manifest entries that differ from the last read manifest are applied, and an
+        edited body is the source of truth for its lesson, so its summary is rebuilt from it.
+        """
+        changed: Dict[str, LessonSummary] = {}
+        removed: Set[str] = set()
+        lessons: Dict[str, Lesson] = {}
+        new_owners: Dict[str, LessonPack] = {}
+        manifests: Dict[str, Dict[str, LessonSummary]] = {}
+        paths = {os.path.normpath(path) for path in paths}
+
+        for pack in self.packs:
+            manifest_path = os.path.normpath(os.path.join(pack.path, LessonPack.MANIFEST_NAME))
+            if manifest_path in paths:
+                try:
+                    pack_summaries = pack.read_manifest()
+                except Exception as e:
+                    print(f"Error loading lesson pack {pack.path}: {e}")
+                    continue
+                previous = self.manifests.get(pack.path, {})
+                manifests[pack.path] = {summary.id: summary for summary in pack_summaries}
+                for summary in pack_summaries:
+                    owner = self.lesson_packs.get(summary.id)
+                    if owner is not None and owner is not pack:
+                        print(f"Duplicate lesson id {summary.id} in {pack.path} ignored")
+                        continue
+                    if previous.get(summary.id) != summary or summary.id not in self.summaries_by_id:
+                        changed[summary.id] = summary
+                        new_owners[summary.id] = pack
+                removed |= {lesson_id for lesson_id, owner in self.lesson_packs.items()
+                            if owner is pack and lesson_id not in manifests[pack.path]}
+
+            for lesson_id, owner in {**self.lesson_packs, **new_owners}.items():
+                summary = changed.get(lesson_id) or self.summaries_by_id.get(lesson_id)
+                if owner is not pack or summary is None or lesson_id in removed:
+                    continue
+                if os.path.normpath(os.path.join(pack.path, summary.file)) not in paths:
+                    continue
+                try:
+                    lesson = pack.load_lesson(summary)
+                except Exception as e:
+                    # Often an editor mid-save; the next write triggers another reload
+                    print(f"Error loading lesson {lesson_id}: {e}")
+                    continue
+                lessons[lesson_id] = lesson
+                changed[lesson_id] = LessonSummary.from_lesson(lesson, file=summary.file)
+
+        if not changed and not removed:
+            self.manifests.update(manifests)
+            return set()
+        affected = self.apply_changes(list(changed.values()), removed, lessons)
+        self.lesson_packs.update(new_owners)
+        self.manifests.update(manifests)
+        return affected
+
+
+class PackWatcher:
+    """Polls the lesson pack files by size and mtime and reports which changed since the last poll"""
+
+    def __init__(self, packs_dir: str):
+        self.packs_dir = packs_dir
+        self.stats = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        stats = {}
+        for pack in LessonPack.discover(self.packs_dir):
+            try:
+                for relpath, size, mtime_ns in pack.file_stats():
+                    stats[os.path.normpath(os.path.join(pack.path, relpath))] = (size, mtime_ns)
+            except OSError:
+                continue  # Pack changing under us; picked up on the next poll
+        return stats
+
+    def poll(self) -> List[str]:
+        """Paths added, removed or modified since the last poll"""
+        stats = self._scan()
+        changed = sorted(path for path in stats.keys() | self.stats.keys()
+                         if stats.get(path) != self.stats.get(path))
+        self.stats = stats
+        return changed
+
+
+class SearchIndex:
+    """
+    Inverted full-text index over lessons and practice items, with prefix matching. Lesson docs are
+    numbered ahead of item docs, so a posting list read in order yields lesson-level matches first.
+    """
+
+    TOKEN_RE = re.compile(r"[a-z0-9]+")
+    MIN_TOKEN_LENGTH = 2
+    MATCH_CACHE_SIZE = 32  # Match sets of recent query tokens, reused while the user types
+    BISECT_CHECKS = 200  # Docs a query token is checked against by binary search before its match set is built
+    FILE_NAME = "search_index.bin"
+    FORMAT_VERSION = 3
+
+    def __init__(self, version: Optional[str], docs: List[Tuple[str, str, str]], postings: Dict[str, List[int]]):
+        self.version = version
+        self.docs = docs  # doc id -> (lesson id, item type or 'lesson', content hash), lesson docs first
+        self.postings = postings  # term -> sorted doc ids
+        self.terms = sorted(postings)
+        self._matches: 'OrderedDict[str, Set[int]]' = OrderedDict()
+        # Content hash -> its tokens, kept from a build (not saved) so the next rebuild is quick
+        self.tokens: Dict[str, List[str]] = {}
+        self.revision = 0  # Catalog revision this index was built for
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return [token for token in SearchIndex.TOKEN_RE.findall(text.lower())
+                if len(token) >= SearchIndex.MIN_TOKEN_LENGTH]
+
+    @staticmethod
+    def doc_terms(text: str) -> List[str]:
+        """The distinct tokens of a document's text"""
+        return [token for token in set(SearchIndex.TOKEN_RE.findall(text.lower()))
+                if len(token) >= SearchIndex.MIN_TOKEN_LENGTH]
+
+    @staticmethod
+    def item_text(item_type: str, item) -> str:
+        if item_type == 'exercise':
+            return item.prompt
+        if item_type in ('mcq', 'multi_answer'):
+            return " ".join([item.question] + list(item.choices))
+        if item_type == 'drill':
+            return item.code
+        if item_type == 'bug_fix':
+            return f"{item.bug_description} {item.buggy_code}"
+        return ""
+
+    @classmethod
+    def lesson_tokens(cls, lesson: Lesson) -> List[Tuple[str, List[str]]]:
+        """(kind, distinct tokens) for the lesson itself followed by each of its items"""
+        lesson_text = [lesson.title, lesson.concept]
+        lesson_text += [f"{example.code} {example.explanation}" for example in lesson.examples]
+        docs = [('lesson', cls.doc_terms(" ".join(lesson_text)))]
+        for item_type, item in iter_lesson_items(lesson):
+            docs.append((item_type, cls.doc_terms(cls.item_text(item_type, item))))
+        return docs
+
+    @classmethod
+    def build(cls, catalog: 'ContentCatalog', version: Optional[str] = None,
+              cached_tokens: Optional[Dict[str, List[str]]] = None) -> 'SearchIndex':
+        """Index the catalog; lessons whose content hashes are all in cached_tokens aren't loaded at all"""
+        cached_tokens = cached_tokens or {}
+        lesson_docs, item_docs = [], []
+
+        for summary in catalog.summaries:
+            keys = [summary.content_hash] + [ref.content_hash for ref in summary.items]
+            kinds = ['lesson'] + [ref.item_type for ref in summary.items]
+            if all(key in cached_tokens for key in keys):
+                doc_tokens = [(kind, cached_tokens[key]) for kind, key in zip(kinds, keys)]
+            else:
+                lesson = catalog.peek_lesson(summary)
+                if lesson is None:
+                    continue
+                if catalog.snapshot is None:  # Hand-edited pack manifests can lag behind the bodies
+                    fresh = LessonSummary.from_lesson(lesson)
+                    keys = [fresh.content_hash] + [ref.content_hash for ref in fresh.items]
+                doc_tokens = cls.lesson_tokens(lesson)
+            for key, (kind, tokens) in zip(keys, doc_tokens):
+                (lesson_docs if kind == 'lesson' else item_docs).append(((summary.id, kind, key), tokens))
+
+        docs = []
+        postings: Dict[str, List[int]] = defaultdict(list)
+        tokens_by_hash = {}
+        for doc, (entry, tokens) in enumerate(lesson_docs + item_docs):
+            docs.append(entry)
+            tokens_by_hash[entry[2]] = tokens
+            for token in tokens:
+                postings[token].append(doc)  # Docs are visited in order, so every list stays sorted
+        index = cls(version, docs, {term: postings[term] for term in sorted(postings)})
+        index.tokens = tokens_by_hash
+        return index
+
+    def cached_tokens(self) -> Dict[str, List[str]]:
+        """Content hash -> its tokens, for a rebuild to skip unchanged content; recovered from the postings if loaded"""
+        if self.tokens or not self.docs:
+            return self.tokens
+        hashes = [content_hash for _, _, content_hash in self.docs]
+        tokens: Dict[str, List[str]] = defaultdict(list)
+        for term, doc_ids in self.postings.items():
+            for doc in doc_ids:
+                tokens[hashes[doc]].append(term)
+        self.tokens = dict(tokens)
+        return self.tokens
+
+    def _terms(self, token: str) -> List[str]:
+        """The index terms a query token matches: itself and every term it is a prefix of"""
+        start = bisect.bisect_left(self.terms, token)
+        return self.terms[start:bisect.bisect_left(self.terms, token + "{", start)]  # '{' sorts after [a-z0-9]
+
+    def _match(self, token: str) -> Set[int]:
+        """Docs containing any term the token matches, kept for the next few keystrokes"""
+        matched = self._matches.get(token)
+        if matched is None:
+            matched = set().union(*(self.postings[term] for term in self._terms(token)))
+            self._matches[token] = matched
+            if len(self._matches) > self.MATCH_CACHE_SIZE:
+                self._matches.popitem(last=False)
+        else:
+            self._matches.move_to_end(token)
+        return matched
+
+    def _contains(self, token: str, lists: List[List[int]]):
+        """
+        Membership test for docs matching the token. The first BISECT_CHECKS docs are looked up in its
+        postings by binary search; a longer walk switches to the token's match set, built once and cached.
+        """
+        if token in self._matches:
+            return self._match(token).__contains__
+        checks = 0
+        matched: Optional[Set[int]] = None
+
+        def contains(doc: int) -> bool:
+            nonlocal checks, matched
+            if matched is not None:
+                return doc in matched
+            checks += 1
+            if checks > self.BISECT_CHECKS:
+                matched = self._match(token)
+                return doc in matched
+            for doc_ids in lists:
+                position = bisect.bisect_left(doc_ids, doc)
+                if position < len(doc_ids) and doc_ids[position] == doc:
+                    return True
+            return False
+        return contains
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, str]]:
+        """
+        Lessons matching every query token (each token may be a prefix)
+        Returns: [(lesson_id, kind)] with lesson-level matches ahead of item matches
+        """
+        tokens = set(self.tokenize(query))
+        if not tokens:
+            return []
+
+        # Read the rarest token's postings in doc order, checking each doc against the other tokens,
+        # and stop as soon as there are enough lessons
+        lists = {token: [self.postings[term] for term in self._terms(token)] for token in tokens}
+        rarest = min(tokens, key=lambda token: sum(map(len, lists[token])))
+        others = [self._contains(token, lists[token]) for token in tokens if token != rarest]
+        results = []
+        seen = set()
+        for doc in heapq.merge(*lists[rarest]):
+            if others and not all(contains(doc) for contains in others):
+                continue
+            lesson_id, kind, _ = self.docs[doc]
+            if lesson_id not in seen:
+                seen.add(lesson_id)
+                results.append((lesson_id, kind))
+                if len(results) >= limit:
+                    break
+        return results
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            marshal.dump({'format': self.FORMAT_VERSION, 'version': self.version,
+                          'docs': self.docs, 'postings': self.postings}, f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, version: Optional[str] = None) -> Optional['SearchIndex']:
+        """
+        Load a persisted index, or None if it is missing or unreadable.
+        With a version, an index built for other content is also rejected.
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = marshal.loads(f.read())  # Much faster than marshal.load() on the file for large indexes
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if data.get('format') != cls.FORMAT_VERSION or (version is not None and data.get('version') != version):
+            return None
+        return cls(data.get('version'), data['docs'], data['postings'])
+
+
+class ContentEngine:
+    _catalog: Optional[ContentCatalog] = None
+    _search_index: Optional[SearchIndex] = None
+    _search_lock = threading.Lock()
+    _watcher: Optional[PackWatcher] = None
+    _pending_paths: Set[str] = set()  # edits rejected last poll, retried with the next one
+    _prefetcher: Optional[LessonPrefetcher] = None
+
+    @staticmethod
+    def get_catalog() -> ContentCatalog:
+        """Build the lesson catalog on first use and reuse it afterwards"""
+        if ContentEngine._catalog is None:
+            ContentEngine._catalog = ContentEngine.load_catalog(LESSON_PACKS_DIR)
+        return ContentEngine._catalog
+
+    @staticmethod
+    def load_catalog(packs_dir: str, cache_dir: str = CONTENT_CACHE_DIR) -> ContentCatalog:
+        """
+        Load the catalog from the compiled snapshot, rebuilding it first if the sources changed.
+        Sources are the lesson packs in packs_dir if there are any, otherwise the built-in lessons.
+        """
+        packs = LessonPack.discover(packs_dir)
+        source_hash = ContentSnapshot.source_hash(packs)
+        snapshot_path = os.path.join(cache_dir, ContentSnapshot.FILE_NAME)
+
+        snapshot = ContentSnapshot.open(snapshot_path)
+        if snapshot is not None and snapshot.source_hash == source_hash:
+            try:
+                catalog = ContentCatalog.from_snapshot(snapshot)
+                catalog.version = source_hash.hex()
+                return catalog
+            except ValueError as e:
+                snapshot.close()
+                snapshot = None
+                print(f"Invalid content snapshot, rebuilding: {e}")
+
+        catalog = ContentEngine._load_source_catalog(packs)
+        catalog.version = source_hash.hex()
+        try:
+            # A stale snapshot still holds compiled records for every lesson that didn't change
+            ContentSnapshot.build(snapshot_path, catalog.iter_lessons(), source_hash, previous=snapshot)
+        except OSError as e:
+            print(f"Couldn't write content snapshot: {e}")
+            return catalog
+        finally:
+            if snapshot is not None:
+                snapshot.close()
+
+        # Serve from the new snapshot: its summaries and content hashes come from the lesson bodies,
+        # which hand-edited manifests can lag behind
+        snapshot = ContentSnapshot.open(snapshot_path, source_hash)
+        if snapshot is None:
+            return catalog
+        rebuilt = ContentCatalog.from_snapshot(snapshot)
+        rebuilt.version = catalog.version
+        return rebuilt
+
+    @staticmethod
+    def _load_source_catalog(packs: List[LessonPack]) -> ContentCatalog:
+        if packs:
+            try:
+                return ContentCatalog.from_packs(packs)
+            except ValueError as e:
+                print(f"Invalid lesson packs, using built-in lessons: {e}")
+        return ContentCatalog.from_lessons(ContentEngine._build_builtin_lessons())
+
+    @staticmethod
+    def set_catalog(catalog: Optional[ContentCatalog]) -> None:
+        """Replace the active catalog (None rebuilds it on next use)"""
+        ContentEngine._catalog = catalog
+        ContentEngine._search_index = None
+
+    @staticmethod
+    def enable_dev_mode(packs_dir: str = LESSON_PACKS_DIR) -> None:
+        """Serve content straight from the packs (bypassing the snapshot) and watch them for edits"""
+        ContentEngine._watcher = PackWatcher(packs_dir)
+        ContentEngine.set_catalog(ContentEngine._load_source_catalog(LessonPack.discover(packs_dir)))
+
+    @staticmethod
+    def poll_content_changes() -> Set[str]:
+        """Dev mode: apply pack files edited since the last poll; returns the ids of changed lessons"""
+        watcher = ContentEngine._watcher
+        if watcher is None:
+            return set()
+        paths = sorted(set(watcher.poll()) | ContentEngine._pending_paths)
+        if not paths:
+            return set()
+        ContentEngine._pending_paths = set()
+
+        catalog = ContentEngine.get_catalog()
+        pack_paths = {os.path.normpath(pack.path) for pack in catalog.packs}
+        manifests = [path for path in paths if os.path.basename(path) == LessonPack.MANIFEST_NAME]
+        zips = [path for path in paths if path.lower().endswith(ZipLessonPack.EXTENSION)]
+        if zips or any(os.path.dirname(path) not in pack_paths or not os.path.exists(path) for path in manifests):
+            # A pack was added, removed or (for zip packs) replaced, so reload everything
+            for pack in catalog.packs:
+                pack.close()
+            packs = LessonPack.discover(watcher.packs_dir)
+            ContentEngine.set_catalog(ContentEngine._load_source_catalog(packs))
+            changed = set(catalog.summaries_by_id) | set(ContentEngine.get_catalog().summaries_by_id)
+        else:
+            try:
+                changed = catalog.reload_pack_files(paths)
+            except ValueError as e:
+                print(f"Lesson pack edit not applied: {e}")
+                ContentEngine._pending_paths = set(paths)
+                return set()
+
+        if ContentEngine._prefetcher is not None:
+            ContentEngine._prefetcher.discard(changed)
+        return changed
+
+    @staticmethod
+    def _current_search_index() -> Optional[SearchIndex]:
+        """The search index if it is ready for the current content, without waiting on a build"""
+        catalog = ContentEngine.get_catalog()
+        index = ContentEngine._search_index
+        if index is not None and index.version == catalog.version and index.revision == catalog.revision:
+            return index
+        return None
+
+    @staticmethod
+    def warm_search_index():
+        """Load or build the search index on a background thread, unless that is already happening"""
+        if ContentEngine._current_search_index() is None and not ContentEngine._search_lock.locked():
+            threading.Thread(target=ContentEngine.get_search_index, name="search-index", daemon=True).start()
+
+    @staticmethod
+    def get_search_index(cache_dir: str = CONTENT_CACHE_DIR) -> SearchIndex:
+        """Search index for the current content version: loaded from disk, or built once and persisted"""
+        catalog = ContentEngine.get_catalog()
+        with ContentEngine._search_lock:
+            index = ContentEngine._search_index
+            if ContentEngine._current_search_index() is not None:
+                return index
+
+            index_path = os.path.join(cache_dir, SearchIndex.FILE_NAME)
+            stored = SearchIndex.load(index_path) if catalog.version else None
+            if stored is not None and stored.version == catalog.version and catalog.revision == 0:
+                index = stored
+            else:
+                # Reuse tokens of unchanged lessons and items from the last index built, in memory or on disk
+                cached_tokens = dict(stored.cached_tokens()) if stored is not None else {}
+                if index is not None:
+                    cached_tokens.update(index.cached_tokens())
+                index = SearchIndex.build(catalog, catalog.version, cached_tokens)
+                if catalog.version:
+                    try:
+                        index.save(index_path)
+                    except OSError as e:
+                        print(f"Couldn't save search index: {e}")
+            index.revision = catalog.revision
+            ContentEngine._search_index = index
+            return index
+
+    @staticmethod
+    def search_lessons(query: str, limit: int = 10) -> Optional[List[Tuple[LessonSummary, str]]]:
+        """
+        Matching lessons with the kind of content that matched ('lesson' or an item type), or None
+        while the search index is still being prepared - never waits for it, so it is safe on the Tk thread
+        """
+        catalog = ContentEngine.get_catalog()
+        index = ContentEngine._current_search_index()
+        if index is None:
+            ContentEngine.warm_search_index()
+            return None
+        results = index.search(query, limit)
+        return [(catalog.summaries_by_id[lesson_id], kind) for lesson_id, kind in results
+                if lesson_id in catalog.summaries_by_id]
 
-class ContentEngine:
     @staticmethod
     def get_all_lessons() -> List[Lesson]:
+        """Every lesson with its full body - loads the whole catalog, so avoid in the UI"""
+        return ContentEngine.get_catalog().get_all_lessons()
+
+    @staticmethod
+    def get_lesson_count() -> int:
+        return len(ContentEngine.get_catalog())
+
+    @staticmethod
+    def _build_builtin_lessons() -> List[Lesson]:
         return [
             Lesson(
                 id="basics_01_variables",
@@ -645,6 +3716,7 @@ Rules:
                         id="basics_01_ex1",
                         prompt="Create a variable called 'greeting' with the value 'Hello World' and print it.",
                         test_cases=[("", "Hello World")],
+                        solution="greeting = 'Hello World'\nprint(greeting)",
                         hints=[
                             "Use the assignment operator: greeting = ...",
                             "Use print() function to display the value",
@@ -658,6 +3730,7 @@ Rules:
                         id="basics_01_ex2",
                         prompt="Create two variables: 'a' with value 5 and 'b' with value 3. Print their sum.",
                         test_cases=[("", "8")],
+                        solution="a = 5\nb = 3\nprint(a + b)",
                         hints=[
                             "Create both variables first",
                             "Use + to add numbers",
@@ -777,6 +3850,7 @@ Type Conversion:
                         id="basics_02_ex1",
                         prompt="Convert the string '100' to an integer and add 50 to it. Print the result.",
                         test_cases=[("", "150")],
+                        solution="print(int('100') + 50)",
                         hints=[
                             "Use int() to convert",
                             "Then add 50",
@@ -784,6 +3858,20 @@ Type Conversion:
                         ],
                         difficulty=2,
                         concept="types"
+                    ),
+                    Exercise(
+                        id="basics_02_ex2",
+                        prompt="Read a number with input(), convert it to an integer and print double its value.",
+                        test_cases=[("4", "8"), ("21", "42"), ("-3", "-6")],
+                        solution="number = input()\nprint(int(number) * 2)",
+                        hints=[
+                            "input() always returns a string",
+                            "Use int() to convert what you read",
+                            "print(int(input()) * 2)"
+                        ],
+                        difficulty=2,
+                        concept="types",
+                        starter_code="number = input()\n# Convert and print double the number\n"
                     )
                 ],
                 prerequisites=["basics_01_variables"],
@@ -843,6 +3931,7 @@ Comparison Operators:
                         id="control_01_ex1",
                         prompt="Write code that checks if a variable 'score' (value 85) is >= 60. If yes, print 'Pass', otherwise print 'Fail'.",
                         test_cases=[("", "Pass")],
+                        solution="score = 85\nif score >= 60:\n    print('Pass')\nelse:\n    print('Fail')",
                         hints=[
                             "score = 85",
                             "if score >= 60:",
@@ -907,6 +3996,7 @@ Range Function:
                         id="control_02_ex1",
                         prompt="Use a for loop to print numbers 1 through 5, each on a new line.",
                         test_cases=[("", "1\n2\n3\n4\n5")],
+                        solution="for i in range(1, 6):\n    print(i)",
                         hints=[
                             "Use range(1, 6) for 1-5",
                             "for i in range(...):",
@@ -1018,6 +4108,7 @@ Why Use Functions?
                         id="functions_01_ex1",
                         prompt="Create a function called 'double' that takes a number and returns it multiplied by 2. Then call it with 7 and print the result.",
                         test_cases=[("", "14")],
+                        solution="def double(num):\n    return num * 2\n\nprint(double(7))",
                         hints=[
                             "def double(num):",
                             "    return num * 2",
@@ -1094,6 +4185,7 @@ Common Operations:
                         id="data_01_ex1",
                         prompt="Create a list of numbers [10, 20, 30], append 40 to it, then print the length of the list.",
                         test_cases=[("", "4")],
+                        solution="numbers = [10, 20, 30]\nnumbers.append(40)\nprint(len(numbers))",
                         hints=[
                             "numbers = [10, 20, 30]",
                             "numbers.append(40)",
@@ -1159,6 +4251,7 @@ Common Operations:
                         id="data_02_ex1",
                         prompt="Create a dictionary with keys 'apple', 'banana', 'orange' and values 1, 2, 3. Print the value for 'banana'.",
                         test_cases=[("", "2")],
+                        solution="fruits = {'apple': 1, 'banana': 2, 'orange': 3}\nprint(fruits['banana'])",
                         hints=[
                             "fruits = {'apple': 1, 'banana': 2, 'orange': 3}",
                             "Access with fruits['banana']",
@@ -1225,6 +4318,7 @@ Important: Always ensure the condition becomes False eventually!""",
                         id="control_03_ex1",
                         prompt="Use a while loop to print numbers 1 through 3, each on a new line.",
                         test_cases=[("", "1\n2\n3")],
+                        solution="n = 1\nwhile n <= 3:\n    print(n)\n    n += 1",
                         hints=[
                             "Start with n = 1",
                             "Loop while n <= 3",
@@ -1290,6 +4384,7 @@ Strings are immutable - methods return new strings!""",
                         id="strings_01_ex1",
                         prompt="Take the string 'python' and print it in uppercase.",
                         test_cases=[("", "PYTHON")],
+                        solution="text = 'python'\nprint(text.upper())",
                         hints=[
                             "Use the .upper() method",
                             "text = 'python'",
@@ -1359,6 +4454,7 @@ Benefits:
                         id="advanced_01_ex1",
                         prompt="Create a list comprehension that produces [2, 4, 6, 8, 10] and print it.",
                         test_cases=[("", "[2, 4, 6, 8, 10]")],
+                        solution="print([x * 2 for x in range(1, 6)])",
                         hints=[
                             "Use range(1, 6) for numbers 1-5",
                             "Multiply each by 2",
@@ -1429,6 +4525,7 @@ Use 'except Exception' to catch all errors (but be specific when possible!)""",
                         id="advanced_02_ex1",
                         prompt="Write try/except that tries to convert '123' to int and prints the result. If it fails, print 'Error'.",
                         test_cases=[("", "123")],
+                        solution="try:\n    print(int('123'))\nexcept ValueError:\n    print('Error')",
                         hints=[
                             "try:",
                             "    print(int('123'))",
@@ -1467,26 +4564,88 @@ Use 'except Exception' to catch all errors (but be specific when possible!)""",
 
     @staticmethod
     def get_lesson_by_id(lesson_id: str) -> Optional[Lesson]:
-        for lesson in ContentEngine.get_all_lessons():
-            if lesson.id == lesson_id:
+        catalog = ContentEngine.get_catalog()
+        summary = catalog.summaries_by_id.get(lesson_id)
+        if ContentEngine._prefetcher is not None and summary is not None and not catalog.is_loaded(lesson_id):
+            lesson = ContentEngine._prefetcher.take(summary)
+            if lesson is not None:
+                catalog.add_loaded(lesson)
                 return lesson
+        return catalog.get_lesson(lesson_id)
+
+    @staticmethod
+    def prefetch_lessons(lesson_ids: List[str]) -> None:
+        """Prepare these lessons in the background, most likely first, so they open instantly"""
+        if ContentEngine._prefetcher is None:
+            ContentEngine._prefetcher = LessonPrefetcher(ContentEngine.get_catalog)
+        ContentEngine._prefetcher.request(lesson_ids)
+
+    @staticmethod
+    def get_lesson_summary(lesson_id: str) -> Optional[LessonSummary]:
+        return ContentEngine.get_catalog().summaries_by_id.get(lesson_id)
+
+    @staticmethod
+    def get_unlock_tracker(completed: Set[str]) -> UnlockTracker:
+        return UnlockTracker(ContentEngine.get_catalog().graph, completed)
+
+    @staticmethod
+    def get_recommender(user: User, unlocks: UnlockTracker) -> LessonRecommender:
+        return LessonRecommender(user, unlocks, ContentEngine.get_catalog().summaries_by_id)
+
+    @staticmethod
+    def get_available_lessons(completed: Set[str]) -> List[LessonSummary]:
+        catalog = ContentEngine.get_catalog()
+        return [catalog.summaries_by_id[lesson_id]
+                for lesson_id in UnlockTracker(catalog.graph, completed).available()]
+
+    @staticmethod
+    def get_skill_paths() -> Dict[str, List[LessonSummary]]:
+        return {path: list(summaries) for path, summaries in ContentEngine.get_catalog().summaries_by_path.items()}
+
+    @staticmethod
+    def get_item_ref(item_id: str) -> Optional[ItemRef]:
+        return ContentEngine.get_catalog().items_by_id.get(item_id)
+
+    @staticmethod
+    def get_item_by_id(item_id: str) -> Optional[Any]:
+        ref = ContentEngine.get_item_ref(item_id)
+        lesson = ContentEngine.get_lesson_by_id(ref.lesson_id) if ref else None
+        if lesson is None:
+            return None
+        for _, item in iter_lesson_items(lesson):
+            if item.id == item_id:
+                return item
         return None
 
     @staticmethod
-    def get_available_lessons(completed: Set[str]) -> List[Lesson]:
-        available = []
-        for lesson in ContentEngine.get_all_lessons():
-            if lesson.id not in completed:
-                if all(prereq in completed for prereq in lesson.prerequisites):
-                    available.append(lesson)
-        return available
+    def get_lesson_for_item(item_id: str) -> Optional[Lesson]:
+        ref = ContentEngine.get_item_ref(item_id)
+        return ContentEngine.get_lesson_by_id(ref.lesson_id) if ref else None
+
+    @staticmethod
+    def get_items_by_concept(concept: str) -> List[ItemRef]:
+        return list(ContentEngine.get_catalog().items_by_concept.get(concept, []))
+
+    @staticmethod
+    def get_lessons_by_concept(concept: str) -> List[LessonSummary]:
+        return list(ContentEngine.get_catalog().summaries_by_concept.get(concept, []))
+
+    @staticmethod
+    def get_practice_concepts() -> List[str]:
+        return sorted(concept for concept, refs in ContentEngine.get_catalog().items_by_concept.items() if refs)
 
     @staticmethod
-    def get_skill_paths() -> Dict[str, List[Lesson]]:
-        paths = defaultdict(list)
-        for lesson in ContentEngine.get_all_lessons():
-            paths[lesson.skill_path].append(lesson)
-        return dict(paths)
+    def build_practice_session(concept: Optional[str], count: int = 10, max_difficulty: int = 2,
+                               exclude: Iterable[str] = ()) -> PracticeSession:
+        """Sample a practice session; only the lessons holding the drawn items are loaded"""
+        # Own generator: the daily challenge reseeds the global one with the date
+        refs = ContentEngine.get_catalog().sample_items(count, concept, max_difficulty, exclude, random.Random())
+        items = []
+        for ref in refs:
+            item = ContentEngine.get_item_by_id(ref.id)
+            if item is not None:
+                items.append((ref.item_type, item))
+        return PracticeSession(concept=concept, max_difficulty=max_difficulty, items=items)
 
 
 # ============================================================================
@@ -1619,54 +4778,206 @@ class GamificationSystem:
 # SECTION 4: CODE EXECUTION & VALIDATION
 # ============================================================================
 
+class StdinBuffer:
+    """In-memory stdin for one test case, pre-split into lines for a sandboxed input()"""
+
+    def __init__(self, test_input, stdout):
+        if isinstance(test_input, str):
+            self.lines = test_input.splitlines()
+        else:
+            self.lines = list(test_input)
+        self.position = 0
+        self.stdout = stdout
+
+    def input(self, prompt=""):
+        # Like the real input(), the prompt goes to stdout and the line is returned without its newline
+        if prompt:
+            self.stdout.write(str(prompt))
+        if self.position >= len(self.lines):
+            raise EOFError("EOF when reading a line")
+        line = self.lines[self.position]
+        self.position += 1
+        return line
+
+
+class SandboxProcess:
+    """
+    A worker process that runs sandboxed programs for CodeExecutor, one at a time. A program still
+    running at its deadline - even one stuck inside a single builtin call - is stopped by killing the
+    worker, so nothing it started keeps running (or holds memory) in the app; the next run starts a
+    fresh worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # One program at a time: the Tk thread and the prefetcher take turns
+        self._conn = None
+        self._process = None
+
+    @staticmethod
+    def _serve(conn) -> None:
+        """Worker process loop: run each (marshalled code, stdin) request and send back the result"""
+        while True:
+            try:
+                code, test_input = conn.recv()
+            except EOFError:
+                return
+            conn.send(CodeExecutor._exec_compiled(marshal.loads(code), test_input))
+
+    def run(self, compiled, test_input, timeout: float) -> Optional[Tuple[bool, str, str]]:
+        """The program's result, or None if it was still running after timeout seconds"""
+        import multiprocessing
+
+        with self._lock:
+            if self._process is None:
+                context = multiprocessing.get_context()
+                self._conn, child_conn = context.Pipe()
+                self._process = context.Process(target=SandboxProcess._serve, args=(child_conn,),
+                                                name="sandbox", daemon=True)
+                self._process.start()
+                child_conn.close()
+            try:
+                self._conn.send((marshal.dumps(compiled), test_input))
+                if self._conn.poll(timeout):
+                    return self._conn.recv()
+                result = None
+            except (EOFError, OSError) as e:
+                result = (False, "", f"RuntimeError: the program stopped unexpectedly ({e})")
+            self._process.kill()
+            self._process.join()
+            self._conn.close()
+            self._conn = self._process = None
+            return result
+
 class CodeExecutor:
-    # Note: Timeout not implemented - would require threading/multiprocessing
-    # For safety, we rely on blacklist instead
-    TIMEOUT_SECONDS = 5  # Not currently used
+    # Each run gets TIMEOUT_SECONDS in a killable worker process (see _run_compiled); the blacklist does the rest
+    TIMEOUT_SECONDS = 5
     MAX_OUTPUT_LENGTH = 1000
-    BLACKLIST = ['__import__', 'eval', 'exec', 'compile', 'open', 'input',
+    BLACKLIST = ['__import__', 'eval', 'exec', 'compile', 'open',
                  'file', 'os', 'sys', 'subprocess', 'globals', 'locals',
                  'vars', 'dir', '__builtins__']
+    SAFE_BUILTINS = {
+        'len': len, 'range': range, 'str': str,
+        'int': int, 'float': float, 'bool': bool, 'list': list,
+        'dict': dict, 'set': set, 'tuple': tuple, 'sum': sum,
+        'max': max, 'min': min, 'abs': abs, 'round': round,
+        'sorted': sorted, 'enumerate': enumerate, 'zip': zip,
+        'map': map, 'filter': filter, 'reversed': reversed,
+        'all': all, 'any': any, 'True': True, 'False': False, 'None': None,
+        'Exception': Exception, 'ValueError': ValueError, 'TypeError': TypeError,
+        'ZeroDivisionError': ZeroDivisionError, 'KeyError': KeyError, 'IndexError': IndexError,
+    }
+    # Source text -> code object for content code precompiled in the content snapshot
+    COMPILED_CACHE: Dict[str, Any] = {}
+    # Source text -> run result for content code that answers are compared against (bug-fix solutions)
+    REFERENCE_OUTPUTS: Dict[str, Tuple[bool, str, str]] = {}
+
+    @staticmethod
+    def precompile(code: str):
+        """Compile trusted content code for the cache, or return None if it can't run in the sandbox"""
+        if not code or CodeExecutor.check_restrictions(code):
+            return None
+        try:
+            return compile(code, "<string>", "exec")
+        except Exception:
+            return None
+
+    @staticmethod
+    def check_restrictions(code: str) -> str:
+        """
+        Return an error message if the code names a restricted builtin or module or imports anything,
+        else an empty string. Names are matched as whole identifiers, so `cost = 5` or a string holding
+        'Boston' is fine; code that doesn't parse is left for compile() to report.
+        """
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            return ""
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                return "Import statements are not allowed in exercises"
+            if isinstance(node, ast.Name):
+                name = node.id
+            elif isinstance(node, ast.Attribute):
+                name = node.attr
+            else:
+                continue
+            if name in CodeExecutor.BLACKLIST:
+                return f"Restricted keyword: {name}"
+        return ""
 
     @staticmethod
     def execute_code(code: str, test_input: str = "") -> Tuple[bool, str, str]:
-        code_lower = code.lower()
-        for banned in CodeExecutor.BLACKLIST:
-            if banned in code_lower:
-                return False, "", f"Restricted keyword: {banned}"
+        return next(CodeExecutor.run_cases(code, [test_input]))
+
+    @staticmethod
+    def reference_output(code: str) -> Tuple[bool, str, str]:
+        """Run result of trusted content code, computed once"""
+        result = CodeExecutor.REFERENCE_OUTPUTS.get(code)
+        if result is None:
+            result = CodeExecutor.REFERENCE_OUTPUTS[code] = CodeExecutor.execute_code(code)
+        return result
+
+    @staticmethod
+    def run_cases(code: str, inputs: Iterable[str]) -> Iterable[Tuple[bool, str, str]]:
+        """
+        Compile the code once and run it against each stdin fixture in turn
+        Yields: one (success, output, error_message) tuple per input, each case run only when asked for
+        """
+        error_msg = CodeExecutor.check_restrictions(code)
+        if not error_msg:
+            compiled = CodeExecutor.COMPILED_CACHE.get(code)
+            if compiled is None:
+                try:
+                    compiled = compile(code, "<string>", "exec")
+                except Exception as e:
+                    error_msg = f"{type(e).__name__}: {str(e)}"
+        for test_input in inputs:
+            yield (False, "", error_msg) if error_msg else CodeExecutor._run_compiled(compiled, test_input)
+
+    _sandbox = SandboxProcess()
+
+    @staticmethod
+    def _run_compiled(compiled, test_input, timeout: Optional[float] = None) -> Tuple[bool, str, str]:
+        """
+        Execute an already-compiled program in the sandbox worker process, which is killed if the program
+        runs past the timeout. A daemon process (a validation worker, or the sandbox itself) can't start
+        one, and whoever started it already enforces a deadline, so there the program runs inline.
+        """
+        import multiprocessing
 
-        if 'import' in code_lower:
-            return False, "", "Import statements are not allowed in exercises"
+        if multiprocessing.current_process().daemon:
+            return CodeExecutor._exec_compiled(compiled, test_input)
+        timeout = CodeExecutor.TIMEOUT_SECONDS if timeout is None else timeout
+        result = CodeExecutor._sandbox.run(compiled, test_input, timeout)
+        if result is None:
+            return False, "", f"TimeoutError: timed out after {timeout:g} seconds (is there a loop that never ends?)"
+        return result
+
+    @staticmethod
+    def _exec_compiled(compiled, test_input) -> Tuple[bool, str, str]:
+        """Execute an already-compiled program with its own stdin buffer and captured stdout"""
+        stdout = io.StringIO()
+        stdin = StdinBuffer(test_input, stdout)
 
-        old_stdout = sys.stdout
-        sys.stdout = io.StringIO()
+        def sandbox_print(*args, sep=' ', end='\n', file=None, flush=False):
+            print(*args, sep=sep, end=end, file=stdout if file is None else file, flush=flush)
 
         success = True
         error_msg = ""
 
         try:
             safe_globals = {
-                '__builtins__': {
-                    'print': print, 'len': len, 'range': range, 'str': str,
-                    'int': int, 'float': float, 'bool': bool, 'list': list,
-                    'dict': dict, 'set': set, 'tuple': tuple, 'sum': sum,
-                    'max': max, 'min': min, 'abs': abs, 'round': round,
-                    'sorted': sorted, 'enumerate': enumerate, 'zip': zip,
-                    'map': map, 'filter': filter, 'reversed': reversed,
-                    'all': all, 'any': any, 'True': True, 'False': False, 'None': None,
-                }
+                '__builtins__': dict(CodeExecutor.SAFE_BUILTINS,
+                                     print=sandbox_print, input=stdin.input)
             }
 
-            exec(code, safe_globals)
+            exec(compiled, safe_globals)
 
         except Exception as e:
             success = False
             error_msg = f"{type(e).__name__}: {str(e)}"
 
-        finally:
-            output = sys.stdout.getvalue()
-            sys.stdout = old_stdout
-
+        output = stdout.getvalue()
         if len(output) > CodeExecutor.MAX_OUTPUT_LENGTH:
             output = output[:CodeExecutor.MAX_OUTPUT_LENGTH] + "\n... (truncated)"
 
@@ -1700,6 +5011,276 @@ class HintSystem:
         return base_hint
 
 
+@dataclass
+class ValidationResult:
+    """Outcome of one content check; a passed result with a message is a warning"""
+    lesson_id: str
+    item_id: str
+    check: str
+    passed: bool
+    message: str = ""
+    seconds: float = 0.0
+    cached: bool = False
+
+
+class ContentValidator:
+    """
+    Checks that every piece of runnable content does what the lesson claims.
+    Code checks are independent, so they run in a process pool.
+    """
+
+    CACHE_FILE = "validation.bin"
+    CACHE_FORMAT = 1
+    # Wall-clock limit for one check in the pool; the sandbox's own deadline only stops Python-level loops,
+    # so a check stuck inside a single builtin call (sum(range(10**13))) needs its worker killed instead
+    TASK_TIMEOUT = 20
+
+    @staticmethod
+    def collect_tasks(lesson: Lesson) -> List[Tuple[str, str, str, tuple, str]]:
+        """(check, lesson id, item id, payload, content hash) for each piece of code in the lesson"""
+        tasks = []
+        for index, example in enumerate(lesson.examples):
+            tasks.append(('example', lesson.id, f"{lesson.id}_example{index + 1}", (example.code,),
+                          content_hash(example)))
+        for drill in lesson.output_drills:
+            tasks.append(('drill', lesson.id, drill.id, (drill.code, drill.correct_output), content_hash(drill)))
+        for drill in lesson.bug_fix_drills:
+            tasks.append(('bug_fix', lesson.id, drill.id, (drill.buggy_code, drill.correct_code),
+                          content_hash(drill)))
+        for exercise in lesson.exercises:
+            if exercise.solution:
+                tasks.append(('exercise', lesson.id, exercise.id, (exercise.solution, exercise.test_cases),
+                              content_hash(exercise)))
+        return tasks
+
+    @staticmethod
+    def load_cache(path: str) -> Dict[str, Tuple[bool, str]]:
+        """Earlier results by content hash; discarded when the app (and so the sandbox) changed"""
+        try:
+            with open(path, 'rb') as f:
+                data = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+        if data.get('format') != ContentValidator.CACHE_FORMAT or data.get('app') != CURRENT_VERSION:
+            return {}
+        return data['results']
+
+    @staticmethod
+    def save_cache(path: str, cache: Dict[str, Tuple[bool, str]]) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            marshal.dump({'format': ContentValidator.CACHE_FORMAT, 'app': CURRENT_VERSION, 'results': cache}, f)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def static_checks(lesson: Lesson) -> List[ValidationResult]:
+        """Checks that need no code execution"""
+        results = []
+        for question in lesson.mcq_questions:
+            if not 0 <= question.correct_answer < len(question.choices):
+                results.append(ValidationResult(lesson.id, question.id, 'mcq', False,
+                                                f"correct_answer {question.correct_answer} is not a valid choice"))
+        for question in lesson.multi_answer_questions:
+            invalid = [i for i in question.correct_answers if not 0 <= i < len(question.choices)]
+            if invalid or not question.correct_answers:
+                results.append(ValidationResult(lesson.id, question.id, 'multi_answer', False,
+                                                f"invalid correct_answers {question.correct_answers}"))
+        for exercise in lesson.exercises:
+            if not exercise.solution:
+                results.append(ValidationResult(lesson.id, exercise.id, 'exercise', True,
+                                                "no reference solution, test cases not checked"))
+        return results
+
+    @staticmethod
+    def run_task(task: Tuple[str, str, str, tuple, str]) -> ValidationResult:
+        check, lesson_id, item_id, payload, _ = task
+        started = time.perf_counter()
+        try:
+            passed, message = getattr(ContentValidator, f"_check_{check}")(*payload)
+        except Exception as e:
+            passed, message = False, f"{type(e).__name__}: {e}"
+        return ValidationResult(lesson_id, item_id, check, passed, message, time.perf_counter() - started)
+
+    @staticmethod
+    def _check_example(code: str) -> Tuple[bool, str]:
+        success, _, error = CodeExecutor.execute_code(code)
+        return success, error
+
+    @staticmethod
+    def _check_drill(code: str, correct_output: str) -> Tuple[bool, str]:
+        success, output, error = CodeExecutor.execute_code(code)
+        if not success:
+            return False, error
+        if output.strip() != correct_output.strip():
+            return False, f"expected {correct_output.strip()!r}, got {output.strip()!r}"
+        return True, ""
+
+    @staticmethod
+    def _check_bug_fix(buggy_code: str, correct_code: str) -> Tuple[bool, str]:
+        success, correct_output, error = CodeExecutor.execute_code(correct_code)
+        if not success:
+            return False, f"correct_code fails: {error}"
+        buggy_success, buggy_output, _ = CodeExecutor.execute_code(buggy_code)
+        if buggy_success and buggy_output.strip() == correct_output.strip():
+            return False, "buggy_code already produces the correct output"
+        return True, ""
+
+    @staticmethod
+    def _check_exercise(solution: str, test_cases: List[Tuple[str, Any]]) -> Tuple[bool, str]:
+        exercise = Exercise(id="", prompt="", test_cases=test_cases, hints=[], difficulty=1, concept="")
+        passed, message, details = exercise.validate_solution(solution)
+        return passed, "" if passed else f"solution: {message} {' | '.join(details)}".strip()
+
+    @staticmethod
+    def _pool_worker(conn, progress) -> None:
+        """
+        Worker process loop: run each batch of tasks and send back its results. progress holds the
+        position in the batch and the time.monotonic() the current task started, for the parent's deadline.
+        """
+        while True:
+            try:
+                batch = conn.recv()
+            except EOFError:
+                return
+            if batch is None:
+                return
+            results = []
+            for position, task in enumerate(batch):
+                progress[0], progress[1] = position, time.monotonic()
+                results.append(ContentValidator.run_task(task))
+            conn.send(results)
+
+    @staticmethod
+    def _run_pool(tasks: List[Tuple[str, str, str, tuple, str]], pool_size: int, chunksize: int,
+                  timeout: float) -> Tuple[List[ValidationResult], Set[int]]:
+        """
+        Run the tasks in worker processes, giving each one `timeout` seconds. A worker that overruns is
+        killed and replaced; its task fails as timed out and the rest of its batch goes back in the queue.
+        Returns the results in task order and the indexes of the tasks that timed out.
+        """
+        import multiprocessing
+        from multiprocessing.connection import wait
+
+        context = multiprocessing.get_context()
+        pending = deque(list(range(start, min(start + chunksize, len(tasks))))
+                        for start in range(0, len(tasks), chunksize))
+        checked: List[Optional[ValidationResult]] = [None] * len(tasks)
+        timed_out: Set[int] = set()
+        busy: Dict[Any, Tuple[Any, Any, List[int]]] = {}  # connection -> (process, progress, batch)
+        idle = []
+
+        def start_worker():
+            parent_conn, child_conn = context.Pipe()
+            progress = context.RawArray('d', 2)
+            process = context.Process(target=ContentValidator._pool_worker, args=(child_conn, progress),
+                                      daemon=True)
+            process.start()
+            child_conn.close()
+            return parent_conn, process, progress
+
+        def stop_worker(conn, process, kill: bool):
+            if kill:
+                process.kill()
+            else:
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+            process.join()
+            conn.close()
+
+        def fail_current(conn, message: str) -> int:
+            process, progress, batch = busy.pop(conn)
+            position, started = int(progress[0]), progress[1]
+            stop_worker(conn, process, kill=True)
+            index = batch[position]
+            check, lesson_id, item_id, _, _ = tasks[index]
+            checked[index] = ValidationResult(lesson_id, item_id, check, False, message,
+                                              time.monotonic() - started)
+            # Results finished before the stuck task went down with the worker; they're cheap to re-run
+            rest = batch[:position] + batch[position + 1:]
+            if rest:
+                pending.appendleft(rest)
+            return index
+
+        def dispatch():
+            while pending and len(busy) < pool_size:
+                conn, process, progress = idle.pop() if idle else start_worker()
+                batch = pending.popleft()
+                progress[0], progress[1] = 0, time.monotonic()
+                conn.send([tasks[index] for index in batch])
+                busy[conn] = (process, progress, batch)
+
+        try:
+            dispatch()
+            while busy:
+                deadline = min(progress[1] for _, progress, _ in busy.values()) + timeout
+                for conn in wait(list(busy), timeout=max(0.0, deadline - time.monotonic())):
+                    try:
+                        batch_results = conn.recv()
+                    except (EOFError, OSError):
+                        fail_current(conn, "worker process exited unexpectedly")
+                        continue
+                    process, progress, batch = busy.pop(conn)
+                    for index, result in zip(batch, batch_results):
+                        checked[index] = result
+                    idle.append((conn, process, progress))
+                now = time.monotonic()
+                for conn in [c for c, (_, progress, _) in busy.items() if now - progress[1] >= timeout]:
+                    timed_out.add(fail_current(conn, f"timed out after {timeout:g}s"))
+                dispatch()
+        finally:
+            for conn, (process, _, _) in list(busy.items()):
+                stop_worker(conn, process, kill=True)
+            for conn, process, _ in idle:
+                stop_worker(conn, process, kill=False)
+        return checked, timed_out
+
+    @staticmethod
+    def validate(lessons: Iterable[Lesson], workers: Optional[int] = None,
+                 cache: Optional[Dict[str, Tuple[bool, str]]] = None,
+                 timeout: Optional[float] = None) -> List[ValidationResult]:
+        """
+        Validate the lessons; workers=1 runs everything in this process, where only the sandbox's own
+        deadline applies. In the pool each check gets `timeout` seconds (TASK_TIMEOUT by default).
+        Code checks whose content hash is in the cache are not re-run, and new results are added to it.
+        """
+        timeout = ContentValidator.TASK_TIMEOUT if timeout is None else timeout
+        results = []
+        tasks = []
+        seen_items: Set[str] = set()
+        for lesson in lessons:
+            for item_type, item in iter_lesson_items(lesson):
+                if item.id in seen_items:
+                    results.append(ValidationResult(lesson.id, item.id, item_type, False, "duplicate item id"))
+                seen_items.add(item.id)
+            results.extend(ContentValidator.static_checks(lesson))
+            for task in ContentValidator.collect_tasks(lesson):
+                check, lesson_id, item_id, _, key = task
+                if cache is not None and key in cache:
+                    passed, message = cache[key]
+                    results.append(ValidationResult(lesson_id, item_id, check, passed, message, cached=True))
+                else:
+                    tasks.append(task)
+
+        timed_out: Set[int] = set()
+        if workers == 1 or not tasks:
+            checked = list(map(ContentValidator.run_task, tasks))
+        else:
+            pool_size = min(workers or os.cpu_count() or 1, len(tasks))
+            # Batch items so per-task IPC doesn't dominate the cheap checks
+            chunksize = max(1, len(tasks) // (pool_size * 4))
+            checked, timed_out = ContentValidator._run_pool(tasks, pool_size, chunksize, timeout)
+
+        if cache is not None:
+            # A timeout can be load on the machine rather than the content, so it's checked again next time
+            for index, (task, result) in enumerate(zip(tasks, checked)):
+                if index not in timed_out:
+                    cache[task[4]] = (result.passed, result.message)
+        return results + checked
+
+
 # ============================================================================
 # SECTION 5: ENHANCED UI COMPONENTS
 # ============================================================================
@@ -1815,7 +5396,8 @@ class DailyChallengeView(CTkFrame):
 
     def _run_code(self):
         code = self.code_editor.get("0.0", "end-1c")
-        success, output, error = CodeExecutor.execute_code(code)
+        sample_input = self.exercise.test_cases[0][0] if self.exercise.test_cases else ""
+        success, output, error = CodeExecutor.execute_code(code, sample_input)
 
         self.output_text.configure(state="normal")
         self.output_text.delete("0.0", "end")
@@ -2185,39 +5767,44 @@ class BugFixDrillView(CTkFrame):
 
 # FIXED: Lesson View with proper progress tracking and MCQ/drill handling
 class LessonView(CTkFrame):
-    def __init__(self, parent, user: User, lesson: Lesson, on_complete, on_back):
+    def __init__(self, parent, user: User, lesson: Lesson, on_complete, on_back,
+                 items: Optional[List[Tuple[str, Any]]] = None, on_item_result=None):
         super().__init__(parent, corner_radius=20, fg_color="transparent")
         self.user = user
         self.lesson = lesson
         self.on_complete = on_complete
         self.on_back = on_back
+        self.on_item_result = on_item_result  # Called once per item: (item, solved on the first try)
         self.current_exercise_idx = 0
         self.exercise_attempts = {}
         self.last_error = ""
         self.exercise_start_time = datetime.now()
 
-        # Track all lesson items (exercises + MCQs + drills)
-        self.lesson_items = []
-        # Add exercises
-        for ex in lesson.exercises:
-            self.lesson_items.append(('exercise', ex))
-        # Add MCQs
-        for mcq in lesson.mcq_questions:
-            self.lesson_items.append(('mcq', mcq))
-        # Add multi-answer questions
-        for maq in lesson.multi_answer_questions:
-            self.lesson_items.append(('multi_answer', maq))
-        # Add output drills
-        for drill in lesson.output_drills:
-            self.lesson_items.append(('drill', drill))
-        # Add bug fix drills
-        for bug_drill in lesson.bug_fix_drills:
-            self.lesson_items.append(('bug_fix', bug_drill))
+        # Track all lesson items (exercises + MCQs + drills); practice sessions pass their own order
+        self.lesson_items = items if items is not None else list(iter_lesson_items(lesson))
 
         self.current_item_idx = 0
 
         self._create_widgets()
 
+    def reload(self, lesson: Lesson):
+        """Show an edited version of the lesson in place, staying on the current item if it still exists"""
+        current_id = None
+        if self.current_item_idx < len(self.lesson_items):
+            current_id = self.lesson_items[self.current_item_idx][1].id
+
+        self.lesson = lesson
+        self.lesson_items = list(iter_lesson_items(lesson))
+        item_ids = [item.id for _, item in self.lesson_items]
+        if current_id in item_ids:
+            self.current_item_idx = item_ids.index(current_id)
+        else:
+            self.current_item_idx = min(self.current_item_idx, len(self.lesson_items))
+
+        for widget in self.winfo_children():
+            widget.destroy()
+        self._create_widgets()
+
     def _create_widgets(self):
         colors = get_colors()
 
@@ -2392,7 +5979,8 @@ class LessonView(CTkFrame):
                  text_color=colors['primary']).pack(anchor='w', padx=15, pady=(15, 10))
 
         mcq_view = MCQView(self.practice_container, question,
-                           lambda correct, explanation: self._handle_mcq_result(correct, explanation, question))
+                           lambda correct, explanation: self._handle_mcq_result(correct, explanation, question,
+                                                                                mcq_view.attempts))
         mcq_view.pack(fill='both', expand=True, padx=0, pady=0)
 
     def _show_multi_answer(self, question: MultiAnswerQuestion):
@@ -2403,7 +5991,8 @@ class LessonView(CTkFrame):
                  text_color=colors['primary']).pack(anchor='w', padx=15, pady=(15, 10))
 
         multi_view = MultiAnswerView(self.practice_container, question,
-                                     lambda correct, explanation: self._handle_mcq_result(correct, explanation, question))
+                                     lambda correct, explanation: self._handle_mcq_result(correct, explanation, question,
+                                                                                          multi_view.attempts))
         multi_view.pack(fill='both', expand=True, padx=0, pady=0)
 
     def _show_drill(self, drill: OutputDrill):
@@ -2414,7 +6003,8 @@ class LessonView(CTkFrame):
                  text_color=colors['primary']).pack(anchor='w', padx=15, pady=(15, 10))
 
         drill_view = OutputDrillView(self.practice_container, drill,
-                                     lambda correct, explanation, answer: self._handle_drill_result(correct, explanation, answer, drill))
+                                     lambda correct, explanation, answer: self._handle_drill_result(correct, explanation, answer, drill,
+                                                                                                    drill_view.attempts))
         drill_view.pack(fill='both', expand=True, padx=0, pady=0)
 
     def _show_bug_fix(self, bug_drill: BugFixDrill):
@@ -2425,11 +6015,13 @@ class LessonView(CTkFrame):
                  text_color=colors['error']).pack(anchor='w', padx=15, pady=(15, 10))
 
         bug_view = BugFixDrillView(self.practice_container, bug_drill,
-                                   lambda correct, explanation: self._handle_bug_fix_result(correct, explanation, bug_drill))
+                                   lambda correct, explanation: self._handle_bug_fix_result(correct, explanation, bug_drill,
+                                                                                            bug_view.attempts))
         bug_view.pack(fill='both', expand=True, padx=0, pady=0)
 
     # FIXED: Proper MCQ result handling
-    def _handle_mcq_result(self, is_correct: bool, explanation: str, question):
+    def _handle_mcq_result(self, is_correct: bool, explanation: str, question, attempts: int = 1):
+        self._record_result(question, is_correct and attempts == 1)
         if is_correct:
             xp_reward = question.difficulty * 3
             leveled_up, new_level = GamificationSystem.add_xp(
@@ -2446,7 +6038,9 @@ class LessonView(CTkFrame):
             self._show_current_item()
 
     # FIXED: Proper drill result handling
-    def _handle_drill_result(self, is_correct: bool, explanation: str, correct_answer: str, drill: OutputDrill):
+    def _handle_drill_result(self, is_correct: bool, explanation: str, correct_answer: str, drill: OutputDrill,
+                             attempts: int = 1):
+        self._record_result(drill, is_correct and attempts == 1)
         if is_correct:
             xp_reward = drill.difficulty * 3
             leveled_up, new_level = GamificationSystem.add_xp(
@@ -2466,8 +6060,9 @@ class LessonView(CTkFrame):
             self.current_item_idx += 1
             self._show_current_item()
 
-    def _handle_bug_fix_result(self, is_correct: bool, explanation: str, bug_drill: BugFixDrill):
+    def _handle_bug_fix_result(self, is_correct: bool, explanation: str, bug_drill: BugFixDrill, attempts: int = 1):
         """Handle bug fix drill completion"""
+        self._record_result(bug_drill, is_correct and attempts == 1)
         if is_correct:
             xp_reward = bug_drill.difficulty * 5  # Bug fixes worth more!
             leveled_up, new_level = GamificationSystem.add_xp(
@@ -2500,7 +6095,9 @@ class LessonView(CTkFrame):
 
     def _run_code(self, exercise: Exercise):
         code = self.code_editor.get("0.0", "end-1c")
-        success, output, error = CodeExecutor.execute_code(code)
+        # Feed the first test case's input so input()-driven exercises can be tried out
+        sample_input = exercise.test_cases[0][0] if exercise.test_cases else ""
+        success, output, error = CodeExecutor.execute_code(code, sample_input)
 
         self.output_text.configure(state="normal")
         self.output_text.delete("0.0", "end")
@@ -2518,6 +6115,9 @@ class LessonView(CTkFrame):
         self.exercise_attempts[exercise.id] = self.exercise_attempts.get(exercise.id, 0) + 1
 
         success, message, details = exercise.validate_solution(code)
+        # The first submission decides the item's result; later attempts don't count again
+        if self.exercise_attempts[exercise.id] == 1:
+            self._record_result(exercise, success)
 
         self.output_text.configure(state="normal")
         self.output_text.delete("0.0", "end")
@@ -2527,6 +6127,7 @@ class LessonView(CTkFrame):
 
             # Update user stats
             self.user.total_exercises_completed += 1
+            self.user.completed_exercises[exercise.id] = self.user.completed_exercises.get(exercise.id, 0) + 1
             if completion_time < self.user.fastest_completion_time:
                 self.user.fastest_completion_time = completion_time
 
@@ -2551,6 +6152,10 @@ class LessonView(CTkFrame):
 
         self.output_text.configure(state="disabled")
 
+    def _record_result(self, item, first_try: bool):
+        if self.on_item_result is not None:
+            self.on_item_result(item, first_try)
+
     def _next_item(self):
         self.current_item_idx += 1
         self._show_current_item()
@@ -2960,7 +6565,7 @@ class SettingsView(CTkFrame):
 # ============================================================================
 
 class CodeCompanionApp:
-    def __init__(self):
+    def __init__(self, dev_mode: bool = False, storage_backend: str = "json"):
         self.root = CTk()
         self.root.title(f"CodeCompanion - Learn Python with Your Growing Companion (v{CURRENT_VERSION})")
         # FIXED: Make window geometry consistent with minsize
@@ -2977,17 +6582,138 @@ class CodeCompanionApp:
         except:
             pass  # Icon optional
 
-        self.storage = StorageManager()
-        self.user = self.storage.load_user()
+        # Each learner on the machine has a profile; one is open at a time, and locked while it is
+        self.storage_backend = storage_backend
+        self.profiles = ProfileRegistry()
+        self.profile_id: Optional[str] = None
+        self.profile_lock: Optional[ProfileLock] = None
+        self.storage: Optional[StorageManager] = None
+        # Handlers mark the profile dirty; it is written off the Tk thread, and always before exit
+        self.profile_writer: Optional[ProfileWriter] = None
+        self.user: Optional[User] = None
+        # Deduplicated rolling backups of the open profile, every hour and on close
+        self.backups: Optional[BackupStore] = None
+        self._update_check_scheduled = False
+        self._backup_scheduled = False
+        atexit.register(self._flush_profile)
+        self._report_callback_exception = self.root.report_callback_exception
+        self.root.report_callback_exception = self._on_callback_exception
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.unlocks = None
+        self.recommender = None
+        self.lesson_view = None
+        self.learning_paths_frame = None
+        self._search_query = ""  # Latest text in the search box
+
+        if dev_mode:
+            # Authoring mode: lesson pack edits show up without restarting
+            ContentEngine.enable_dev_mode()
+            self.root.after(CONTENT_POLL_INTERVAL_MS, self._poll_content_changes)
+
+        # A shared machine starts at the profile picker; a single learner goes straight in
+        profiles = self.profiles.list()
+        if len(profiles) == 1:
+            self._open_profile(profiles[0]['id'])
+        elif profiles:
+            self._show_profile_picker()
+        else:
+            self._show_onboarding()
 
-        if self.user is None:
+    def _open_profile(self, profile_id: str, new_user: Optional[User] = None) -> bool:
+        """Lock and load a profile (or start it with new_user) and show the main window"""
+        lock = self.profiles.lock(profile_id)
+        if lock is None:
+            messagebox.showerror("Profile In Use",
+                                 "This learner's progress is open in another CodeCompanion window. "
+                                 "Close it there first, or pick another learner.")
+            if self.profile_id is None:
+                self._show_profile_picker()
+            return False
+        self._close_profile()
+        self.profile_id, self.profile_lock = profile_id, lock
+        data_dir = self.profiles.data_dir_for(profile_id)
+        self.storage = open_storage(self.storage_backend, data_dir)
+        self.profile_writer = ProfileWriter(self.storage)
+        self.backups = BackupStore(os.path.join(data_dir, "backups"))
+        self.user = new_user or self.storage.load_user()
+        if self.user is None:  # Listed, but nothing this storage backend can load
+            self._close_profile()
             self._show_onboarding()
-        else:
-            self._create_ui()
+            return False
+        if new_user is not None:
+            self.profile_writer.mark_dirty(self.user)
+        self.profiles.update(profile_id, self.user)
+
+        self._init_progress_state()
+        self.root.geometry("1400x900")
+        self._create_ui()
+        if new_user is None:
             self._check_daily_streak()
-            # Check for updates AFTER UI is ready (non-blocking, in background)
-            if getattr(self.user, 'auto_check_updates', True):
-                self.root.after(3000, self._background_update_check)
+        # Check for updates AFTER UI is ready (non-blocking, in background)
+        if not self._update_check_scheduled and getattr(self.user, 'auto_check_updates', True):
+            self._update_check_scheduled = True
+            self.root.after(3000, self._background_update_check)
+        if not self._backup_scheduled:
+            self._backup_scheduled = True
+            self.root.after(BackupStore.INTERVAL_SECONDS * 1000, self._backup_profile)
+        return True
+
+    def _close_profile(self):
+        """Save and unlock the open profile, if any"""
+        if self.profile_writer is not None:
+            self.profile_writer.close(self.user)
+            if self.user is not None:
+                self.profiles.update(self.profile_id, self.user)
+                self.backups.snapshot(self.user.to_dict())
+        if self.profile_lock is not None:
+            self.profile_lock.release()
+        self.profile_id = self.profile_lock = self.storage = self.profile_writer = self.user = None
+        self.backups = None
+
+    def _backup_profile(self):
+        """Hourly: snapshot the open profile here, chunk and store it on a worker thread"""
+        if self.backups is not None and self.user is not None:
+            threading.Thread(target=self.backups.snapshot, args=(self.user.to_dict(),), daemon=True).start()
+        self.root.after(BackupStore.INTERVAL_SECONDS * 1000, self._backup_profile)
+
+    def _flush_profile(self):
+        if self.profile_writer is not None:
+            self.profile_writer.flush()
+
+    def _switch_profile(self):
+        self._close_profile()
+        self._show_profile_picker()
+
+    def _show_profile_picker(self):
+        """Choose a learner; drawn from the profile index alone"""
+        colors = get_colors()
+        for widget in self.root.winfo_children():
+            widget.destroy()
+        self.root.geometry("500x650")
+        frame = CTkFrame(self.root, corner_radius=20)
+        frame.pack(pady=20, padx=20, fill='both', expand=True)
+
+        CTkLabel(frame, text="Who's learning today?",
+                 font=ctk.CTkFont(size=28, weight="bold")).pack(pady=20)
+
+        profiles_frame = CTkScrollableFrame(frame, fg_color="transparent")
+        profiles_frame.pack(fill='both', expand=True, padx=20, pady=10)
+        for summary in self.profiles.list():
+            details = [f"Level {summary['level']}" if 'level' in summary else None,
+                       summary.get('companion_type', '').title() or None,
+                       f"last active {summary['last_active']}" if summary.get('last_active') else None]
+            name = summary.get('name') or ('Learner' if summary['id'] == 'default' else summary['id'])
+            CTkButton(profiles_frame, text=f"{name}\n"
+                                           f"{' · '.join(part for part in details if part)}",
+                      corner_radius=10, height=60, anchor='w',
+                      fg_color=colors['bg_dark'], hover_color=colors['primary'],
+                      font=ctk.CTkFont(size=13),
+                      command=lambda profile_id=summary['id']: self._open_profile(profile_id)).pack(fill='x', pady=5)
+
+        CTkButton(frame, text="➕ New Learner", corner_radius=10, height=40,
+                  font=ctk.CTkFont(size=14, weight="bold"),
+                  fg_color=colors['success'],
+                  command=self._show_onboarding).pack(pady=20)
 
     def _background_update_check(self):
         """Check for updates in background without blocking UI"""
@@ -3250,17 +6976,44 @@ Or click "Open File Location" below to see the file.
         """Show update check error (only for debugging)"""
         print(f"Update check failed: {error}")  # Just log it
 
+    def _poll_content_changes(self):
+        """Dev mode: apply edited lesson pack files and refresh the affected views in place"""
+        changed = ContentEngine.poll_content_changes()
+        if changed and self.user is not None:
+            self._init_progress_state()
+
+            if self.learning_paths_frame is not None and self.learning_paths_frame.winfo_exists():
+                for widget in self.learning_paths_frame.winfo_children():
+                    widget.destroy()
+                self._show_learning_paths_in(self.learning_paths_frame)
+
+            if (self.lesson_view is not None and self.lesson_view.winfo_exists()
+                    and self.lesson_view.lesson.id in changed):
+                lesson = ContentEngine.get_lesson_by_id(self.lesson_view.lesson.id)
+                if lesson is not None:
+                    self.lesson_view.reload(lesson)
+                    self.lesson_title_label.configure(text=lesson.title)
+
+        self.root.after(CONTENT_POLL_INTERVAL_MS, self._poll_content_changes)
+
+    def _init_progress_state(self):
+        """Build per-learner derived state after a user is loaded, created or imported"""
+        self.unlocks = ContentEngine.get_unlock_tracker(self.user.completed_lessons)
+        self.recommender = ContentEngine.get_recommender(self.user, self.unlocks)
+
     def _check_daily_streak(self):
         """Check and update streak on app startup"""
         streak_increased, message = GamificationSystem.update_streak(self.user)
         if message and "already checked in" not in message:
             messagebox.showinfo("Daily Check-in", message)
-            self.storage.save_user(self.user)
+            self.profile_writer.mark_dirty(self.user)
             self._refresh_current_view()
 
     def _show_onboarding(self):
         """Initial setup for new users"""
         colors = get_colors()
+        for widget in self.root.winfo_children():
+            widget.destroy()
         self.root.geometry("500x650")
         frame = CTkFrame(self.root, corner_radius=20)
         frame.pack(pady=20, padx=20, fill='both', expand=True)
@@ -3326,12 +7079,9 @@ Or click "Open File Location" below to see the file.
             return
 
         companion_type = self.selected_companion.get()
-        self.user = User(username=username, companion_type=companion_type)
-        self.storage.save_user(self.user)
-
-        # FIXED: Consistent window size
-        self.root.geometry("1400x900")
-        self._create_ui()
+        if not self._open_profile(self.profiles.create(username),
+                                  new_user=User(username=username, companion_type=companion_type)):
+            return
 
         messagebox.showinfo("Welcome!",
                             f"Welcome, {username}! Your {companion_type} companion awaits. Let's start learning Python!")
@@ -3366,7 +7116,7 @@ Or click "Open File Location" below to see the file.
             ("🔥", f"{self.user.streak_days}d"),
             ("⭐", f"Lv.{self.user.level}"),
             ("💎", f"{self.user.xp}"),
-            ("📚", f"{len(self.user.completed_lessons)}/{len(ContentEngine.get_all_lessons())}"),
+            ("📚", f"{len(self.user.completed_lessons)}/{ContentEngine.get_lesson_count()}"),
         ]
 
         for icon, value in compact_stats:
@@ -3403,6 +7153,14 @@ Or click "Open File Location" below to see the file.
                                 command=self._show_settings)
         settings_btn.pack(side='right', padx=5)
 
+        # Switch learner (shared machines)
+        CTkButton(right_section, text="👥", corner_radius=20,
+                  width=40, height=40,
+                  fg_color=colors['bg_medium'],
+                  hover_color=colors['primary'],
+                  font=ctk.CTkFont(size=18),
+                  command=self._switch_profile).pack(side='right', padx=5)
+
         # ===== MAIN CONTENT AREA =====
         main_container = CTkFrame(self.root, fg_color="transparent")
         main_container.pack(fill='both', expand=True, padx=20, pady=10)
@@ -3578,10 +7336,85 @@ Or click "Open File Location" below to see the file.
         progress.set(min(self.user.today_xp / self.user.daily_goal_xp, 1.0))
         progress.pack(fill='x', pady=(8, 0))
 
+        # Search - results update as you type
+        search_frame = CTkFrame(parent, fg_color="transparent")
+        search_frame.pack(fill='x', pady=(20, 0))
+
+        search_entry = CTkEntry(search_frame, height=40, corner_radius=15,
+                                placeholder_text="🔍 Search lessons, quizzes and drills...",
+                                font=ctk.CTkFont(family=DEFAULT_FONT, size=13))
+        search_entry.pack(fill='x')
+
+        results_frame = CTkFrame(search_frame, fg_color=colors['bg_dark'], corner_radius=15)
+        search_entry.bind('<KeyRelease>',
+                          lambda e: self._update_search_results(search_entry.get(), results_frame))
+
+        # Warm the search index off the UI thread so the first keystroke doesn't build it
+        ContentEngine.warm_search_index()
+
+        # Recommended next lessons
+        picks = self.recommender.top(3)
+        self.root.after_idle(self._prefetch_likely_lessons)
+        if picks:
+            recommend_frame = CTkFrame(parent, fg_color=colors['bg_dark'], corner_radius=15)
+            recommend_frame.pack(fill='x', pady=(20, 0))
+
+            CTkLabel(recommend_frame, text="⭐ Recommended Next",
+                     font=ctk.CTkFont(family=DEFAULT_FONT, size=16, weight="bold")).pack(anchor='w', padx=20, pady=(15, 5))
+
+            picks_row = CTkFrame(recommend_frame, fg_color="transparent")
+            picks_row.pack(fill='x', padx=10, pady=(0, 15))
+            for column, summary in enumerate(picks):
+                picks_row.grid_columnconfigure(column, weight=1, uniform="pick")
+                CTkButton(picks_row,
+                          text=f"▶ {summary.title}\n{self.recommender.reason(summary)}",
+                          corner_radius=10, height=56,
+                          fg_color=colors['primary'] if column == 0 else colors['bg_medium'],
+                          hover_color=colors['primary'],
+                          font=ctk.CTkFont(family=DEFAULT_FONT, size=12),
+                          command=lambda s=summary: self._start_lesson(s)).grid(row=0, column=column, padx=10,
+                                                                               sticky="ew")
+
+        # Practice session - a mix of items from every lesson on one concept
+        practice_frame = CTkFrame(parent, fg_color=colors['bg_dark'], corner_radius=15)
+        practice_frame.pack(fill='x', pady=(20, 0))
+
+        practice_content = CTkFrame(practice_frame, fg_color="transparent")
+        practice_content.pack(fill='x', padx=20, pady=15)
+
+        CTkLabel(practice_content, text="🎯 Practice Session",
+                 font=ctk.CTkFont(family=DEFAULT_FONT, size=16, weight="bold")).pack(side='left')
+
+        concept_names = {"All concepts": None}
+        for concept in ContentEngine.get_practice_concepts():
+            concept_names[concept.replace('_', ' ').title()] = concept
+        difficulty_names = {"Easy": 1, "Up to Medium": 2, "Up to Hard": 3}
+
+        concept_menu = CTkOptionMenu(practice_content, values=list(concept_names), width=170)
+        concept_menu.pack(side='left', padx=(20, 10))
+        difficulty_menu = CTkOptionMenu(practice_content, values=list(difficulty_names), width=140)
+        difficulty_menu.set("Up to Medium")
+        difficulty_menu.pack(side='left', padx=10)
+
+        CTkButton(practice_content, text=f"Start {PRACTICE_SESSION_SIZE} Items", corner_radius=10, height=36,
+                  fg_color=colors['primary'],
+                  font=ctk.CTkFont(family=DEFAULT_FONT, size=13, weight="bold"),
+                  command=lambda: self._start_practice_session(
+                      concept_names[concept_menu.get()], difficulty_names[difficulty_menu.get()])
+                  ).pack(side='right')
+
         # Section: Learning Paths
         CTkLabel(parent, text="📖 Your Learning Journey",
                  font=ctk.CTkFont(family=DEFAULT_FONT, size=22, weight="bold")).pack(anchor='w', pady=(20, 15))
 
+        self.learning_paths_frame = CTkFrame(parent, fg_color="transparent")
+        self.learning_paths_frame.pack(fill='x')
+        self._show_learning_paths_in(self.learning_paths_frame)
+
+    def _show_learning_paths_in(self, parent):
+        """Lesson cards grouped by skill path"""
+        colors = get_colors()
+
         # Group lessons by skill path
         skill_paths = ContentEngine.get_skill_paths()
         
@@ -3627,13 +7460,59 @@ Or click "Open File Location" below to see the file.
                     col = 0
                     row += 1
 
-    def _create_lesson_card(self, parent, lesson: Lesson):
+    def _update_search_results(self, query: str, results_frame):
+        """Render search matches below the search box"""
+        colors = get_colors()
+
+        for widget in results_frame.winfo_children():
+            widget.destroy()
+
+        if not query.strip():
+            results_frame.pack_forget()
+            return
+        results_frame.pack(fill='x', pady=(8, 0))
+
+        self._search_query = query
+        results = ContentEngine.search_lessons(query, limit=8)
+        if results is None:
+            CTkLabel(results_frame, text="Preparing search...",
+                     font=ctk.CTkFont(family=DEFAULT_FONT, size=12),
+                     text_color=colors['text_secondary']).pack(anchor='w', padx=15, pady=10)
+            # Try again shortly, unless the query has changed or the view is gone by then
+            self.root.after(200, lambda: self._search_query == query and results_frame.winfo_exists()
+                            and self._update_search_results(query, results_frame))
+            return
+        if not results:
+            CTkLabel(results_frame, text="No lessons match your search.",
+                     font=ctk.CTkFont(family=DEFAULT_FONT, size=12),
+                     text_color=colors['text_secondary']).pack(anchor='w', padx=15, pady=10)
+            return
+
+        kind_labels = {
+            'lesson': "Lesson", 'exercise': "Exercise", 'mcq': "Quiz question",
+            'multi_answer': "Quiz question", 'drill': "Output drill", 'bug_fix': "Bug fix",
+        }
+        for summary, kind in results:
+            completed = summary.id in self.user.completed_lessons
+            locked = not self.unlocks.is_unlocked(summary.id) and not completed
+            icon = "✓" if completed else ("🔒" if locked else "▶")
+
+            CTkButton(results_frame,
+                      text=f"{icon}  {summary.title}  ·  {kind_labels.get(kind, kind)}",
+                      anchor='w', corner_radius=10, height=34,
+                      fg_color=colors['bg_medium'],
+                      hover_color=colors['primary'],
+                      text_color=colors['text_secondary'] if locked else colors['text_primary'],
+                      state="disabled" if locked else "normal",
+                      font=ctk.CTkFont(family=DEFAULT_FONT, size=12),
+                      command=lambda s=summary: self._start_lesson(s)).pack(fill='x', padx=10, pady=3)
+
+    def _create_lesson_card(self, parent, lesson: LessonSummary):
         """Create a beautiful lesson card - TRULY clickable!"""
         colors = get_colors()
 
         completed = lesson.id in self.user.completed_lessons
-        prerequisites_satisfied = all(pr in self.user.completed_lessons for pr in lesson.prerequisites)
-        locked = not prerequisites_satisfied and not completed
+        locked = not self.unlocks.is_unlocked(lesson.id) and not completed
 
         # Card styling based on status
         if completed:
@@ -3715,11 +7594,7 @@ Or click "Open File Location" below to see the file.
         make_label_clickable(xp_label)
 
         # Item count
-        total_items = (len(lesson.exercises) + len(lesson.mcq_questions) + 
-                      len(lesson.multi_answer_questions) + len(lesson.output_drills) +
-                      len(lesson.bug_fix_drills))
-        
-        challenges_label = CTkLabel(content, text=f"📝 {total_items} challenges",
+        challenges_label = CTkLabel(content, text=f"📝 {lesson.item_count} challenges",
                                     font=ctk.CTkFont(family=DEFAULT_FONT, size=11),
                                     text_color=text_color)
         challenges_label.pack(anchor='w')
@@ -3927,6 +7802,35 @@ Or click "Open File Location" below to see the file.
                      font=ctk.CTkFont(family=DEFAULT_FONT, size=11),
                      text_color=colors['text_secondary']).pack(pady=(5, 0))
 
+        # This month - from the storage's dated history
+        month = self.storage.monthly_summary(datetime.now().date().replace(day=1).isoformat())
+        if month is not None:
+            CTkLabel(parent, text="📅 This Month",
+                     font=ctk.CTkFont(family=DEFAULT_FONT, size=22, weight="bold")).pack(anchor='w', pady=(30, 15))
+
+            month_frame = CTkFrame(parent, corner_radius=15, fg_color=colors['bg_dark'])
+            month_frame.pack(fill='x')
+
+            CTkLabel(month_frame, text=f"{month['xp']} XP earned over {month['active_days']} active days",
+                     font=ctk.CTkFont(family=DEFAULT_FONT, size=14, weight="bold")).pack(anchor='w', padx=20, pady=(15, 5))
+            CTkLabel(month_frame, text=f"{month['exercises']} exercises · {month['drills']} drills · "
+                                       f"{month['hints']} hints used · best week {month['best_week_xp']} XP",
+                     font=ctk.CTkFont(family=DEFAULT_FONT, size=12),
+                     text_color=colors['text_secondary']).pack(anchor='w', padx=20, pady=(0, 5))
+
+            for concept, count in month['by_concept'].items():
+                concept_row = CTkFrame(month_frame, fg_color=colors['bg_medium'], corner_radius=8)
+                concept_row.pack(fill='x', padx=20, pady=2)
+                CTkLabel(concept_row, text=concept.replace('_', ' ').title(),
+                         font=ctk.CTkFont(family=DEFAULT_FONT, size=12)).pack(side='left', padx=10, pady=6)
+                CTkLabel(concept_row, text=f"{count} completed",
+                         font=ctk.CTkFont(family=DEFAULT_FONT, size=12, weight="bold")).pack(side='right', padx=10, pady=6)
+            if not month['by_concept'] and not month['exercises'] and not month['drills']:
+                CTkLabel(month_frame, text="No exercises or drills completed yet this month.",
+                         font=ctk.CTkFont(family=DEFAULT_FONT, size=12),
+                         text_color=colors['text_secondary']).pack(anchor='w', padx=20, pady=(0, 5))
+            CTkFrame(month_frame, fg_color="transparent", height=10).pack()
+
         # Achievements section
         if self.user.achievements:
             CTkLabel(parent, text="🏆 Achievements",
@@ -3998,11 +7902,56 @@ Or click "Open File Location" below to see the file.
 
     def _on_daily_challenge_complete(self):
         """Handle daily challenge completion"""
-        self.storage.save_user(self.user)
+        self.profile_writer.mark_dirty(self.user)
         self._switch_tab("daily")
 
-    def _start_lesson(self, lesson: Lesson):
+    def _start_lesson(self, summary: LessonSummary):
         """Start a lesson - full screen takeover"""
+        # The lessons grid only holds manifest entries; load the full lesson now
+        lesson = ContentEngine.get_lesson_by_id(summary.id)
+        if lesson is None:
+            messagebox.showerror("Lesson Unavailable", f"Couldn't load the lesson '{summary.title}'.")
+            return
+        self._show_lesson_screen(lesson, on_complete=lambda l=lesson: self._on_lesson_complete(l))
+        self.root.after_idle(lambda: self._prefetch_likely_lessons(lesson.id))
+
+    def _prefetch_likely_lessons(self, current_id: Optional[str] = None):
+        """Prepare the lessons likely to be opened next: those finishing current_id unlocks, then the top picks"""
+        likely = []
+        if current_id is not None:
+            graph = self.unlocks.graph
+            likely = [dependent for dependent in graph.dependents.get(current_id, [])
+                      if all(prereq == current_id or prereq in self.user.completed_lessons
+                             for prereq in graph.prerequisites[dependent])]
+        likely += [summary.id for summary in self.recommender.top(3)
+                   if summary.id != current_id and summary.id not in likely]
+        ContentEngine.prefetch_lessons(likely)
+
+    def _start_practice_session(self, concept: Optional[str], max_difficulty: int):
+        """Start a cross-lesson practice session, skipping items already completed"""
+        session = ContentEngine.build_practice_session(concept, PRACTICE_SESSION_SIZE, max_difficulty,
+                                                       exclude=self.user.completed_drills.keys() |
+                                                       self.user.completed_exercises.keys())
+        if not session.items:
+            messagebox.showinfo("All Done!", "You've completed every practice item that matches. "
+                                             "Try another concept or a higher difficulty.")
+            return
+        self._show_lesson_screen(session.as_lesson(), on_complete=lambda: self._on_practice_complete(session),
+                                 items=session.items)
+
+    def _on_practice_complete(self, session: PracticeSession):
+        """Mark the session's items done so later sessions draw fresh ones"""
+        for item_type, item in session.items:
+            # LessonView already counts output drills and solved exercises
+            if item_type == 'bug_fix':
+                self.user.completed_drills[item.id] = self.user.completed_drills.get(item.id, 0) + 1
+            elif item_type in ('mcq', 'multi_answer'):
+                self.user.completed_exercises[item.id] = self.user.completed_exercises.get(item.id, 0) + 1
+        self.profile_writer.mark_dirty(self.user)
+        self._create_ui()
+
+    def _show_lesson_screen(self, lesson: Lesson, on_complete, items: Optional[List[Tuple[str, Any]]] = None):
+        """Full screen takeover showing a LessonView"""
         # Clear everything and show lesson
         for widget in self.root.winfo_children():
             widget.destroy()
@@ -4019,44 +7968,51 @@ Or click "Open File Location" below to see the file.
                   font=ctk.CTkFont(family=DEFAULT_FONT, size=13),
                   command=lambda: self._on_lesson_exit(lesson)).pack(side='left', padx=20, pady=10)
 
-        CTkLabel(top_bar, text=lesson.title,
-                 font=ctk.CTkFont(family=DEFAULT_FONT, size=18, weight="bold")).pack(side='left', padx=20)
+        self.lesson_title_label = CTkLabel(top_bar, text=lesson.title,
+                                           font=ctk.CTkFont(family=DEFAULT_FONT, size=18, weight="bold"))
+        self.lesson_title_label.pack(side='left', padx=20)
 
         # Lesson content
         lesson_container = CTkFrame(self.root, fg_color="transparent")
         lesson_container.pack(fill='both', expand=True, padx=20, pady=10)
 
-        lesson_view = LessonView(lesson_container, self.user, lesson,
-                                 on_complete=lambda l=lesson: self._on_lesson_complete(l),
-                                 on_back=lambda: self._on_lesson_exit(lesson))
-        lesson_view.pack(fill='both', expand=True)
+        self.lesson_view = LessonView(lesson_container, self.user, lesson,
+                                      on_complete=on_complete,
+                                      on_back=lambda: self._on_lesson_exit(lesson),
+                                      items=items, on_item_result=self._on_item_result)
+        self.lesson_view.pack(fill='both', expand=True)
 
     def _on_lesson_exit(self, lesson: Lesson):
         """Handle exiting a lesson"""
-        self.storage.save_user(self.user)
+        self.profile_writer.mark_dirty(self.user)
         self._create_ui()
 
+    def _on_item_result(self, item, first_try: bool):
+        """Feed each practice result into the mistake tracker and the recommendations"""
+        self.recommender.record_result(item.concept, first_try)
+
     def _on_lesson_complete(self, lesson: Lesson):
         """Handle lesson completion"""
         self.user.completed_lessons.add(lesson.id)
-        self.storage.save_user(self.user)
+        self.recommender.complete(lesson.id, self.unlocks.complete(lesson.id))
+        self.profile_writer.mark_dirty(self.user)
 
         # Check achievements
         new_achievements = GamificationSystem.check_achievements(self.user)
         if new_achievements:
             messagebox.showinfo("Achievements Unlocked!",
                                 f"🏆 {', '.join(new_achievements)}")
-            self.storage.save_user(self.user)
+            self.profile_writer.mark_dirty(self.user)
 
         # Refresh UI
         self._create_ui()
 
-        # Show next available lesson or go back
-        available = ContentEngine.get_available_lessons(self.user.completed_lessons)
-        if available:
+        # Offer the top recommended lesson or go back
+        picks = self.recommender.top(1)
+        if picks:
             if messagebox.askyesno("Lesson Complete! 🎉",
-                                   "Great job! Continue to next lesson?"):
-                self._start_lesson(available[0])
+                                   f"Great job! Continue with {picks[0].title}?"):
+                self._start_lesson(picks[0])
         else:
             messagebox.showinfo("Amazing!", "You've completed all available lessons! 🏆")
 
@@ -4203,7 +8159,7 @@ Or click "Open File Location" below to see the file.
     def _save_font(self, new_size):
         try:
             self.user.font_size = int(new_size)
-            self.storage.save_user(self.user)
+            self.profile_writer.mark_dirty(self.user)
             messagebox.showinfo("Saved", "Font size updated! Restart the app to see changes.")
         except ValueError:
             messagebox.showerror("Error", "Please enter a valid number!")
@@ -4211,7 +8167,7 @@ Or click "Open File Location" below to see the file.
     def _save_goal(self, new_goal):
         try:
             self.user.daily_goal_xp = int(new_goal)
-            self.storage.save_user(self.user)
+            self.profile_writer.mark_dirty(self.user)
             messagebox.showinfo("Saved", "Daily goal updated!")
             self._show_dashboard()
         except ValueError:
@@ -4264,7 +8220,7 @@ Or click "Open File Location" below to see the file.
                 self.user.companion_type = new_type
                 self.user.companion_stage = 0
                 self.user.companion_vitality = 100
-                self.storage.save_user(self.user)
+                self.profile_writer.mark_dirty(self.user)
                 messagebox.showinfo("Success", f"Switched to {new_type.title()} companion!")
                 dialog.destroy()
                 self._create_ui()  # Refresh UI
@@ -4274,37 +8230,91 @@ Or click "Open File Location" below to see the file.
         CTkButton(dialog, text="Confirm Switch", corner_radius=10, height=40,
                   fg_color=colors['warning'], command=confirm_switch).pack(pady=20)
 
+    def _run_with_progress(self, title: str, work, on_done):
+        """
+        Run work(progress) on a worker thread behind a modal progress dialog, then call
+        on_done(result) on the Tk thread. The worker only stores its progress; the dialog polls it.
+        """
+        colors = get_colors()
+
+        dialog = CTkToplevel(self.root)
+        dialog.title(title)
+        dialog.geometry("400x140")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        dialog.protocol("WM_DELETE_WINDOW", lambda: None)  # Runs to completion
+
+        CTkLabel(dialog, text=title,
+                 font=ctk.CTkFont(family=DEFAULT_FONT, size=16, weight="bold")).pack(pady=(25, 15))
+        progress_bar = CTkProgressBar(dialog, corner_radius=10, height=14,
+                                      progress_color=colors['primary'])
+        progress_bar.set(0)
+        progress_bar.pack(fill='x', padx=30)
+
+        state = {'progress': 0.0}
+        result = []
+
+        def report(fraction):
+            state['progress'] = fraction
+
+        thread = threading.Thread(target=lambda: result.append(work(report)), daemon=True)
+        thread.start()
+
+        def poll():
+            progress_bar.set(min(state['progress'], 1.0))
+            if thread.is_alive():
+                self.root.after(100, poll)
+                return
+            dialog.grab_release()
+            dialog.destroy()
+            on_done(result[0] if result else None)
+
+        self.root.after(100, poll)
+
     def _export_data(self):
         """Export user progress to file"""
         file_path = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
-            initialfile=f"codecompanion_backup_{self.user.username}.json"
+            defaultextension=".json.gz",
+            filetypes=[("Compressed backup", "*.json.gz"), ("JSON files", "*.json"), ("All files", "*.*")],
+            initialfile=f"codecompanion_backup_{self.user.username}.json.gz"
         )
 
         if file_path:
-            if self.storage.export_user_data(file_path, self.user):
-                messagebox.showinfo("Success", "Progress exported successfully!")
-            else:
-                messagebox.showerror("Error", "Failed to export progress.")
+            data = self.user.to_dict()  # Snapshot now; the file is written in the background
+
+            def exported(ok):
+                if ok:
+                    messagebox.showinfo("Success", "Progress exported successfully!")
+                else:
+                    messagebox.showerror("Error", "Failed to export progress.")
+
+            self._run_with_progress("Exporting progress...",
+                                    lambda progress: self.storage.export_user_data(file_path, data, progress),
+                                    exported)
 
     def _import_data(self):
         """Import user progress from file"""
         file_path = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("Backups", "*.json.gz *.json"), ("All files", "*.*")]
         )
 
         if file_path:
             if messagebox.askyesno("Confirm Import",
                                    "This will overwrite your current progress. Continue?"):
-                imported_user = self.storage.import_user_data(file_path)
-                if imported_user:
-                    self.user = imported_user
-                    self.storage.save_user(self.user)
-                    messagebox.showinfo("Success", "Progress imported successfully!")
-                    self._create_ui()  # Refresh UI
-                else:
-                    messagebox.showerror("Error", "Failed to import progress.")
+                def imported(imported_user):
+                    if imported_user:
+                        self.user = imported_user
+                        self.profile_writer.mark_dirty(self.user)
+                        self._init_progress_state()
+                        messagebox.showinfo("Success", "Progress imported successfully!")
+                        self._create_ui()  # Refresh UI
+                    else:
+                        messagebox.showerror("Error", "Failed to import progress. The file is incomplete "
+                                                      "or damaged; your current progress was not changed.")
+
+                self._run_with_progress("Importing progress...",
+                                        lambda progress: self.storage.import_user_data(file_path, progress),
+                                        imported)
 
     def _reset_progress(self):
         """Reset all user progress"""
@@ -4313,19 +8323,491 @@ Or click "Open File Location" below to see the file.
             if messagebox.askyesno("Final Confirmation",
                                    "This action cannot be undone. Continue?"):
                 try:
-                    os.remove(self.storage.user_file)
+                    self.profile_writer.discard()
+                    self.storage.delete_user()
+                    self.user = None
+                    profile_id = self.profile_id
+                    self._close_profile()
+                    self.profiles.remove(profile_id)
                     messagebox.showinfo("Reset Complete", "Progress has been reset.")
                     self.root.destroy()
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to reset: {e}")
 
+    def _on_callback_exception(self, exc_type, exc_value, tb):
+        """A handler raised: get the progress made so far onto disk, then report it as Tk would"""
+        self._flush_profile()
+        self._report_callback_exception(exc_type, exc_value, tb)
+
+    def _on_close(self):
+        self._close_profile()
+        self.root.destroy()
+
     def run(self):
         """Start the application"""
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self._close_profile()
+
+
+# ============================================================================
+# SECTION 7: COMMAND LINE TOOLS
+# ============================================================================
+
+class CatalogGenerator:
+    """
+    Deterministic synthetic catalogs for scaling benchmarks: the same seed and size always give the same
+    lessons. Shapes are drawn from the built-in lessons - item mixes, prose lengths and vocabulary - and
+    item code and answers are reused from them, so generated packs also pass `validate`. Skill paths hold
+    roughly PATH_LENGTH lessons; prerequisites chain each path and add occasional links to earlier paths.
+    """
+
+    PATH_LENGTH = 40
+    CONCEPTS_PER_PATH = 3
+    CROSS_PATH_LINK_RATE = 0.3
+    PROSE_FIELDS = ('explanation',)
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        templates = ContentEngine._build_builtin_lessons()
+        self.lesson_texts = [lesson.concept for lesson in templates]
+        self.titles = [lesson.title for lesson in templates]
+        self.xp_rewards = [lesson.xp_reward for lesson in templates]
+        self.mixes = [[len(lesson.examples)] + [len(getattr(lesson, attr)) for _, attr in LESSON_ITEM_KINDS]
+                      for lesson in templates]
+        self.examples = [asdict(example) for lesson in templates for example in lesson.examples]
+        self.items = {attr: [asdict(item) for lesson in templates for item in getattr(lesson, attr)]
+                      for _, attr in LESSON_ITEM_KINDS}
+        self.skill_paths = list(dict.fromkeys(lesson.skill_path for lesson in templates))
+        self.concepts = sorted({item.concept for lesson in templates for _, item in iter_lesson_items(lesson)})
+        # Kept with repeats, so drawing from it follows the word frequencies of real lesson text
+        self.words = [word for lesson in templates for word in re.findall(r"[a-z]{3,}", lesson.concept.lower())]
+
+    def lessons(self, count: int) -> Iterable[Lesson]:
+        """Yield count lessons one at a time, in an order where prerequisites always come first"""
+        rng = random.Random(self.seed)
+        path_count = max(1, count // self.PATH_LENGTH)
+        paths = [self._path_name(rng, index) for index in range(path_count)]
+        path_concepts = [self._path_concepts(index) for index in range(path_count)]
+        path_lessons: List[List[str]] = [[] for _ in range(path_count)]
+        lesson_ids: List[str] = []
+
+        for index in range(count):
+            path = rng.randrange(path_count)
+            position = len(path_lessons[path])
+            lesson_id = f"{paths[path]}_{position + 1:03d}"
+            prerequisites = [path_lessons[path][-1]] if position else []
+            if lesson_ids and rng.random() < self.CROSS_PATH_LINK_RATE:
+                other = lesson_ids[rng.randrange(len(lesson_ids))]
+                if other not in prerequisites:
+                    prerequisites.append(other)
+            difficulty = min(3, 1 + position // (self.PATH_LENGTH // 3) + (rng.random() < 0.2))
+            yield self._lesson(rng, lesson_id, paths[path], path_concepts[path], prerequisites, difficulty)
+            path_lessons[path].append(lesson_id)
+            lesson_ids.append(lesson_id)
+
+    def _path_name(self, rng: random.Random, index: int) -> str:
+        if index < len(self.skill_paths):
+            return self.skill_paths[index]
+        return f"{rng.choice(self.words)}_{index}"
+
+    def _path_concepts(self, index: int) -> List[str]:
+        # The first paths reuse the real concept tags; later ones add their own so the item bank keeps growing
+        concepts = [self.concepts[(index * self.CONCEPTS_PER_PATH + k) % len(self.concepts)]
+                    for k in range(self.CONCEPTS_PER_PATH)]
+        if index * self.CONCEPTS_PER_PATH >= len(self.concepts):
+            concepts = [f"{concept}_{index}" for concept in concepts]
+        return concepts
+
+    def _prose(self, rng: random.Random, like: str) -> str:
+        """Filler text about as long as the sample it stands in for"""
+        target = int(len(like) * rng.uniform(0.6, 1.4))
+        sentences, length = [], 0
+        while length < target:
+            words = [rng.choice(self.words) for _ in range(rng.randint(5, 14))]
+            sentence = " ".join(words).capitalize() + "."
+            sentences.append(sentence)
+            length += len(sentence) + 1
+        return " ".join(sentences)
+
+    def _lesson(self, rng: random.Random, lesson_id: str, skill_path: str, concepts: List[str],
+                prerequisites: List[str], difficulty: int) -> Lesson:
+        mix = [max(0, count + rng.randint(-1, 1)) for count in rng.choice(self.mixes)]
+        if not any(mix[1:]):
+            mix[1] = 1
+        data = {
+            'id': lesson_id,
+            'title': " ".join(rng.choice(self.words) for _ in range(rng.randint(1, 3))).title(),
+            'concept': self._prose(rng, rng.choice(self.lesson_texts)),
+            'examples': [dict(example, explanation=self._prose(rng, example['explanation']))
+                         for example in (rng.choice(self.examples) for _ in range(mix[0]))],
+            'prerequisites': prerequisites,
+            'xp_reward': rng.choice(self.xp_rewards),
+            'skill_path': skill_path,
+            'difficulty': difficulty,
+        }
+        for (item_type, attr), item_count in zip(LESSON_ITEM_KINDS, mix[1:]):
+            items = []
+            for number in range(item_count):
+                item = dict(rng.choice(self.items[attr]), id=f"{lesson_id}_{item_type}_{number + 1}",
+                            concept=rng.choice(concepts),
+                            difficulty=max(1, min(3, difficulty + rng.randint(-1, 1))))
+                for name in self.PROSE_FIELDS:
+                    if name in item:
+                        item[name] = self._prose(rng, item[name])
+                items.append(item)
+            data[attr] = items
+        return Lesson.from_dict(data)
+
+
+def cmd_generate_catalog(args) -> int:
+    """Write a deterministic synthetic lesson pack of the requested size"""
+    lessons = CatalogGenerator(args.seed).lessons(args.lessons)
+    title = f"Synthetic {args.lessons} (seed {args.seed})"
+    if args.output.lower().endswith(ZipLessonPack.EXTENSION):
+        ZipLessonPack.write(args.output, lessons, title=title)
+    else:
+        LessonPack.write(args.output, lessons, title=title)
+    print(f"Wrote {args.lessons} synthetic lessons to {args.output}")
+    return 0
+
+
+def cmd_export_pack(args) -> int:
+    """Write the built-in lessons out as an editable lesson pack"""
+    lessons = ContentEngine._build_builtin_lessons()
+    if args.output.lower().endswith(ZipLessonPack.EXTENSION):
+        ZipLessonPack.write(args.output, lessons, title="CodeCompanion Core")
+    else:
+        LessonPack.write(args.output, lessons, title="CodeCompanion Core")
+    print(f"Wrote {len(lessons)} lessons to {args.output}")
+    return 0
+
+
+def cmd_build_snapshot(args) -> int:
+    """Compile the current content sources into the content snapshot"""
+    packs = LessonPack.discover(args.packs)
+    catalog = ContentEngine._load_source_catalog(packs)
+    snapshot_path = os.path.join(args.cache, ContentSnapshot.FILE_NAME)
+    previous = ContentSnapshot.open(snapshot_path)
+    try:
+        count = ContentSnapshot.build(snapshot_path, catalog.iter_lessons(), ContentSnapshot.source_hash(packs),
+                                      previous=previous)
+    finally:
+        if previous is not None:
+            previous.close()
+    print(f"Wrote {count} lessons to {snapshot_path}")
+    return 0
+
+
+def cmd_validate(args) -> int:
+    """Check every lesson (and the daily challenges) and report failures; non-zero exit on failure"""
+    packs = LessonPack.discover(args.packs)
+    if packs:
+        # Load the packs directly so graph errors are reported rather than masked by the built-in fallback
+        try:
+            catalog = ContentCatalog.from_packs(packs)
+        except ValueError as e:
+            print(f"FAIL  catalog: {e}")
+            return 1
+    else:
+        catalog = ContentCatalog.from_lessons(ContentEngine._build_builtin_lessons())
+    lessons = list(catalog.iter_lessons())
+    lessons.append(Lesson(id="daily", title="Daily challenges", concept="", examples=[],
+                          exercises=DailyChallenge.exercises_for_date("validate"),
+                          prerequisites=[], xp_reward=0, skill_path="daily"))
+
+    cache_path = os.path.join(args.cache, ContentValidator.CACHE_FILE)
+    cache = None if args.no_cache else ContentValidator.load_cache(cache_path)
+
+    started = time.perf_counter()
+    results = ContentValidator.validate(lessons, workers=args.workers, cache=cache, timeout=args.timeout)
+    elapsed = time.perf_counter() - started
+
+    for lesson in lessons:
+        summary = catalog.summaries_by_id.get(lesson.id)
+        if summary is not None and summary.content_hash != LessonSummary.from_lesson(lesson).content_hash:
+            results.append(ValidationResult(lesson.id, lesson.id, 'manifest', True,
+                                            "manifest entry is out of date with the lesson file"))
+
+    if cache is not None:
+        try:
+            ContentValidator.save_cache(cache_path, cache)
+        except OSError as e:
+            print(f"Couldn't save validation cache: {e}")
+
+    failures = [r for r in results if not r.passed]
+    for result in results:
+        if not result.passed:
+            print(f"FAIL  {result.lesson_id}/{result.item_id} [{result.check}] {result.message}")
+        elif result.message:
+            print(f"WARN  {result.lesson_id}/{result.item_id} [{result.check}] {result.message}")
+
+    timed = sorted((r for r in results if r.seconds), key=lambda r: r.seconds, reverse=True)
+    if timed:
+        print("\nSlowest checks:")
+        for result in timed if args.verbose else timed[:args.slowest]:
+            print(f"  {result.seconds * 1000:8.2f} ms  {result.lesson_id}/{result.item_id} [{result.check}]")
+
+    cached = sum(1 for r in results if r.cached)
+    print(f"\n{len(results)} checks across {len(lessons)} lessons in {elapsed:.2f}s "
+          f"({cached} unchanged, from cache): {len(failures)} failed")
+    return 1 if failures else 0
+
+
+def _plain_content_loaders():
+    """
+    Loaders building the same content as mutable dataclasses with a per-instance __dict__, list fields
+    and no interning - the layout the content model used to have, kept as the benchmark baseline
+    """
+    import dataclasses
+
+    plain = {}
+    for cls in (CodeExample, MultipleChoiceQuestion, MultiAnswerQuestion, OutputDrill, BugFixDrill,
+                Exercise, Lesson, ItemRef, LessonSummary):
+        fields = []
+        for f in dataclasses.fields(cls):
+            if f.default is dataclasses.MISSING:
+                fields.append((f.name, f.type))
+            elif f.default == ():
+                fields.append((f.name, f.type, dataclasses.field(default_factory=list)))
+            else:
+                fields.append((f.name, f.type, f.default))
+        plain[cls.__name__] = dataclasses.make_dataclass(cls.__name__, fields)
+
+    def load_lesson(data: Dict):
+        data = dict(data)
+        data['examples'] = [plain['CodeExample'](**e) for e in data.get('examples', [])]
+        data['exercises'] = [plain['Exercise'](**dict(e, test_cases=[tuple(tc) for tc in e.get('test_cases', [])]))
+                             for e in data.get('exercises', [])]
+        data['mcq_questions'] = [plain['MultipleChoiceQuestion'](**q) for q in data.get('mcq_questions', [])]
+        data['multi_answer_questions'] = [plain['MultiAnswerQuestion'](**q)
+                                          for q in data.get('multi_answer_questions', [])]
+        data['output_drills'] = [plain['OutputDrill'](**d) for d in data.get('output_drills', [])]
+        data['bug_fix_drills'] = [plain['BugFixDrill'](**d) for d in data.get('bug_fix_drills', [])]
+        return plain['Lesson'](**data)
+
+    def load_summary(data: Dict):
+        items = [plain['ItemRef'](entry[0], entry[1], entry[2], entry[3], data['id'], entry[4])
+                 for entry in data['items']]
+        return plain['LessonSummary'](id=data['id'], title=data['title'], skill_path=data['skill_path'],
+                                      prerequisites=list(data['prerequisites']), xp_reward=data['xp_reward'],
+                                      difficulty=data['difficulty'], items=items, file=data['file'],
+                                      content_hash=data['hash'])
+
+    return load_lesson, load_summary
+
+
+def _retained_bytes(loader, texts: List[str]) -> int:
+    """Memory still allocated after parsing and loading every JSON text"""
+    import gc
+    import tracemalloc
+
+    gc.collect()
+    tracemalloc.start()
+    loaded = [loader(json.loads(text)) for text in texts]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+    return retained
+
+
+def cmd_benchmark_memory(args) -> int:
+    """Compare the memory a synthetic catalog takes as compact records versus plain dataclasses"""
+    lessons = [lesson.to_dict() for lesson in CatalogGenerator(args.seed).lessons(args.lessons)]
+    lesson_texts = [json.dumps(data) for data in lessons]
+    summary_texts = [json.dumps(LessonSummary.from_lesson(Lesson.from_dict(data)).to_dict()) for data in lessons]
+    item_count = sum(len(data[attr]) for data in lessons for _, attr in LESSON_ITEM_KINDS)
+    plain_lesson, plain_summary = _plain_content_loaders()
+
+    print(f"Synthetic catalog: {len(lessons)} lessons, {item_count} practice items "
+          f"(slots {'on' if CONTENT_RECORD.get('slots') else 'unavailable before Python 3.10'})")
+    print(f"{'':20}{'plain':>12}{'compact':>12}{'saved':>8}")
+    for label, texts, plain_loader, compact_loader in (
+            ("catalog summaries", summary_texts, plain_summary, LessonSummary.from_dict),
+            ("lesson bodies", lesson_texts, plain_lesson, Lesson.from_dict)):
+        before = _retained_bytes(plain_loader, texts)
+        after = _retained_bytes(compact_loader, texts)
+        print(f"{label:20}{before / 1e6:>10.1f}MB{after / 1e6:>10.1f}MB{1 - after / before:>8.0%}")
+    return 0
+
+
+def _synthetic_profile(entries: int, seed: int) -> User:
+    """A long-lived profile: entries exercise completions, a quarter as many drills, a full activity log"""
+    rng = random.Random(seed)
+    user = User(username="benchmark", xp=entries * 12, level=GamificationSystem.calculate_level(entries * 12),
+                total_exercises_completed=entries, total_drills_completed=entries // 4)
+    user.completed_lessons = {f"lesson_{index}" for index in range(entries // 50 + 1)}
+    user.completed_exercises = {f"exercise_{index}": rng.randint(1, 5) for index in range(entries)}
+    user.completed_drills = {f"drill_{index}": rng.randint(1, 3) for index in range(entries // 4)}
+    user.mistake_tracker = {concept: rng.randint(0, 5) for concept in ('loops', 'functions', 'lists', 'strings')}
+    user.review_queue = [(f"lesson_{rng.randrange(entries // 50 + 1)}", "exercise") for _ in range(100)]
+    for index in range(User.RECENT_ACTIVITY):
+        user.add_activity('xp_gain', f"Exercise completed #{index}", 10)
+    return user
+
+
+def _timings(run, repeats: int = 7) -> Tuple[float, float]:
+    """(min, median) seconds of repeats runs, after one warm-up run that fills caches and the allocator"""
+    run()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+
+def cmd_benchmark_profile(args) -> int:
+    """Time profile saves and loads on a large synthetic profile, against asdict() and indent=2 JSON"""
+    user = _synthetic_profile(args.entries, args.seed)
+    def legacy_dict():
+        data = asdict(user)
+        data['completed_lessons'] = sorted(user.completed_lessons)
+        data['activity_log'] = list(user.activity_log)
+        return data
+
+    legacy_text = json.dumps(legacy_dict(), indent=2)
+    text = "\n".join(StorageManager.profile_lines(user)) + "\n"
+
+    def load_everything():
+        loaded = StorageManager._parse_profile(text)
+        for name in User.HISTORY_FIELDS:
+            getattr(loaded, name)
+
+    print(f"Synthetic profile: {len(user.completed_exercises)} exercises, {len(user.completed_drills)} drills, "
+          f"{len(user.activity_log)} recent activities")
+    def legacy_load():
+        return User.from_dict(json.loads(legacy_text))
+
+    print(f"Each time is the min / median of {args.repeats} runs after a warm-up run, in ms")
+    print(f"{'':22}{'before':>18}{'after':>18}")
+    timed = {}  # The legacy format has no lazy load, so both load rows share one measurement of it
+    for label, before, after in (
+            ("to_dict", legacy_dict, user.to_dict),
+            ("save (serialize)", lambda: json.dumps(legacy_dict(), indent=2),
+             lambda: "\n".join(StorageManager.profile_lines(user))),
+            ("load to first window", legacy_load, lambda: StorageManager._parse_profile(text)),
+            ("load everything", legacy_load, load_everything)):
+        columns = []
+        for run in (before, after):
+            if run not in timed:
+                timed[run] = _timings(run, args.repeats)
+            best, median = timed[run]
+            columns.append(f"{best * 1000:.1f} / {median * 1000:.1f}")
+        print(f"{label:22}{columns[0]:>18}{columns[1]:>18}")
+    print(f"{'file size':22}{len(legacy_text) / 1e6:>16.2f}MB{len(text) / 1e6:>16.2f}MB")
+    return 0
+
+
+def cmd_restore_backup(args) -> int:
+    """List a profile's automatic backups, or put one of them back"""
+    profiles = ProfileRegistry()
+    profile_ids = [summary['id'] for summary in profiles.list()]
+    profile_id = args.profile or (profile_ids[0] if len(profile_ids) == 1 else None)
+    if profile_id not in profile_ids:
+        print(f"Choose a profile with --profile: {', '.join(profile_ids) or 'there are none yet'}")
+        return 2
+    data_dir = profiles.data_dir_for(profile_id)
+    backups = BackupStore(os.path.join(data_dir, "backups"))
+
+    if args.snapshot is None:
+        snapshots = backups.snapshots()
+        for snapshot in snapshots:
+            print(f"{snapshot['id']}  {snapshot['created'][:16].replace('T', ' ')}  "
+                  f"{snapshot['size'] / 1024:>8.0f} KB  {len(snapshot['chunks'])} chunks")
+        print(f"{len(snapshots)} backups of {profile_id}: {sum(s['size'] for s in snapshots) / 1e6:.2f} MB "
+              f"of profile data in {backups.stored_bytes() / 1e6:.2f} MB of chunks")
+        return 0
+
+    lock = profiles.lock(profile_id)
+    if lock is None:
+        print(f"{profile_id} is open in CodeCompanion; close it first")
+        return 1
+    snapshot_id = args.snapshot
+    if snapshot_id == "latest":
+        snapshot_id = next((snapshot['id'] for snapshot in reversed(backups.snapshots())), snapshot_id)
+    try:
+        user = backups.restore(snapshot_id)
+        if user is None:
+            return 1
+        storage = open_storage(args.storage, data_dir)
+        current = storage.load_user()
+        if current is not None:
+            backups.snapshot(current.to_dict())  # So the restore can be undone the same way
+        if not storage.store(storage.capture(user, final=True)):
+            return 1
+        profiles.update(profile_id, user)
+    finally:
+        lock.release()
+    print(f"Restored {profile_id} from backup {snapshot_id}")
+    return 0
 
 
 def main():
-    app = CodeCompanionApp()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CodeCompanion - learn Python with your growing companion")
+    parser.add_argument('--dev', action='store_true',
+                        help="watch lesson packs and apply edits without restarting")
+    parser.add_argument('--storage', choices=['json', 'sqlite', 'journal'], default='json',
+                        help="where progress is kept: user.json, progress.db with dated, queryable history, "
+                             "or a snapshot plus an append-only journal of changes")
+    subparsers = parser.add_subparsers(dest='command')
+
+    export_parser = subparsers.add_parser('export-pack', help="export the built-in lessons as a lesson pack")
+    export_parser.add_argument('output', nargs='?', default=os.path.join(LESSON_PACKS_DIR, "core"),
+                               help="pack directory to create, or a .zip file for a single-file pack")
+    export_parser.set_defaults(func=cmd_export_pack)
+
+    generate_parser = subparsers.add_parser('generate-catalog', help="write a synthetic lesson pack for scaling tests")
+    generate_parser.add_argument('output', help="pack folder, or a .zip file")
+    generate_parser.add_argument('--lessons', type=int, default=1000, help="number of lessons")
+    generate_parser.add_argument('--seed', type=int, default=0, help="same seed and size, same catalog")
+    generate_parser.set_defaults(func=cmd_generate_catalog)
+
+    snapshot_parser = subparsers.add_parser('build-snapshot', help="compile lesson content into the startup snapshot")
+    snapshot_parser.add_argument('--packs', default=LESSON_PACKS_DIR, help="lesson packs directory")
+    snapshot_parser.add_argument('--cache', default=CONTENT_CACHE_DIR, help="cache directory for the snapshot")
+    snapshot_parser.set_defaults(func=cmd_build_snapshot)
+
+    validate_parser = subparsers.add_parser('validate', help="run every example, drill and reference solution")
+    validate_parser.add_argument('--packs', default=LESSON_PACKS_DIR, help="lesson packs directory")
+    validate_parser.add_argument('--workers', type=int, default=None,
+                                 help="worker processes (default: one per CPU, 1 runs in-process)")
+    validate_parser.add_argument('--timeout', type=float, default=ContentValidator.TASK_TIMEOUT,
+                                 help="seconds each check may run before its worker is killed")
+    validate_parser.add_argument('--slowest', type=int, default=10, help="number of slowest checks to list")
+    validate_parser.add_argument('--verbose', action='store_true', help="list the timing of every check")
+    validate_parser.add_argument('--cache', default=CONTENT_CACHE_DIR, help="cache directory for earlier results")
+    validate_parser.add_argument('--no-cache', action='store_true', help="re-run every check")
+    validate_parser.set_defaults(func=cmd_validate)
+
+    memory_parser = subparsers.add_parser('benchmark-memory',
+                                          help="measure content model memory on a synthetic catalog")
+    memory_parser.add_argument('--lessons', type=int, default=10000, help="synthetic catalog size")
+    memory_parser.add_argument('--seed', type=int, default=0, help="synthetic catalog seed")
+    memory_parser.set_defaults(func=cmd_benchmark_memory)
+
+    profile_parser = subparsers.add_parser('benchmark-profile',
+                                           help="time profile saves and loads on a large synthetic profile")
+    profile_parser.add_argument('--entries', type=int, default=100000, help="completed exercises in the profile")
+    profile_parser.add_argument('--seed', type=int, default=0, help="same seed and size, same profile")
+    profile_parser.add_argument('--repeats', type=int, default=7, help="timed runs per measurement")
+    profile_parser.set_defaults(func=cmd_benchmark_profile)
+
+    restore_parser = subparsers.add_parser('restore-backup',
+                                           help="list a profile's automatic backups, or restore one")
+    restore_parser.add_argument('snapshot', nargs='?', help="backup id to restore, or 'latest'; lists them if omitted")
+    restore_parser.add_argument('--profile', help="profile id (needed when several learners share the machine)")
+    restore_parser.set_defaults(func=cmd_restore_backup)
+
+    args = parser.parse_args()
+    if args.command:
+        sys.exit(args.func(args))
+
+    app = CodeCompanionApp(dev_mode=args.dev, storage_backend=args.storage)
     app.run()
 
 
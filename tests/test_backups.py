@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+import codecompanion_fixed as app
+
+
+def _snapshot(store, xp, when):
+    return store.snapshot(app.User(username="learner", xp=xp).to_dict(), now=when)
+
+
+def test_retention_windows_count_back_from_now(tmp_path):
+    store = app.BackupStore(str(tmp_path / "backups"))
+    start = datetime(2026, 3, 2, 0, 30)  # A Monday
+    hourly = [_snapshot(store, xp, start + timedelta(hours=xp)) for xp in range(30)]
+
+    # The last 24 hours, plus the newest of Monday (23:30) - all inside today's ISO week
+    assert [snapshot['id'] for snapshot in store.snapshots()] == hourly[6:]
+
+    # A month away: the old hours and days are gone, the newest of their week is kept as a weekly backup
+    latest = _snapshot(store, 100, start + timedelta(days=30))
+    assert [snapshot['id'] for snapshot in store.snapshots()] == [hourly[-1], latest]
+    assert store.restore(hourly[-1]).xp == 29
+
+
+def test_newest_backup_is_kept_however_old(tmp_path):
+    store = app.BackupStore(str(tmp_path / "backups"))
+    only = _snapshot(store, 1, datetime(2025, 1, 6, 12, 0))
+    store._prune(store.snapshots(), datetime(2026, 3, 2, 12, 0))
+    assert [snapshot['id'] for snapshot in store.snapshots()] == [only]
+    assert store.restore("latest").xp == 1
@@ -0,0 +1,14 @@
+from collections import defaultdict
+
+import codecompanion_fixed as app
+
+
+def test_swap_entries_skips_values_missing_from_the_index():
+    a, b, c = object(), object(), object()
+    index = defaultdict(list, {'loops': [a]})
+    # b was never indexed (or was already removed): a is replaced in place, and c is added
+    app.ContentCatalog._swap_entries(index, [('loops', b), ('loops', a)], [('loops', c)])
+    assert index['loops'] == [c]
+
+    app.ContentCatalog._swap_entries(index, [('loops', b)], [])
+    assert index['loops'] == [c]
@@ -0,0 +1,36 @@
+import threading
+import time
+
+import codecompanion_fixed as app
+
+
+def test_run_stuck_in_a_builtin_call_is_killed(monkeypatch):
+    monkeypatch.setattr(app.CodeExecutor, 'TIMEOUT_SECONDS', 0.5)
+    threads = threading.active_count()
+    started = time.monotonic()
+    success, _, error = app.CodeExecutor.execute_code("print(sum(range(10 ** 13)))")
+
+    assert not success and "timed out" in error
+    assert time.monotonic() - started < 5
+    assert threading.active_count() == threads  # Nothing left running in this process
+    assert app.CodeExecutor.execute_code("print(input())", "again") == (True, "again\n", "")
+
+
+def test_grading_reports_every_failing_case():
+    exercise = app.Exercise(id="double", prompt="", test_cases=[("1", "2"), ("2", "4"), ("3", "6")], hints=[],
+                            difficulty=1, concept="")
+    passed, message, details = exercise.validate_solution("print(int(input()) + 1)")
+
+    assert not passed and message == "Some test cases failed"
+    assert details == ["Expected: 4\nGot: 3", "Expected: 6\nGot: 4"]
+
+
+def test_restrictions_match_whole_names():
+    for code in ("cost = 5\nprint(cost)", "position = 1", "host = 'localhost'", "print('Boston')",
+                 "important = True"):
+        assert app.CodeExecutor.check_restrictions(code) == "", code
+    assert app.CodeExecutor.check_restrictions("open('notes.txt')") == "Restricted keyword: open"
+    assert app.CodeExecutor.check_restrictions("x = obj.__builtins__") == "Restricted keyword: __builtins__"
+    assert app.CodeExecutor.check_restrictions("print(f'{eval(\"1\")}')") == "Restricted keyword: eval"
+    assert app.CodeExecutor.check_restrictions("from os import path") == \
+        "Import statements are not allowed in exercises"
@@ -0,0 +1,76 @@
+import gzip
+import json
+
+import codecompanion_fixed as app
+
+
+def _session(data_dir, activities):
+    """Open the profile, do some activities and save, as one run of the app would"""
+    storage = app.StorageManager(str(data_dir))
+    user = storage.load_user() or app.User(username="learner")
+    for _ in range(activities):
+        user.add_activity('exercise', "Solved an exercise", xp_gained=10)
+    assert storage.store(storage.capture(user))
+    history = storage.history.rollups('days', "")
+    return user, sum(bucket['xp'] for bucket in history.values()), sum(b['activities'] for b in history.values())
+
+
+def test_sessions_never_replay_the_activity_log(tmp_path):
+    # More activities than the profile's ring buffer keeps, before the history ever saw them
+    user, xp, _ = _session(tmp_path, app.User.RECENT_ACTIVITY + 70)
+    assert xp == app.User.RECENT_ACTIVITY * 10
+
+    user, xp, rolled_up = _session(tmp_path, 3)
+    assert xp == (app.User.RECENT_ACTIVITY + 3) * 10
+    assert rolled_up == app.User.RECENT_ACTIVITY + 3
+
+    user, xp_after, _ = _session(tmp_path, 0)
+    assert xp_after == xp
+    assert app.StorageManager(str(tmp_path)).history.capture(user) == []
+
+
+def _record(xp):
+    return {'timestamp': "2026-03-02T10:00:00", 'activity_type': 'exercise', 'description': "", 'xp_gained': xp}
+
+
+def test_open_survives_a_crash_while_sealing(tmp_path):
+    path = tmp_path / "history"
+    history = app.ActivityHistory(str(path))
+    history.CHUNK_RECORDS = 3
+    assert history.append([_record(10), _record(20)])
+    # What a crash in _seal leaves behind: a torn temporary file, or a renamed chunk missing its end
+    (path / "chunk-000000000.jsonl.gz.tmp").write_bytes(b"\x1f\x8b\x08")
+    (path / "chunk-000000000.jsonl.gz").write_bytes(gzip.compress(b'{"xp_gained": 10}\n')[:12])
+
+    reopened = app.ActivityHistory(str(path))
+    reopened.CHUNK_RECORDS = 3
+    assert reopened.rollups('days', "")["2026-03-02"]['xp'] == 30
+    assert not (path / "chunk-000000000.jsonl.gz.tmp").exists()
+    assert reopened.append([_record(5)])  # Seals the chunk again over the damaged one
+
+    assert app.ActivityHistory(str(path)).rollups('days', "")["2026-03-02"]['xp'] == 35
+
+
+def test_open_survives_a_torn_header(tmp_path):
+    path = tmp_path / "history"
+    path.mkdir()
+    (path / "current.jsonl").write_text('{"sta')  # The crash came while the new file's header was written
+
+    storage = app.StorageManager(str(tmp_path))
+    user = app.User(username="learner")
+    user.add_activity('exercise', "Solved an exercise", xp_gained=10)
+    assert storage.store(storage.capture(user))
+
+    reopened = app.ActivityHistory(str(path))
+    assert sum(bucket['xp'] for bucket in reopened.rollups('days', "").values()) == 10
+    assert (path / "current.jsonl").read_text().startswith('{"start": 0}\n')
+
+
+def test_records_after_a_torn_header_are_kept(tmp_path):
+    path = tmp_path / "history"
+    path.mkdir()
+    (path / "current.jsonl").write_text('{"sta\n' + json.dumps(_record(10)) + "\n")
+
+    history = app.ActivityHistory(str(path))
+    assert history.append([_record(5)])
+    assert app.ActivityHistory(str(path)).rollups('days', "")["2026-03-02"]['xp'] == 15
@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+
+import codecompanion_fixed as app
+
+
+def test_practice_complete_keeps_quiz_and_exercise_ids_out_of_drills():
+    user = app.User(username="learner")
+    item = lambda item_id: SimpleNamespace(id=item_id)
+    session = app.PracticeSession(None, 3, [('mcq', item('q1')), ('multi_answer', item('m1')),
+                                            ('bug_fix', item('b1')), ('drill', item('d1')),
+                                            ('exercise', item('e1'))])
+    companion = SimpleNamespace(user=user, profile_writer=SimpleNamespace(mark_dirty=lambda user: None),
+                                _create_ui=lambda: None)
+
+    app.CodeCompanionApp._on_practice_complete(companion, session)
+
+    assert user.completed_drills == {'b1': 1}
+    assert user.completed_exercises == {'q1': 1, 'm1': 1}
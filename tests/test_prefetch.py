@@ -0,0 +1,41 @@
+import codecompanion_fixed as app
+
+
+def _snapshot_catalog(tmp_path):
+    return app.ContentEngine.load_catalog(str(tmp_path / "packs"), str(tmp_path / "cache"))
+
+
+def _prefetch_all(prefetcher, catalog):
+    for summary in catalog.summaries:
+        prepared = prefetcher._prepare(summary.id)
+        if prepared is not None:
+            prefetcher._store(summary.id, prepared)
+
+
+def test_prefetching_stays_within_the_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.CodeExecutor, 'COMPILED_CACHE', {})
+    monkeypatch.setattr(app.CodeExecutor, 'REFERENCE_OUTPUTS', {})
+    catalog = _snapshot_catalog(tmp_path)
+    prefetcher = app.LessonPrefetcher(lambda: catalog, budget_bytes=100)
+
+    _prefetch_all(prefetcher, catalog)
+    prefetcher.close()
+
+    assert prefetcher.used_bytes <= 100
+    assert app.CodeExecutor.COMPILED_CACHE == {}
+    assert app.CodeExecutor.REFERENCE_OUTPUTS == {}
+
+
+def test_take_registers_the_prepared_code(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.CodeExecutor, 'COMPILED_CACHE', {})
+    monkeypatch.setattr(app.CodeExecutor, 'REFERENCE_OUTPUTS', {})
+    catalog = _snapshot_catalog(tmp_path)
+    prefetcher = app.LessonPrefetcher(lambda: catalog)
+
+    _prefetch_all(prefetcher, catalog)
+    prefetcher.close()
+    summary = next(summary for summary in catalog.summaries if summary.id in prefetcher._prepared)
+    lesson = prefetcher.take(summary)
+
+    assert lesson is not None and lesson.id == summary.id
+    assert set(app.lesson_code_sources(lesson)) <= set(app.CodeExecutor.COMPILED_CACHE)
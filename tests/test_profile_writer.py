@@ -0,0 +1,29 @@
+import threading
+import time
+
+import codecompanion_fixed as app
+
+
+class SlowStorage:
+    def __init__(self):
+        self.started = threading.Event()
+        self.stored = []
+
+    def store(self, data):
+        self.started.set()
+        time.sleep(0.2)
+        self.stored.append(data)
+        return True
+
+
+def test_discard_waits_for_the_write_in_flight():
+    storage = SlowStorage()
+    writer = app.ProfileWriter(storage, quiet_seconds=0)
+    writer._queue({'xp': 10})
+    assert storage.started.wait(2)
+
+    writer.discard()
+    # The profile can be deleted now: nothing is being written and nothing is left to write
+    assert storage.stored == [{'xp': 10}]
+    writer.close()
+    assert storage.stored == [{'xp': 10}]
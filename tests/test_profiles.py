@@ -0,0 +1,19 @@
+import json
+
+import codecompanion_fixed as app
+
+
+def test_damaged_index_is_rebuilt_from_the_profile_directories(tmp_path):
+    registry = app.ProfileRegistry(str(tmp_path))
+    (tmp_path / "user.json").write_text("{}")  # A profile from before the registry existed
+    ana, ben = registry.create("Ana"), registry.create("Ben")
+    (tmp_path / app.ProfileRegistry.INDEX_NAME).write_text('{"version": 1, "profi')
+
+    assert {summary['id'] for summary in registry.list()} == {'default', ana, ben}
+    assert registry.data_dir_for(ben) == str(tmp_path / "profiles" / ben)
+
+    # The next write repairs the index without dropping anyone
+    registry.update(ben, app.User(username="Ben"))
+    with open(tmp_path / app.ProfileRegistry.INDEX_NAME) as f:
+        profiles = json.load(f)['profiles']
+    assert set(profiles) == {'default', ana, ben} and profiles[ben]['name'] == "Ben"
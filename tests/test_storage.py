@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pytest
+
+import codecompanion_fixed as app
+
+
+@pytest.mark.parametrize('storage_class', [app.StorageManager, app.SQLiteStorageManager, app.JournalStorageManager])
+def test_backends_give_the_same_monthly_summary(tmp_path, storage_class):
+    storage = storage_class(str(tmp_path))
+    user = app.User(username="learner")
+    user.add_activity('xp_gain', "Solved an exercise", 10)
+    assert storage.store(storage.capture(user))
+    user.total_exercises_completed += 2
+    user.total_hints_used += 1
+    user.add_activity('xp_gain', "Solved another", 15)
+    assert storage.store(storage.capture(user))
+
+    month = storage.monthly_summary(datetime.now().date().replace(day=1).isoformat())
+    by_concept = month.pop('by_concept')
+    assert month == {'xp': 25, 'active_days': 1, 'exercises': 2, 'drills': 0, 'hints': 1, 'best_week_xp': 25}
+    assert by_concept == {}
+
+
+def test_history_sections_are_parsed_on_first_use():
+    user = app.User(username="learner", mistake_tracker={'loops': 2})
+    user.completed_drills = {'drill_1': 1}
+    text = "\n".join(app.StorageManager.profile_lines(user)) + "\n"
+
+    loaded = app.StorageManager._parse_profile(text)
+    assert set(loaded.__dict__['_unparsed']) == set(app.User.HISTORY_FIELDS)
+    assert "\n".join(app.StorageManager.profile_lines(loaded)) + "\n" == text  # Passed through untouched
+    assert loaded.mistake_tracker == {'loops': 2}
+    assert 'mistake_tracker' not in loaded.__dict__['_unparsed']
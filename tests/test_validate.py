@@ -0,0 +1,37 @@
+import argparse
+
+import codecompanion_fixed as app
+
+
+def _lesson(*codes):
+    return app.Lesson(id="loops", title="Loops", concept="", examples=[app.CodeExample(code, "") for code in codes],
+                      exercises=[], prerequisites=[], xp_reward=0, skill_path="test")
+
+
+def test_pool_kills_a_check_stuck_in_a_builtin_call():
+    lesson = _lesson("print('before')", "total = sum(range(10 ** 13))", "print('after')")
+    cache = {}
+    results = app.ContentValidator.validate([lesson], workers=2, cache=cache, timeout=1)
+
+    by_item = {result.item_id: result for result in results}
+    assert by_item["loops_example1"].passed and by_item["loops_example3"].passed
+    stuck = by_item["loops_example2"]
+    assert not stuck.passed and "timed out" in stuck.message
+    # The timed-out check is run again next time rather than cached as a failure
+    assert len(cache) == 2
+
+
+def test_looping_example_fails_in_process(monkeypatch):
+    monkeypatch.setattr(app.CodeExecutor, 'TIMEOUT_SECONDS', 0.5)
+    results = app.ContentValidator.validate([_lesson("while True:\n    pass")], workers=1)
+    assert len(results) == 1 and not results[0].passed and "timed out" in results[0].message
+
+
+def test_validate_command_exits_non_zero_on_a_timeout(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(app.ContentEngine, '_build_builtin_lessons',
+                        staticmethod(lambda: [_lesson("while True:\n    pass")]))
+    monkeypatch.setattr(app.CodeExecutor, 'TIMEOUT_SECONDS', 60)
+    args = argparse.Namespace(packs=str(tmp_path / "packs"), cache=str(tmp_path), no_cache=True, workers=2,
+                              timeout=1, slowest=10, verbose=False)
+    assert app.cmd_validate(args) == 1
+    assert "timed out" in capsys.readouterr().out